@@ -0,0 +1,42 @@
+"""
+Benchmark of the memory use and speed of @act_as_list with the default list storage and with storage="array",
+for a million floats.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list
+"""
+
+import timeit
+import tracemalloc
+from useful_tools.act_as_list import act_as_list
+
+N = 1_000_000
+
+@act_as_list('values')
+class ListBacked:
+    def __init__(self, values=()):
+        self.values = list(values)
+
+@act_as_list('values', storage="array", typecode="d")
+class ArrayBacked:
+    def __init__(self, values=()):
+        self.values = values
+
+def fill(cls):
+    instance = cls()
+    for i in range(N):
+        instance.append(i * 0.5)
+    return instance
+
+def bench(label, cls):
+    tracemalloc.start()
+    instance = fill(cls)
+    memory, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    append_seconds = timeit.timeit(lambda: fill(cls), number=3) / 3
+    sum_seconds = timeit.timeit(lambda: sum(instance), number=10) / 10
+    print(f"{label:<25} {memory / N:>6.1f} bytes per item {append_seconds * 1e3:>8.1f} ms to append {N:,} {sum_seconds * 1e3:>8.1f} ms to sum")
+
+if __name__ == "__main__":
+    bench("list storage", ListBacked)
+    bench("array storage ('d')", ArrayBacked)
@@ -0,0 +1,46 @@
+"""
+Benchmark of bulk operations on @act_as_list objects of a million items, compared with the same operations on a raw list,
+and with doing them item by item, the way @act_as_list.__add__ used to.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_bulk
+"""
+
+import timeit
+from useful_tools.act_as_list import act_as_list
+
+N = 1_000_000
+
+@act_as_list('items')
+class Items:
+    def __init__(self, items):
+        self.items = items
+    def _from_list(self, items):
+        return Items(items)
+
+def add_item_by_item(fake_list, other):
+    new_list = Items(fake_list.items.copy())
+    for item in other:
+        new_list.append(item)
+    return new_list
+
+OPERATIONS = [
+    ("a + b", "a + b"),
+    ("a + b, item by item", "add_item_by_item(a, b)"),
+    ("a[::2]", "a[::2]"),
+    ("a * 2", "a * 2"),
+    ("a == b", "a == b"),
+    ("a < b", "a < b"),
+    ("a[:1000] = b[:1000]", "a[:1000] = b[:1000]"),
+    ("a.copy(); del [N//2:]", "c = a.copy(); del c[len(c) // 2:]"),
+]
+
+def bench(label, statement, a, b, number=10):
+    seconds = min(timeit.repeat(statement, globals={"a": a, "b": b, "add_item_by_item": add_item_by_item}, number=number, repeat=3)) / number
+    return f"{seconds * 1e3:>7.2f} ms"
+
+if __name__ == "__main__":
+    for label, statement in OPERATIONS:
+        raw = bench(label, statement, list(range(N)), list(range(N))) if "item_by_item" not in statement else "    n/a   "
+        decorated = bench(label, statement, Items(list(range(N))), Items(list(range(N))))
+        print(f"{label:<25} list {raw}   act_as_list {decorated}")
@@ -0,0 +1,32 @@
+"""
+Benchmark of using an @act_as_list object as a work queue (add at the end, take from the start),
+with the default list storage and with storage="deque".
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_deque
+"""
+
+import timeit
+from useful_tools.act_as_list import act_as_list
+
+@act_as_list('jobs')
+class ListQueue:
+    def __init__(self, jobs):
+        self.jobs = list(jobs)
+
+@act_as_list('jobs', storage="deque")
+class DequeQueue:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+OPERATIONS = ["x.append(1); x.pop(0)", "x.insert(0, 1); x.pop()", "x[len(x) // 2]"]
+
+if __name__ == "__main__":
+    for size in (1_000, 100_000, 1_000_000):
+        for operation in OPERATIONS:
+            results = []
+            for label, cls in (("list", ListQueue), ("deque", DequeQueue)):
+                number = 1_000
+                seconds = min(timeit.repeat(operation, globals={"x": cls(range(size))}, number=number, repeat=3)) / number
+                results.append(f"{label} {seconds * 1e6:>8.2f} µs")
+            print(f"{size:>9,} items  {operation:<25} " + "   ".join(results))
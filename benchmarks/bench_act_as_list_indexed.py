@@ -0,0 +1,43 @@
+"""
+Benchmark of `in`, index() and count() on an @act_as_list object of 100,000 servers, with and without indexed=True,
+and of the memory used by the index.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_indexed
+"""
+
+import timeit
+import tracemalloc
+from useful_tools.act_as_list import act_as_list
+
+N = 100_000
+
+@act_as_list('servers')
+class Fleet:
+    def __init__(self, servers):
+        self.servers = servers
+
+@act_as_list('servers', indexed=True)
+class IndexedFleet:
+    def __init__(self, servers):
+        self.servers = servers
+
+OPERATIONS = ['"server99999" in x', 'x.index("server99999")', 'x.count("server99999")', 'x.append("new"); x.pop()']
+
+def bench(operation, instance, number):
+    return min(timeit.repeat(operation, globals={"x": instance}, number=number, repeat=3)) / number
+
+if __name__ == "__main__":
+    servers = [f"server{i}" for i in range(N)]
+    fleet, indexed_fleet = Fleet(list(servers)), IndexedFleet(list(servers))
+
+    tracemalloc.start()
+    indexed_fleet.index("server0") # builds the counts and the first positions
+    index_memory, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory used by the index: {index_memory / N:.0f} bytes per item (the list itself uses 8 bytes per item, plus the items)")
+
+    for operation in OPERATIONS:
+        plain = bench(operation, fleet, number=100)
+        indexed = bench(operation, indexed_fleet, number=10_000)
+        print(f"{operation:<30} list {plain * 1e6:>10.2f} µs   indexed=True {indexed * 1e6:>8.2f} µs")
@@ -0,0 +1,64 @@
+"""
+Benchmark of wrapping a big JSONL export in an @act_as_list object: loading all the records into a list,
+compared with storage="lazy", which loads them a chunk at a time - the peak memory and the time of each step.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_lazy
+"""
+
+import os
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+from useful_tools.act_as_list import act_as_list
+
+N = 200_000
+
+@act_as_list('records')
+class Export:
+    def __init__(self, path):
+        with open(path) as f:
+            self.records = [json.loads(line) for line in f]
+
+@act_as_list('records', storage="lazy")
+class LazyExport:
+    def __init__(self, path):
+        self.records = path
+
+def bench(cls, path, trace_memory):
+    # timed without tracemalloc, which slows everything down, and then run again to measure the peak memory
+    print(f"{cls.__name__}, {'peak memory' if trace_memory else 'time'}:")
+    export = None
+    positions = random.Random(0).sample(range(N), 1000)
+    steps = [
+        ("create", lambda: cls(path)),
+        ("len()", lambda: len(export)),
+        ("1,000 random reads", lambda: [export[position] for position in positions]),
+        ("iterate over all the records", lambda: sum(record["id"] for record in export)),
+    ]
+    for label, step in steps:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = step()
+        seconds = time.perf_counter() - start
+        if trace_memory:
+            _memory, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {label:<35} {peak / 2**20:>8.1f} MiB")
+        else:
+            print(f"  {label:<35} {seconds * 1e3:>8.1f} ms")
+        if export is None:
+            export = result
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.jsonl")
+        with open(path, "w") as f:
+            for i in range(N):
+                f.write(json.dumps({"id": i, "name": f"server{i}", "tags": ["a", "b", "c"], "load": i / N}) + "\n")
+        for trace_memory in (False, True):
+            bench(Export, path, trace_memory)
+            bench(LazyExport, path, trace_memory)
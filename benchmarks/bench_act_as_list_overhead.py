@@ -0,0 +1,53 @@
+"""
+Benchmark of the overhead of the @act_as_list methods, comparing each operation with the same operation on a raw list,
+and with the getattr(self, attribute) methods @act_as_list used before they were generated per class.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_overhead
+"""
+
+import timeit
+from useful_tools.act_as_list import act_as_list
+
+@act_as_list('servers')
+class Fleet:
+    def __init__(self, servers):
+        self.servers = servers
+
+@act_as_list('servers', slots=True)
+class FleetWithSlots:
+    __slots__ = ()
+    def __init__(self, servers):
+        self.servers = servers
+
+attribute = "servers"
+
+class FleetWithGetattr:
+    # the list methods as they were, looking up the attribute by name on every call
+    def __init__(self, servers):
+        self.servers = servers
+    def __getitem__(self, index):
+        return getattr(self, attribute)[index]
+    def __len__(self):
+        return len(getattr(self, attribute))
+    def __iter__(self):
+        return iter(getattr(self, attribute))
+    def __contains__(self, item):
+        return item in getattr(self, attribute)
+    def append(self, item):
+        getattr(self, attribute).append(item)
+
+OPERATIONS = ["x[5]", "len(x)", "iter(x)", "5 in x", "x.append(1)"]
+
+def bench(operation, number=1_000_000):
+    results = []
+    for label, make in (("list", list), ("act_as_list", Fleet), ("slots=True", FleetWithSlots), ("getattr", FleetWithGetattr)):
+        instance = make(list(range(10)))
+        # the best of 5 runs, as the differences are small compared to the noise
+        seconds = min(timeit.repeat(operation, globals={"x": instance}, number=number, repeat=5))
+        results.append(f"{label} {seconds / number * 1e9:>5.0f} ns")
+    print(f"{operation:<12} " + "   ".join(results))
+
+if __name__ == "__main__":
+    for operation in OPERATIONS:
+        bench(operation)
@@ -0,0 +1,45 @@
+"""
+Benchmark of keeping an @act_as_list object sorted with sorted_by, compared with appending to a list and calling sort()
+after every batch, which is what we did before.
+
+Run from the root of the repo:
+python -m benchmarks.bench_act_as_list_sorted
+"""
+
+import random
+import timeit
+from useful_tools.act_as_list import act_as_list
+
+@act_as_list('values')
+class Values:
+    def __init__(self, values):
+        self.values = values
+
+@act_as_list('values', sorted_by=True)
+class SortedValues:
+    def __init__(self, values):
+        self.values = values
+
+def append_and_sort(instance, batches):
+    for batch in batches:
+        for value in batch:
+            instance.append(value)
+        instance.sort()
+
+def append_sorted(instance, batches):
+    for batch in batches:
+        for value in batch:
+            instance.append(value)
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for size in (10_000, 100_000, 1_000_000):
+        initial = [rng.random() for _ in range(size)]
+        batches = [[rng.random() for _ in range(10)] for _ in range(100)] # 100 batches of 10 appends
+        resort = min(timeit.repeat(lambda: append_and_sort(Values(sorted(initial)), batches), number=1, repeat=3))
+        insort = min(timeit.repeat(lambda: append_sorted(SortedValues(initial), batches), number=1, repeat=3))
+        sorted_values = SortedValues(initial)
+        lookups = 10_000
+        rank = min(timeit.repeat(lambda: sorted_values.rank(0.5), number=lookups, repeat=3)) / lookups
+        print(f"{size:>9,} items: 1,000 appends in batches of 10: sort() after each batch {resort * 1e3:>8.1f} ms, "
+              f"sorted_by {insort * 1e3:>6.1f} ms   rank() {rank * 1e6:.2f} µs")
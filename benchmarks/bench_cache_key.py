@@ -0,0 +1,39 @@
+"""
+Benchmark of the cost of computing the cache key of a method on a large instance,
+comparing repr(instance) (the default) with __cache_key__ and cache_key_attrs.
+
+Run from the root of the repo:
+python -m benchmarks.bench_cache_key
+"""
+
+import timeit
+from useful_tools.hash_functions import make_arg_hash, instance_hash_info
+
+class LargeService:
+    def __init__(self, size):
+        self.customer_id = "customer-42"
+        self.region = "eu-north-1"
+        self.rows = [{"id": i, "name": f"row {i}", "values": list(range(10))} for i in range(size)]
+
+    def __repr__(self):
+        # a typical generated repr, which walks all the attributes
+        return f"LargeService(customer_id={self.customer_id!r}, region={self.region!r}, rows={self.rows!r})"
+
+class LargeServiceWithCacheKey(LargeService):
+    def __cache_key__(self):
+        return (self.customer_id, self.region)
+
+def bench(label, instance, cache_key_attrs=None, number=200):
+    args, kwargs = ("some_arg",), {"some_kwarg": 1}
+    seconds = timeit.timeit(
+        lambda: make_arg_hash(args, kwargs, supplemental_hash_info=instance_hash_info(instance, cache_key_attrs)),
+        number=number,
+    )
+    print(f"{label:<45} {seconds / number * 1e6:>12.1f} µs per key")
+
+if __name__ == "__main__":
+    for size in (100, 10_000):
+        print(f"instance with {size} rows:")
+        bench("  repr(instance)", LargeService(size))
+        bench("  __cache_key__", LargeServiceWithCacheKey(size))
+        bench("  cache_key_attrs=['customer_id', 'region']", LargeService(size), cache_key_attrs=["customer_id", "region"])
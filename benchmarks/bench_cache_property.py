@@ -0,0 +1,53 @@
+"""
+Benchmark of reading a cached property (after the first access), comparing functools.cached_property
+with cache_property, and with the older @property @cache_property and @property @cache_to_memory combinations.
+
+Run from the root of the repo:
+python -m benchmarks.bench_cache_property
+"""
+
+import timeit
+import functools
+from useful_tools.cache_to_memory import cache_property, cache_to_memory
+
+class WithCachedProperty:
+    @functools.cached_property
+    def value(self):
+        return 42
+
+class WithCacheProperty:
+    @cache_property
+    def value(self):
+        return 42
+
+class WithSlots:
+    __slots__ = ("_value", "__weakref__")
+
+    @cache_property
+    def value(self):
+        return 42
+
+class WithPropertyAndCacheProperty:
+    @property
+    @cache_property
+    def value(self):
+        return 42
+
+class WithPropertyAndCacheToMemory:
+    @property
+    @cache_to_memory
+    def value(self):
+        return 42
+
+def bench(label, cls, number=1_000_000):
+    instance = cls()
+    instance.value # the first access computes and caches the value
+    seconds = timeit.timeit(lambda: instance.value, number=number)
+    print(f"{label:<45} {seconds / number * 1e9:>10.0f} ns per read")
+
+if __name__ == "__main__":
+    bench("functools.cached_property", WithCachedProperty)
+    bench("cache_property", WithCacheProperty)
+    bench("cache_property on a class with __slots__", WithSlots)
+    bench("@property @cache_property", WithPropertyAndCacheProperty)
+    bench("@property @cache_to_memory", WithPropertyAndCacheToMemory)
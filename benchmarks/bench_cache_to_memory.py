@@ -0,0 +1,53 @@
+"""
+Benchmark of a cache hit with @cache_to_memory compared to functools.lru_cache,
+with hashable args (fast tuple keys) and unhashable args (hashed with make_arg_hash),
+and of cache misses that evict a result, with each policy, which shouldn't depend on maxsize.
+
+Run from the root of the repo:
+python -m benchmarks.bench_cache_to_memory
+"""
+
+import timeit
+import functools
+from useful_tools.cache_to_memory import cache_to_memory
+
+def make_functions(maxsize):
+    @functools.lru_cache(maxsize=maxsize)
+    def with_lru_cache(a, b, c=None):
+        return a
+
+    @cache_to_memory(maxsize=maxsize)
+    def with_cache_to_memory(a, b, c=None):
+        return a
+
+    return with_lru_cache, with_cache_to_memory
+
+def bench(label, func, args, kwargs, number=100_000):
+    func(*args, **kwargs) # fill the cache, so only hits are measured
+    seconds = timeit.timeit(lambda: func(*args, **kwargs), number=number)
+    print(f"{label:<45} {seconds / number * 1e9:>10.0f} ns per hit")
+
+def bench_evictions(label, policy, maxsize, number=20_000):
+    func = cache_to_memory(maxsize=maxsize, policy=policy)(lambda a: a)
+    for a in range(maxsize):
+        func(a) # fill the cache, so every call below evicts a result
+    keys = iter(range(maxsize, maxsize + number))
+    seconds = timeit.timeit(lambda: func(next(keys)), number=number)
+    print(f"{label:<45} {seconds / number * 1e9:>10.0f} ns per miss")
+
+if __name__ == "__main__":
+    hashable = ((1, 2), {"c": "x"})
+    unhashable = (([1, 2, 3], {"key": "value"}), {"c": ["x"]})
+    for maxsize in (None, 128):
+        print(f"maxsize={maxsize}:")
+        with_lru_cache, with_cache_to_memory = make_functions(maxsize)
+        bench("  functools.lru_cache, hashable args", with_lru_cache, *hashable)
+        bench("  cache_to_memory, hashable args", with_cache_to_memory, *hashable)
+        bench("  cache_to_memory, unhashable args", with_cache_to_memory, *unhashable)
+    print("lfu policy:")
+    with_lfu = cache_to_memory(maxsize=128, policy="lfu")(lambda a, b, c=None: a)
+    bench("  cache_to_memory(policy='lfu'), hashable args", with_lfu, *hashable)
+    print("misses that evict a result:")
+    for policy in ("lru", "lfu"):
+        for maxsize in (128, 10_000):
+            bench_evictions(f"  policy={policy!r}, maxsize={maxsize}", policy, maxsize)
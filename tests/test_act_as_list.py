@@ -48,6 +48,21 @@ def test_eq():
     fake_list = MyClassThatLooksLikeAList(["hello", "world"])
     assert fake_list == ["hello", "world"]
 
+def test_unhashable_like_a_list():
+    fake_list = MyClassThatLooksLikeAList(["hello", "world"])
+    with pytest.raises(TypeError):
+        hash(fake_list)
+
+def test_hash_defined_by_the_class_is_kept():
+    @act_as_list('objects')
+    class HashableByName:
+        def __init__(self, name, objects=[]):
+            self.name = name
+            self.objects = objects
+        def __hash__(self):
+            return hash(self.name)
+    assert hash(HashableByName("a", [1])) == hash("a")
+
 def test_append():
     fake_list = MyClassThatLooksLikeAList()
     fake_list.append("hello")
@@ -208,3 +223,528 @@ def test_add_with_class_returning_original_class():
     result = fake_list1 + fake_list2
     assert result == ["hello", "world", "foo", "bar"]
     assert result.__class__ == MyClassWithExtraAttrs # because the class has a _from_list method, it returns the original class
+
+import array
+
+@act_as_list('values', storage="array", typecode="d")
+class Measurements:
+    def __init__(self, values=()):
+        self.values = values
+
+def test_array_storage_converts_the_attribute():
+    measurements = Measurements([1.5, 2.5])
+    assert isinstance(measurements.values, array.array)
+    assert measurements.values.typecode == "d"
+    measurements.values = [3, 4] # assigning later is converted too
+    assert measurements.values == array.array("d", [3.0, 4.0])
+
+def test_array_storage_keeps_an_array_with_the_same_typecode():
+    values = array.array("d", [1.0])
+    measurements = Measurements(values)
+    assert measurements.values is values
+    assert Measurements(array.array("f", [1.0])).values.typecode == "d"
+
+def test_array_storage_list_methods():
+    measurements = Measurements([3.0, 1.0, 2.0])
+    measurements.append(4.0)
+    measurements.insert(0, 0.5)
+    measurements.extend([5.0, 6.0])
+    assert measurements == [0.5, 3.0, 1.0, 2.0, 4.0, 5.0, 6.0]
+    assert len(measurements) == 7
+    assert measurements[1] == 3.0
+    assert 2.0 in measurements
+    assert measurements.index(2.0) == 3
+    assert measurements.count(1.0) == 1
+    assert measurements.pop() == 6.0
+    measurements.remove(5.0)
+    measurements.sort()
+    assert measurements == [0.5, 1.0, 2.0, 3.0, 4.0]
+    measurements.sort(reverse=True)
+    assert measurements == [4.0, 3.0, 2.0, 1.0, 0.5]
+    measurements.reverse()
+    assert list(reversed(measurements)) == [4.0, 3.0, 2.0, 1.0, 0.5]
+    measurements[0] = 9.0
+    assert measurements[0] == 9.0
+    copied = measurements.copy()
+    assert isinstance(copied, array.array) and copied is not measurements.values
+    assert measurements + [7.0] == array.array("d", [9.0, 1.0, 2.0, 3.0, 4.0, 7.0]) # without _from_list, copies are arrays, not lists
+    measurements.clear()
+    assert len(measurements) == 0
+    assert isinstance(measurements.values, array.array)
+
+def test_array_storage_rejects_values_of_the_wrong_type():
+    measurements = Measurements()
+    with pytest.raises(TypeError):
+        measurements.append("hello")
+
+def test_array_storage_buffer():
+    measurements = Measurements([1.0, 2.0])
+    view = measurements.__buffer__(0) # memoryview(measurements) on python 3.12+
+    assert view.format == "d"
+    assert view.tolist() == [1.0, 2.0]
+    view.release()
+
+def test_array_storage_numpy():
+    numpy = pytest.importorskip("numpy")
+    measurements = Measurements([1.0, 2.0])
+    as_numpy = numpy.asarray(measurements)
+    assert as_numpy.dtype == numpy.float64
+    as_numpy[0] = 5.0 # the memory is shared, not copied
+    assert measurements[0] == 5.0
+
+def test_invalid_storage_or_typecode():
+    with pytest.raises(ValueError):
+        act_as_list('values', storage="tuple")
+    with pytest.raises(ValueError):
+        act_as_list('values', storage="array", typecode="x")
+
+def test_list_storage_is_not_converted():
+    fake_list = MyClassThatLooksLikeAList(["hello"])
+    assert type(fake_list.objects) is list
+    assert not hasattr(fake_list, "__array__")
+
+def test_generated_methods_read_the_attribute_directly():
+    # the generated methods use self.objects instead of getattr(self, "objects")
+    assert "getattr" not in MyClassThatLooksLikeAList.__getitem__.__code__.co_names
+    assert "objects" in MyClassThatLooksLikeAList.__getitem__.__code__.co_names
+    assert MyClassThatLooksLikeAList.append.__qualname__ == "MyClassThatLooksLikeAList.append"
+    assert MyClassThatLooksLikeAList.append.__doc__.startswith("for appending an item")
+
+def test_invalid_attribute_name():
+    with pytest.raises(ValueError):
+        act_as_list('not an attribute')
+    with pytest.raises(ValueError):
+        act_as_list('class')
+
+@act_as_list('items', slots=True)
+class WithSlots:
+    __slots__ = ("name",)
+    def __init__(self, items, name="fleet"):
+        self.items = items
+        self.name = name
+
+def test_slots():
+    fake_list = WithSlots(["a", "b"])
+    assert not hasattr(fake_list, "__dict__")
+    assert fake_list == ["a", "b"]
+    fake_list.append("c")
+    assert fake_list.items == ["a", "b", "c"]
+    assert fake_list.name == "fleet"
+    with pytest.raises(AttributeError):
+        fake_list.something_else = 1
+
+@act_as_list('values', storage="array", slots=True)
+class ArrayWithSlots:
+    __slots__ = ()
+    def __init__(self, values=()):
+        self.values = values
+
+def test_slots_with_array_storage():
+    fake_list = ArrayWithSlots([1, 2])
+    assert not hasattr(fake_list, "__dict__")
+    assert fake_list.values == array.array("d", [1.0, 2.0])
+
+def test_slots_without_slots_on_the_decorated_class():
+    # the attribute is in a slot, but the instances still have a __dict__ for other attributes
+    @act_as_list('objects', slots=True)
+    class WithoutSlots:
+        def __init__(self, objects):
+            self.objects = objects
+            self.other = 1
+    fake_list = WithoutSlots(["a"])
+    assert fake_list == ["a"]
+    assert "objects" not in fake_list.__dict__
+    assert fake_list.other == 1
+
+def test_add_non_list_raises():
+    fake_list = MyClassThatLooksLikeAList(["hello"])
+    with pytest.raises(TypeError):
+        fake_list + "world"
+    with pytest.raises(TypeError):
+        "world" + fake_list
+
+def test_radd():
+    fake_list = MyClassThatLooksLikeAList(["world"])
+    assert ["hello"] + fake_list == ["hello", "world"]
+    result = ["hello"] + MyClassWithExtraAttrs(["world"], extra_attr="fubar")
+    assert result.__class__ == MyClassWithExtraAttrs
+    assert result == ["hello", "world"]
+
+def test_iadd():
+    fake_list = MyClassThatLooksLikeAList(["hello"])
+    objects = fake_list.objects
+    fake_list += ("world",) # any iterable, like a list
+    fake_list += MyClassThatLooksLikeAList2(["foo"])
+    assert fake_list.objects is objects # extended in place
+    assert fake_list == ["hello", "world", "foo"]
+
+def test_mul():
+    fake_list = MyClassThatLooksLikeAList(["a", "b"])
+    assert fake_list * 2 == ["a", "b", "a", "b"]
+    assert 2 * fake_list == ["a", "b", "a", "b"]
+    assert (MyClassWithExtraAttrs(["a"], extra_attr="fubar") * 3).__class__ == MyClassWithExtraAttrs
+    with pytest.raises(TypeError):
+        fake_list * "2"
+    fake_list *= 2
+    assert fake_list.objects == ["a", "b", "a", "b"]
+
+def test_slices():
+    fake_list = MyClassThatLooksLikeAList(["a", "b", "c", "d"])
+    assert fake_list[1:3] == ["b", "c"]
+    assert fake_list[1:3].__class__ == list # no _from_list method
+    result = MyClassWithExtraAttrs(["a", "b", "c"], extra_attr="fubar")[::2]
+    assert result.__class__ == MyClassWithExtraAttrs
+    assert result.extra_attr == "fubar"
+    assert result == ["a", "c"]
+    fake_list[1:3] = MyClassThatLooksLikeAList2(["x", "y", "z"])
+    assert fake_list == ["a", "x", "y", "z", "d"]
+    del fake_list[1:4]
+    assert fake_list == ["a", "d"]
+    del fake_list[0]
+    assert fake_list == ["d"]
+
+def test_comparisons():
+    fake_list = MyClassThatLooksLikeAList(["a", "b"])
+    assert fake_list == MyClassThatLooksLikeAList2(["a", "b"])
+    assert fake_list != ["a"]
+    assert fake_list < ["b"]
+    assert fake_list <= ["a", "b"]
+    assert fake_list > ["a"]
+    assert fake_list >= ["a", "b"]
+    assert ["a"] < fake_list # reflected
+    assert fake_list != "ab"
+    with pytest.raises(TypeError):
+        fake_list < "ab"
+
+def test_bulk_operations_with_array_storage():
+    measurements = Measurements([1.0, 2.0, 3.0])
+    assert measurements == [1, 2, 3]
+    assert measurements < [1.0, 2.0, 4.0]
+    assert measurements[1:] == array.array("d", [2.0, 3.0])
+    measurements[0:1] = [7, 8]
+    assert measurements.values == array.array("d", [7.0, 8.0, 2.0, 3.0])
+    measurements += [4]
+    assert [0.5] + measurements == array.array("d", [0.5, 7.0, 8.0, 2.0, 3.0, 4.0])
+    assert list(measurements * 2) == [7.0, 8.0, 2.0, 3.0, 4.0] * 2 # an array, as there is no _from_list method
+    del measurements[:2]
+    assert measurements == [2.0, 3.0, 4.0]
+
+import random
+
+@act_as_list('servers', indexed=True)
+class IndexedFleet:
+    def __init__(self, servers=()):
+        self.servers = list(servers)
+
+def test_indexed_lookups():
+    fleet = IndexedFleet(["server1", "server2", "server1"])
+    assert "server1" in fleet
+    assert "server3" not in fleet
+    assert fleet.count("server1") == 2
+    assert fleet.count("server3") == 0
+    assert fleet.index("server2") == 1
+    with pytest.raises(ValueError):
+        fleet.index("server3")
+    with pytest.raises(ValueError):
+        fleet.remove("server3")
+    assert [1] not in fleet # unhashable items are looked up in the list
+
+def test_indexed_matches_a_list_after_random_changes():
+    rng = random.Random(42)
+    fleet = IndexedFleet()
+    reference = []
+    for _ in range(3000):
+        operation = rng.choice(["append", "insert", "pop", "pop_end", "remove", "setitem", "delitem", "extend",
+                                "sort", "reverse", "slice", "imul", "iadd"])
+        value = rng.randrange(20)
+        if operation == "append":
+            fleet.append(value); reference.append(value)
+        elif operation == "insert":
+            position = rng.randrange(-5, len(reference) + 5)
+            fleet.insert(position, value); reference.insert(position, value)
+        elif operation == "extend":
+            values = [rng.randrange(20) for _ in range(3)]
+            fleet.extend(iter(values)); reference.extend(values)
+        elif operation == "iadd":
+            values = [rng.randrange(20) for _ in range(2)]
+            fleet += values; reference += values
+        elif reference and operation == "pop":
+            position = rng.randrange(-len(reference), len(reference))
+            assert fleet.pop(position) == reference.pop(position)
+        elif reference and operation == "pop_end":
+            assert fleet.pop() == reference.pop()
+        elif operation == "remove" and value in reference:
+            fleet.remove(value); reference.remove(value)
+        elif reference and operation == "setitem":
+            position = rng.randrange(-len(reference), len(reference))
+            fleet[position] = value; reference[position] = value
+        elif reference and operation == "delitem":
+            position = rng.randrange(-len(reference), len(reference))
+            del fleet[position]; del reference[position]
+        elif operation == "sort":
+            fleet.sort(); reference.sort()
+        elif operation == "reverse":
+            fleet.reverse(); reference.reverse()
+        elif operation == "slice":
+            fleet[1:3] = [value]; reference[1:3] = [value]
+        elif operation == "imul" and len(reference) < 50:
+            fleet *= 2; reference *= 2
+        if len(reference) > 200:
+            fleet.clear(); reference.clear()
+        assert fleet.servers == reference
+        probe = rng.randrange(20)
+        assert (probe in fleet) == (probe in reference)
+        assert fleet.count(probe) == reference.count(probe)
+        if probe in reference:
+            assert fleet.index(probe) == reference.index(probe)
+
+def test_indexed_rejects_unhashable_items_without_changing_the_list():
+    fleet = IndexedFleet(["server1"])
+    with pytest.raises(TypeError):
+        fleet.append(["not", "hashable"])
+    with pytest.raises(TypeError):
+        fleet.extend(["server2", {}])
+    assert fleet == ["server1"]
+    assert fleet.count("server1") == 1
+
+def test_indexed_rebuilds_the_index_when_the_attribute_is_replaced():
+    fleet = IndexedFleet(["server1"])
+    assert "server1" in fleet
+    fleet.servers = ["server2"]
+    assert "server1" not in fleet
+    assert "server2" in fleet
+    fleet.servers.append("server3") # a direct append changes the length, which is detected
+    assert fleet.index("server3") == 1
+
+def test_indexed_with_slots_and_array_storage():
+    @act_as_list('values', storage="array", typecode="l", slots=True, indexed=True)
+    class Ids:
+        __slots__ = ()
+        def __init__(self, values=()):
+            self.values = values
+    ids = Ids([5, 6, 5])
+    assert not hasattr(ids, "__dict__")
+    assert ids.count(5) == 2
+    ids.append(7)
+    assert ids.index(7) == 3
+    with pytest.raises(TypeError):
+        ids.append("eight") # the array raises before the index is changed
+    assert ids.count(7) == 1
+
+class Job:
+    def __init__(self, name, priority):
+        self.name, self.priority = name, priority
+    def __eq__(self, other):
+        return isinstance(other, Job) and (self.name, self.priority) == (other.name, other.priority)
+    def __repr__(self):
+        return f"Job({self.name!r}, {self.priority})"
+
+@act_as_list('jobs', sorted_by=lambda job: job.priority)
+class JobQueue:
+    def __init__(self, jobs=()):
+        self.jobs = jobs
+
+@act_as_list('numbers', sorted_by=True)
+class SortedNumbers:
+    def __init__(self, numbers=()):
+        self.numbers = numbers
+
+def test_sorted_by_sorts_what_is_assigned():
+    numbers = [3, 1, 2]
+    sorted_numbers = SortedNumbers(numbers)
+    assert sorted_numbers == [1, 2, 3]
+    assert numbers == [3, 1, 2] # the list that was assigned is not changed
+    sorted_numbers.numbers = [9, 8]
+    assert sorted_numbers.numbers == [8, 9]
+
+def test_sorted_by_keeps_items_sorted():
+    rng = random.Random(1)
+    sorted_numbers = SortedNumbers()
+    for _ in range(200):
+        sorted_numbers.append(rng.randrange(50))
+    sorted_numbers.extend(rng.randrange(50) for _ in range(100)) # more than _SORTED_EXTEND_ONE_BY_ONE: sorted in one go
+    sorted_numbers += [7, 3]
+    assert sorted_numbers.numbers == sorted(sorted_numbers.numbers)
+    assert len(sorted_numbers) == 302
+    sorted_numbers.sort() # does nothing, so code that sorts after appending still works
+    for value in range(50):
+        assert sorted_numbers.count(value) == sorted_numbers.numbers.count(value)
+        assert (value in sorted_numbers) == (value in sorted_numbers.numbers)
+        if value in sorted_numbers.numbers:
+            assert sorted_numbers.index(value) == sorted_numbers.numbers.index(value)
+
+def test_sorted_by_key_function():
+    queue = JobQueue([Job("b", 2), Job("a", 1)])
+    queue.append(Job("c", 1))
+    assert [job.name for job in queue] == ["a", "c", "b"] # stable: "c" goes after "a", which has the same priority
+    assert Job("c", 1) in queue
+    assert Job("c", 2) not in queue
+    assert queue.index(Job("c", 1)) == 1
+    assert queue.count(Job("a", 1)) == 1
+    queue.remove(Job("a", 1))
+    assert [job.name for job in queue] == ["c", "b"]
+    with pytest.raises(ValueError):
+        queue.index(Job("z", 1))
+
+def test_sorted_by_irange_bisect_and_rank():
+    sorted_numbers = SortedNumbers([1, 3, 3, 5, 7, 9])
+    assert list(sorted_numbers.irange(3, 7)) == [3, 3, 5, 7]
+    assert list(sorted_numbers.irange(3, 7, inclusive=(False, False))) == [5]
+    assert list(sorted_numbers.irange(hi=3)) == [1, 3, 3]
+    assert list(sorted_numbers.irange(lo=8)) == [9]
+    assert sorted_numbers.bisect_left(3) == 1
+    assert sorted_numbers.bisect_right(3) == 3
+    assert sorted_numbers.rank(5) == 3
+    queue = JobQueue([Job("a", 1), Job("b", 5), Job("c", 10)])
+    assert [job.name for job in queue.irange(2, 10)] == ["b", "c"] # with a key function, lo and hi are keys
+
+def test_sorted_by_positions_raise():
+    sorted_numbers = SortedNumbers([1, 2])
+    with pytest.raises(TypeError):
+        sorted_numbers.insert(0, 5)
+    with pytest.raises(TypeError):
+        sorted_numbers[0] = 5
+    with pytest.raises(TypeError):
+        sorted_numbers.reverse()
+    with pytest.raises(TypeError):
+        sorted_numbers.sort(reverse=True)
+    assert list(reversed(sorted_numbers)) == [2, 1]
+    del sorted_numbers[0] # deleting keeps the order
+    assert sorted_numbers.pop() == 2
+    sorted_numbers.extend([2, 1])
+    sorted_numbers *= 2
+    assert sorted_numbers == [1, 1, 2, 2]
+
+def test_sorted_by_with_array_storage():
+    @act_as_list('values', storage="array", typecode="d", sorted_by=True)
+    class SortedValues:
+        def __init__(self, values=()):
+            self.values = values
+    values = SortedValues([3, 1, 2])
+    assert values.values == array.array("d", [1.0, 2.0, 3.0])
+    values.append(1.5)
+    assert values == [1.0, 1.5, 2.0, 3.0]
+    assert 1.5 in values
+
+def test_sorted_by_invalid_arguments():
+    with pytest.raises(TypeError):
+        act_as_list('numbers', sorted_by="priority")
+    with pytest.raises(ValueError):
+        act_as_list('numbers', sorted_by=True, indexed=True)
+
+from collections import deque
+
+@act_as_list('jobs', storage="deque")
+class WorkQueue:
+    def __init__(self, jobs=()):
+        self.jobs = jobs
+
+@act_as_list('readings', storage="deque", maxlen=3)
+class LastReadings:
+    def __init__(self, readings=()):
+        self.readings = readings
+
+def test_deque_storage():
+    queue = WorkQueue(["b", "c"])
+    assert isinstance(queue.jobs, deque)
+    queue.appendleft("a")
+    queue.append("d")
+    assert queue == ["a", "b", "c", "d"]
+    assert queue.popleft() == "a"
+    assert queue.pop(0) == "b"
+    assert queue.pop() == "d"
+    queue.extend(["e", "f"])
+    queue.extendleft(["y", "z"])
+    assert queue == ["z", "y", "c", "e", "f"]
+    queue.rotate(1)
+    assert queue == ["f", "z", "y", "c", "e"]
+    assert queue.pop(2) == "y"
+    queue.insert(0, "x")
+    assert queue[0] == "x" and queue[-1] == "e"
+    assert "c" in queue and queue.index("c") == 3 and queue.count("c") == 1
+    queue.remove("c")
+    queue.sort()
+    assert queue == ["e", "f", "x", "z"]
+    assert queue.maxlen is None
+
+def test_deque_slices():
+    queue = WorkQueue(["a", "b", "c", "d"])
+    assert queue[1:3] == deque(["b", "c"])
+    assert queue[::-1] == deque(["d", "c", "b", "a"])
+    jobs = queue.jobs
+    queue[1:3] = ["x"]
+    assert queue == ["a", "x", "d"]
+    del queue[:1]
+    assert queue == ["x", "d"]
+    assert queue.jobs is jobs # changed in place
+    assert list(reversed(queue)) == ["d", "x"]
+    queue += ["e"]
+    assert queue + ["f"] == deque(["x", "d", "e", "f"])
+    assert ["w"] + queue == deque(["w", "x", "d", "e"])
+
+def test_deque_maxlen_ring_buffer():
+    readings = LastReadings([1, 2, 3, 4])
+    assert readings == [2, 3, 4]
+    assert readings.maxlen == 3
+    readings.append(5)
+    assert readings == [3, 4, 5]
+    readings.appendleft(0)
+    assert readings == [0, 3, 4]
+    readings[0:1] = [7, 8] # too many items for maxlen: the first ones are dropped, as with extend()
+    assert readings == [8, 3, 4]
+    readings.readings = deque([1, 2]) # converted, to keep the maxlen
+    assert readings.readings.maxlen == 3
+
+def test_deque_invalid_arguments():
+    with pytest.raises(ValueError):
+        act_as_list('jobs', maxlen=3)
+    with pytest.raises(ValueError):
+        act_as_list('jobs', storage="deque", indexed=True)
+    with pytest.raises(ValueError):
+        act_as_list('jobs', storage="deque", sorted_by=True)
+
+import json
+
+@act_as_list('records', storage="lazy")
+class Export:
+    def __init__(self, records):
+        self.records = records
+
+def test_lazy_storage_over_a_jsonl_file(tmp_path):
+    from useful_tools.lazy_records import LazyRecords
+    path = tmp_path / "export.jsonl"
+    path.write_text("".join(json.dumps({"id": i}) + "\n" for i in range(2500)))
+    export = Export(str(path))
+    assert isinstance(export.records, LazyRecords)
+    assert export[1234] == {"id": 1234}
+    assert len(export) == 2500
+    assert export[-1] == {"id": 2499}
+    assert sum(record["id"] for record in export) == sum(range(2500))
+    assert {"id": 3} in export
+    assert export.index({"id": 7}) == 7
+    assert export.count({"id": 7}) == 1
+    assert export[:2] == [{"id": 0}, {"id": 1}]
+    assert (export + [{"id": "extra"}])[-1] == {"id": "extra"}
+    assert Export(iter([{"id": 0}, {"id": 1}])) == [{"id": 0}, {"id": 1}]
+    export.records.close()
+
+def test_lazy_storage_over_an_iterator():
+    export = Export(({"id": i} for i in range(5)))
+    assert export[2] == {"id": 2}
+    assert list(reversed(export)) == [{"id": i} for i in reversed(range(5))]
+    assert export.copy() == [{"id": i} for i in range(5)]
+
+def test_lazy_storage_is_read_only():
+    export = Export([1, 2, 3])
+    for change in (lambda: export.append(4), lambda: export.pop(), lambda: export.insert(0, 1), lambda: export.extend([4]),
+                   lambda: export.remove(1), lambda: export.clear(), lambda: export.sort(), lambda: export.reverse(),
+                   lambda: export.__setitem__(0, 1), lambda: export.__delitem__(0)):
+        with pytest.raises(TypeError):
+            change()
+    with pytest.raises(TypeError):
+        export += [4]
+    assert export == [1, 2, 3]
+
+def test_lazy_storage_invalid_arguments():
+    with pytest.raises(ValueError):
+        act_as_list('records', storage="lazy", indexed=True)
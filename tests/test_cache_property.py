@@ -10,6 +10,7 @@ class MyClass:
         self.number_of_calls += 1
         return "my_property"
 
+
 def test_cache_property():
     my_class = MyClass()
 
@@ -21,4 +22,84 @@ def test_cache_property():
     # Call the property for the second time
     result = my_class.my_property
     assert result == "my_property"
-    assert my_class.number_of_calls == 1  # The number of calls should still be 1 because the result is cached
\ No newline at end of file
+    assert my_class.number_of_calls == 1  # The number of calls should still be 1 because the result is cached
+
+
+class Report:
+    def __init__(self):
+        self.number_of_calls = 0
+
+    @cache_property
+    def total(self):
+        self.number_of_calls += 1
+        return 42
+
+
+def test_cache_property_without_property():
+    report = Report()
+    assert report.total == 42
+    assert report.total == 42
+    assert report.number_of_calls == 1
+    # the value shadows the descriptor in the instance __dict__, so later reads don't call any Python code
+    assert report.__dict__["total"] == 42
+
+
+def test_cache_property_invalidate():
+    report = Report()
+    assert report.total == 42
+    Report.total.invalidate(report)
+    assert report.total == 42
+    assert report.number_of_calls == 2
+    Report.total.invalidate(Report()) # never accessed, nothing to forget
+
+
+def test_cache_property_can_be_assigned():
+    report = Report()
+    report.total = 1
+    assert report.total == 1
+    assert report.number_of_calls == 0
+
+
+class SlottedReport:
+    __slots__ = ("number_of_calls", "_total")
+
+    def __init__(self):
+        self.number_of_calls = 0
+
+    @cache_property
+    def total(self):
+        self.number_of_calls += 1
+        return 42
+
+
+def test_cache_property_with_slots():
+    report = SlottedReport()
+    assert report.total == 42
+    assert report.total == 42
+    assert report.number_of_calls == 1
+    SlottedReport.total.invalidate(report)
+    assert report.total == 42
+    assert report.number_of_calls == 2
+
+
+class SlottedReportWithoutSlotForTheValue:
+    __slots__ = ()
+
+    @cache_property
+    def total(self):
+        return 42
+
+
+def test_cache_property_with_slots_but_no_slot_for_the_value():
+    with pytest.raises(TypeError, match="_total"):
+        SlottedReportWithoutSlotForTheValue().total
+
+
+def test_cache_property_keeps_the_docstring():
+    class Documented:
+        @cache_property
+        def value(self):
+            """the value"""
+            return 1
+    assert Documented.value.__doc__ == "the value"
+    assert Documented.value.__name__ == "value"
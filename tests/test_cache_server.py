@@ -0,0 +1,207 @@
+import os
+import time
+import shutil
+import inspect
+import pytest
+from useful_tools.cache_server import CacheServer, RemoteCacheClient, RemoteCacheError, _ExpiringStore
+from useful_tools.cache_to_disk import cache_to_disk, execute_with_cache
+
+def _test_name():
+    """
+    Get the test name (the function name, basically)
+    As we're testing caching, the test name is included in the arguments, so the tests don't share cache entries.
+    """
+    return str(inspect.stack()[1].function)
+
+server = None
+
+def setup_module(module):
+    global server
+    server = CacheServer(port=0).start() # port 0 picks a free port
+
+def teardown_module(module):
+    server.stop()
+    try:
+        shutil.rmtree(MyClass.cache_dir)
+    except: # pragma: no cover
+        pass # pragma: no cover
+
+class MyClass:
+    cache_enabled = True
+    cache_dir = "test_cache_remote"
+    cache_expiration = 2 # seconds
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    def __init__(self, near_cache=False):
+        self.cache_backend = RemoteCacheClient(*server.address)
+        self.cache_near_cache = near_cache
+        self.number_of_calls = 0
+
+    def __repr__(self):
+        return "MyClass()" # the same on all "nodes", so they share the cache
+
+    @cache_to_disk
+    def my_method(self, *args):
+        self.number_of_calls += 1
+        return f"my_method called with {args}"
+
+def test_get_set_delete():
+    client = RemoteCacheClient(*server.address)
+    assert client.get("test_get_set_delete") is None
+    client.set("test_get_set_delete", b"value\nwith newline", ttl=10)
+    assert client.get("test_get_set_delete") == b"value\nwith newline"
+    assert client.delete("test_get_set_delete") == True
+    assert client.delete("test_get_set_delete") == False
+    assert client.get("test_get_set_delete") is None
+
+def test_ttl():
+    client = RemoteCacheClient(*server.address)
+    client.set("test_ttl", b"value", ttl=0.1)
+    assert client.get("test_ttl") == b"value"
+    time.sleep(0.2)
+    assert client.get("test_ttl") is None
+
+def test_expired_entries_are_removed_when_entries_are_stored():
+    store = _ExpiringStore()
+    for i in range(1000):
+        store.set(f"key{i}", b"value", 0.01)
+    time.sleep(0.02)
+    store.set("other", b"value", None) # the expired entries are removed, although they are never read again
+    assert len(store) == 1
+    for i in range(1000):
+        store.set("same key", b"value", 60)
+    assert len(store._expirations) <= 2 * len(store) + 64
+
+def test_pipelined_get_many():
+    client = RemoteCacheClient(*server.address)
+    client.set("test_pipelined_get_many_1", b"one")
+    client.set("test_pipelined_get_many_3", b"")
+    assert client.get_many(["test_pipelined_get_many_1", "test_pipelined_get_many_2", "test_pipelined_get_many_3"]) == [b"one", None, b""]
+    assert client.get_many([]) == []
+
+def test_connections_are_reused():
+    client = RemoteCacheClient(*server.address)
+    client.get("test_connections_are_reused")
+    connection = client._idle_connections.get_nowait()
+    client._idle_connections.put_nowait(connection)
+    client.get("test_connections_are_reused")
+    assert client._idle_connections.get_nowait() is connection
+    client.close()
+
+def test_invalid_key():
+    client = RemoteCacheClient(*server.address)
+    with pytest.raises(ValueError):
+        client.get("key with spaces")
+
+def test_cache_to_disk_with_remote_backend_is_shared_between_nodes():
+    test = _test_name()
+    node1 = MyClass()
+    node2 = MyClass()
+    node1.my_method(test)
+    assert "remote_cache_saved" in node1.cache_status_dict[node1.last_saved_cache_file_key]
+    assert node1.last_saved_cache_file is None # nothing is saved in cache_dir without a near cache
+    assert node2.my_method(test) == f"my_method called with {(test,)}"
+    assert node2.number_of_calls == 0 # the result computed on node1 was used
+    assert any("remote_cache_loaded" in log for log in node2.cache_status_dict.values() if isinstance(log, list))
+
+def test_near_cache():
+    test = _test_name()
+    node1 = MyClass()
+    node1.my_method(test)
+    node2 = MyClass(near_cache=True)
+    node2.my_method(test) # loaded from the server, and saved in the near cache
+    status_log = [log for log in node2.cache_status_dict.values() if isinstance(log, list)][-1]
+    assert "remote_cache_loaded" in status_log
+    assert "cache_saved" in status_log
+    node2.cache_backend.close()
+    node2.cache_backend = RemoteCacheClient("127.0.0.1", 1) # nothing listens here, so only the near cache can be used
+    assert node2.my_method(test) == f"my_method called with {(test,)}"
+    assert node2.number_of_calls == 0
+
+def test_unreachable_server_is_a_cache_miss():
+    test = _test_name()
+    node = MyClass()
+    node.cache_backend = RemoteCacheClient("127.0.0.1", 1, timeout=0.5)
+    assert node.my_method(test) == f"my_method called with {(test,)}"
+    assert node.number_of_calls == 1
+    status_log = node.cache_status_dict[node.last_saved_cache_file_key]
+    assert any(entry.startswith("remote_cache_error") for entry in status_log)
+
+def test_delete_last_saved_cache_file_deletes_remote_entry():
+    test = _test_name()
+    node = MyClass()
+    node.my_method(test)
+    key = node.last_saved_cache_file_key
+    assert node.cache_backend.get(key) is not None
+    node.delete_last_saved_cache_file()
+    assert node.cache_backend.get(key) is None
+
+def test_execute_with_cache_with_remote_backend():
+    test = _test_name()
+    class Config:
+        cache_enabled = True
+        cache_dir = "test_cache_remote"
+        cache_expiration = 2
+        force_cache_expiration = False
+        ignore_cache_expiration = False
+        cache_backend = RemoteCacheClient(*server.address)
+    calls = []
+    def my_function(*args):
+        calls.append(args)
+        return "result"
+    assert execute_with_cache(my_function, (test,), {}, config=Config()) == "result"
+    assert execute_with_cache(my_function, (test,), {}, config=Config()) == "result"
+    assert len(calls) == 1
+
+class _FailingBackend:
+    """a backend whose server answers every request with an error"""
+    def get(self, key):
+        raise RemoteCacheError("ERROR out of memory")
+
+    def set(self, key, value, ttl=None):
+        raise RemoteCacheError("ERROR out of memory")
+
+def test_server_error_is_a_cache_miss():
+    test = _test_name()
+    node = MyClass()
+    node.cache_backend = _FailingBackend()
+    assert node.my_method(test) == f"my_method called with {(test,)}"
+    assert node.my_method(test) == f"my_method called with {(test,)}"
+    assert node.number_of_calls == 2
+    status_log = node.cache_status_dict[node.last_saved_cache_file_key]
+    assert "remote_cache_error: ERROR out of memory" in status_log
+    assert "remote_cache_saved" not in status_log
+
+def test_server_error_reply_raises_remote_cache_error():
+    client = RemoteCacheClient(*server.address)
+    with client._connection() as connection:
+        connection.socket.sendall(b"BOGUS\n")
+        with pytest.raises(RemoteCacheError):
+            connection.read_response()
+
+def test_signed_values():
+    client = RemoteCacheClient(*server.address, secret="secret")
+    client.set("test_signed_values", b"value")
+    assert client.get("test_signed_values") == b"value"
+    raw = RemoteCacheClient(*server.address).get("test_signed_values")
+    assert raw.endswith(b"value") and len(raw) > len(b"value") # stored with its signature
+    RemoteCacheClient(*server.address).set("test_signed_values", raw[:-1] + b"!") # tampered with
+    with pytest.raises(RemoteCacheError):
+        client.get("test_signed_values")
+    RemoteCacheClient(*server.address).set("test_signed_values_unsigned", b"value")
+    with pytest.raises(RemoteCacheError):
+        client.get("test_signed_values_unsigned")
+    assert client.get_many(["test_signed_values_missing"]) == [None]
+
+def test_value_signed_with_another_secret_is_a_cache_miss():
+    test = _test_name()
+    node1 = MyClass()
+    node1.cache_backend = RemoteCacheClient(*server.address, secret=b"secret 1")
+    node1.my_method(test)
+    node2 = MyClass()
+    node2.cache_backend = RemoteCacheClient(*server.address, secret=b"secret 2")
+    assert node2.my_method(test) == f"my_method called with {(test,)}"
+    assert node2.number_of_calls == 1 # the value wasn't unpickled
+    status_log = [log for log in node2.cache_status_dict.values() if isinstance(log, list)][-1]
+    assert any(entry.startswith("remote_cache_error: invalid signature") for entry in status_log)
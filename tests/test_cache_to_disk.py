@@ -1,3 +1,4 @@
+import os
 import pytest
 import time
 import shutil
@@ -365,3 +366,99 @@ def test_that_using_supplemental_hash_info_produces_different_cache_files():
     cache_file_name2 = my_class.cache_status_dict["last_saved_cache_file"]
     assert my_class.number_of_method_calls_total == 2
     assert cache_file_name1 != cache_file_name2
+
+class ServiceWithCacheKey:
+    # the default repr contains the memory address, so without __cache_key__ two instances would never share the cache
+    cache_enabled = True
+    cache_dir = "test_cache"
+    cache_expiration = 2
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    def __init__(self, customer_id):
+        self.customer_id = customer_id
+        self.big_attribute = list(range(1000))
+        self.number_of_calls = 0
+
+    def __cache_key__(self):
+        return self.customer_id
+
+    @cache_to_disk
+    def my_method(self, *args):
+        self.number_of_calls += 1
+        return self.customer_id
+
+class ServiceWithCacheKeyAttrs(ServiceWithCacheKey):
+    @cache_to_disk(cache_key_attrs=["customer_id"])
+    def my_other_method(self, *args):
+        self.number_of_calls += 1
+        return self.customer_id
+
+def test_cache_key_protocol():
+    test = _test_name()
+    ServiceWithCacheKey("customer1").my_method(test)
+    other_instance = ServiceWithCacheKey("customer1")
+    other_instance.big_attribute.append("not part of the cache key")
+    assert other_instance.my_method(test) == "customer1"
+    assert other_instance.number_of_calls == 0 # the result of the first instance was used
+    different_customer = ServiceWithCacheKey("customer2")
+    assert different_customer.my_method(test) == "customer2"
+    assert different_customer.number_of_calls == 1
+
+def test_cache_key_attrs():
+    test = _test_name()
+    ServiceWithCacheKeyAttrs("customer1").my_other_method(test)
+    other_instance = ServiceWithCacheKeyAttrs("customer1")
+    assert other_instance.my_other_method(test) == "customer1"
+    assert other_instance.number_of_calls == 0 # the result of the first instance was used
+    different_customer = ServiceWithCacheKeyAttrs("customer2")
+    assert different_customer.my_other_method(test) == "customer2"
+    assert different_customer.number_of_calls == 1
+
+class StreamingClass:
+    cache_enabled = True
+    cache_dir = "test_cache"
+    cache_expiration = 2
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    def __init__(self):
+        self.number_of_calls = 0
+
+    def __repr__(self):
+        return "StreamingClass()"
+
+    @cache_to_disk
+    def export(self, name, n):
+        self.number_of_calls += 1
+        for i in range(n):
+            yield {"row": i}
+
+def test_cache_to_disk_on_generator():
+    test = _test_name()
+    my_class = StreamingClass()
+    assert list(my_class.export(test, 3)) == [{"row": 0}, {"row": 1}, {"row": 2}]
+    key = my_class.last_saved_cache_file_key
+    assert os.path.exists(my_class.last_saved_cache_file)
+    assert "cache_saved" in my_class.cache_status_dict[key]
+    stream = my_class.export(test, 3)
+    assert "cache_loaded" in my_class.cache_status_dict[key]
+    assert next(stream) == {"row": 0} # replayed lazily from the cache file
+    assert list(stream) == [{"row": 1}, {"row": 2}]
+    assert my_class.number_of_calls == 1
+
+def test_cache_to_disk_on_partially_consumed_generator():
+    test = _test_name()
+    my_class = StreamingClass()
+    stream = my_class.export(test, 1000)
+    next(stream)
+    assert my_class.last_saved_cache_file is None # nothing is saved until the stream has been consumed completely
+    stream.close() # abandoned before the end, so it must not be saved
+    assert my_class.last_saved_cache_file is None
+    assert my_class.last_saved_cache_file_key is None
+    key = next(key for key, log in my_class.cache_status_dict.items() if isinstance(log, list))
+    assert "stream_incomplete_not_saved" in my_class.cache_status_dict[key]
+    assert not os.path.exists(os.path.join(StreamingClass.cache_dir, f"{key}.pkl"))
+    assert [name for name in os.listdir(StreamingClass.cache_dir) if name.endswith(".partial")] == []
+    assert len(list(my_class.export(test, 1000))) == 1000
+    assert my_class.number_of_calls == 2
@@ -0,0 +1,116 @@
+import shutil
+import asyncio
+import inspect
+import pytest
+from useful_tools.cache_to_disk import cache_to_disk
+from useful_tools.cache_to_disk_async import cache_to_disk as async_cache_to_disk, execute_with_cache
+
+def _test_name():
+    """
+    Get the test name (the function name, basically)
+    As we're testing caching, the test name is included in the arguments, so the tests don't share cache files.
+    """
+    return str(inspect.stack()[1].function)
+
+class MyClass:
+    cache_enabled = True
+    cache_dir = "test_cache_async"
+    cache_expiration = 2 # seconds
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    def __init__(self):
+        self.number_of_calls = 0
+
+    def __repr__(self):
+        return "MyClass()"
+
+    @cache_to_disk # the sync decorator hands async methods over to the async variant
+    async def my_method(self, *args):
+        self.number_of_calls += 1
+        await asyncio.sleep(0.05)
+        return f"my_method called with {args}"
+
+    @async_cache_to_disk
+    async def failing_method(self, *args):
+        self.number_of_calls += 1
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream failed")
+
+def teardown_module(module):
+    try:
+        shutil.rmtree(MyClass.cache_dir)
+    except: # pragma: no cover
+        pass # pragma: no cover
+
+def test_awaited_result_is_cached():
+    test = _test_name()
+    async def test_async():
+        my_class = MyClass()
+        assert await my_class.my_method(test) == f"my_method called with {(test,)}"
+        key = my_class.last_saved_cache_file_key
+        assert await my_class.my_method(test) == f"my_method called with {(test,)}"
+        assert my_class.number_of_calls == 1
+        assert "cache_loaded" in my_class.cache_status_dict[key]
+        assert inspect.iscoroutinefunction(MyClass.my_method)
+    asyncio.run(test_async())
+
+def test_result_is_shared_between_event_loops_through_the_cache_file():
+    test = _test_name()
+    my_class = MyClass()
+    asyncio.run(my_class.my_method(test))
+    asyncio.run(my_class.my_method(test))
+    assert my_class.number_of_calls == 1
+
+def test_concurrent_calls_are_deduplicated():
+    test = _test_name()
+    async def test_async():
+        my_class = MyClass()
+        results = await asyncio.gather(*(my_class.my_method(test) for _ in range(10)))
+        assert results == [f"my_method called with {(test,)}"] * 10
+        assert my_class.number_of_calls == 1
+    asyncio.run(test_async())
+
+def test_exception_is_shared_and_not_cached():
+    test = _test_name()
+    async def test_async():
+        my_class = MyClass()
+        results = await asyncio.gather(*(my_class.failing_method(test) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert my_class.number_of_calls == 1
+        with pytest.raises(ValueError):
+            await my_class.failing_method(test)
+        assert my_class.number_of_calls == 2 # the failure was not cached
+    asyncio.run(test_async())
+
+def test_cache_disabled():
+    test = _test_name()
+    async def test_async():
+        my_class = MyClass()
+        my_class.cache_enabled = False
+        await my_class.my_method(test)
+        await my_class.my_method(test)
+        assert my_class.number_of_calls == 2
+    asyncio.run(test_async())
+
+def test_async_decorator_on_sync_function():
+    with pytest.raises(TypeError):
+        class IncorrectUsage:
+            @async_cache_to_disk
+            def my_method(self):
+                pass # pragma: no cover
+
+def test_execute_with_cache():
+    test = _test_name()
+    calls = []
+    async def my_function(*args):
+        calls.append(args)
+        return "result"
+    async def test_async():
+        config = MyClass()
+        assert await execute_with_cache(my_function, (test,), {}, config=config) == "result"
+        assert await execute_with_cache(my_function, (test,), {}, config=config) == "result"
+        assert len(calls) == 1
+        with pytest.raises(ValueError):
+            await execute_with_cache(my_function, (test,), {})
+    asyncio.run(test_async())
@@ -1,5 +1,14 @@
+import gc
+import random
+import asyncio
+import time
+import pickle
+import weakref
+import threading
+from dataclasses import dataclass
+from collections import OrderedDict
 import pytest
-from useful_tools.cache_to_memory import cache_to_memory
+from useful_tools.cache_to_memory import cache_to_memory, memory_cache_usage, _deep_sizeof, _MemoryCache, _MISSING
 
 class MyClass:
     def __init__(self):
@@ -97,3 +106,568 @@ def test_cache_with_kwargs_in_different_order_with_other_random_calls_between_th
     # call with same arguments in a different order, which should be cached
     my_class.my_method(my_other_kwarg = "my_other_value", my_kwarg = "my_value") # should be cached, so no new call
     assert my_class.number_of_calls == 4
+
+class MyStreamingClass:
+    def __init__(self):
+        self.number_of_calls = 0
+
+    @cache_to_memory
+    def my_generator(self, n):
+        self.number_of_calls += 1
+        for i in range(n):
+            yield i
+
+def test_cache_to_memory_on_generator():
+    my_class = MyStreamingClass()
+    assert list(my_class.my_generator(3)) == [0, 1, 2]
+    assert list(my_class.my_generator(3)) == [0, 1, 2] # replayed from the cache
+    assert my_class.number_of_calls == 1
+
+def test_cache_to_memory_on_partially_consumed_generator():
+    my_class = MyStreamingClass()
+    stream = my_class.my_generator(5)
+    assert next(stream) == 0
+    stream.close() # abandoned before the end, so it must not be cached
+    assert list(my_class.my_generator(5)) == [0, 1, 2, 3, 4]
+    assert my_class.number_of_calls == 2
+    assert list(my_class.my_generator(5)) == [0, 1, 2, 3, 4]
+    assert my_class.number_of_calls == 2
+
+def test_cache_to_memory_maxsize_lru():
+    calls = []
+    @cache_to_memory(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+    square(1)
+    square(2)
+    square(1) # 1 is now the most recently used
+    square(3) # evicts 2
+    assert square.cache_info().currsize == 2
+    square(1)
+    square(2)
+    assert calls == [1, 2, 3, 2]
+
+def test_cache_to_memory_maxsize_lfu():
+    calls = []
+    @cache_to_memory(maxsize=2, policy="lfu")
+    def square(x):
+        calls.append(x)
+        return x * x
+    square(1)
+    square(1)
+    square(1) # 1 is used often
+    square(2)
+    square(3) # evicts 2, the least frequently used
+    square(1)
+    square(2)
+    assert calls == [1, 2, 3, 2]
+
+def test_cache_to_memory_lfu_evicts_like_a_full_scan():
+    # the frequency buckets must pick the same result as looking at all of them:
+    # the fewest hits, and on a tie the least recently used
+    random.seed(34)
+    cache = _MemoryCache(maxsize=8, policy="lfu")
+    reference = OrderedDict() # key -> number of hits, least recently used first
+    for _ in range(5000):
+        key = random.randrange(20)
+        if key in reference and random.random() < 0.1:
+            cache.set(key, key) # replaced: keeps its number of hits, and becomes the most recently used
+            reference.move_to_end(key)
+        elif key in reference:
+            assert cache.get(key) == key
+            reference[key] += 1
+            reference.move_to_end(key)
+        else:
+            assert cache.get(key) is _MISSING
+            if len(reference) == 8:
+                del reference[min(reference, key=reference.get)]
+            cache.set(key, key)
+            reference[key] = 0
+        assert list(cache._entries) == list(reference)
+    cache.clear()
+    assert cache._keys_by_use_count == {}
+
+def test_cache_to_memory_expired_results_are_removed_when_results_are_added():
+    @cache_to_memory(ttl=0.01)
+    def square(x):
+        return x * x
+    for i in range(1000):
+        square(i)
+    time.sleep(0.02)
+    square(-1) # the results that expired are removed, although they are never looked up again
+    assert square.cache_info().currsize == 1
+
+def test_cache_to_memory_expirations_of_replaced_results_are_dropped():
+    cache = _MemoryCache(ttl=60)
+    for i in range(1000):
+        cache.set("same key", i)
+    assert len(cache._expirations) <= 2 * len(cache._entries) + 64
+    assert cache.get("same key") == 999
+
+def test_cache_to_memory_ttl():
+    calls = []
+    @cache_to_memory(ttl=0.05)
+    def square(x):
+        calls.append(x)
+        return x * x
+    square(2)
+    square(2)
+    assert calls == [2]
+    time.sleep(0.06)
+    square(2)
+    assert calls == [2, 2]
+
+def test_cache_to_memory_cache_info_and_cache_clear():
+    @cache_to_memory(maxsize=10)
+    def square(x):
+        return x * x
+    square(2)
+    square(2)
+    square(3)
+    assert square.cache_info() == (1, 2, 10, 2)
+    square.cache_clear()
+    assert square.cache_info() == (0, 0, 10, 0)
+
+def test_cache_to_memory_bounded_with_unhashable_args():
+    calls = []
+    @cache_to_memory(maxsize=1)
+    def total(values):
+        calls.append(values)
+        return sum(values)
+    assert total([1, 2]) == 3
+    assert total([1, 2]) == 3
+    assert total([3, 4]) == 7
+    assert total([1, 2]) == 3
+    assert len(calls) == 3
+
+def test_cache_to_memory_unknown_policy():
+    with pytest.raises(ValueError):
+        cache_to_memory(policy="fifo")
+
+def test_cache_to_memory_fast_key_for_hashable_args():
+    calls = []
+    @cache_to_memory
+    def describe(*args, **kwargs):
+        calls.append((args, kwargs))
+        return len(calls)
+    assert describe(1, "a", b=2, c=3) == 1
+    assert describe(1, "a", c=3, b=2) == 1 # same kwargs in a different order
+    assert describe(1, ("b", 2), ("c", 3)) == 2 # args that look like the kwargs are a different call
+    assert describe(1, "a", [1, 2]) == 3 # unhashable, uses make_arg_hash
+    assert describe(1, "a", [1, 2]) == 3
+    assert describe(1, "a", ([1, 2],)) == 4 # tuple containing a list is unhashable too
+    assert describe(1, "a", ([1, 2],)) == 4
+    assert len(calls) == 4
+
+def test_cache_to_memory_equal_args_of_different_types_are_different_calls():
+    calls = []
+    @cache_to_memory
+    def describe(value, flag=None):
+        calls.append(value)
+        return repr(value)
+    assert describe(1) == "1"
+    assert describe(1.0) == "1.0"
+    assert describe(True) == "True"
+    assert describe(1, flag=1) == "1"
+    assert describe(1, flag=True) == "1"
+    assert describe(1) == "1"
+    assert calls == [1, 1.0, True, 1, 1]
+
+class ShortLivedRequest:
+    def __init__(self, payload):
+        self.payload = payload
+
+    @cache_to_memory
+    def parsed(self):
+        return {"payload": self.payload}
+
+def test_cache_to_memory_frees_the_results_with_the_instance():
+    request = ShortLivedRequest("a")
+    request.parsed()
+    assert ShortLivedRequest.parsed.cache_info().currsize == 1
+    request_ref = weakref.ref(request)
+    del request
+    gc.collect()
+    assert request_ref() is None
+    assert ShortLivedRequest.parsed.cache_info().currsize == 0
+
+def test_cache_to_memory_is_per_instance():
+    first, second = ShortLivedRequest("a"), ShortLivedRequest("b")
+    assert first.parsed() == {"payload": "a"}
+    assert second.parsed() == {"payload": "b"}
+    assert first.parsed() is first.parsed()
+
+class Parent:
+    def __init__(self):
+        self.calls = []
+
+    @cache_to_memory
+    def describe(self):
+        self.calls.append("Parent")
+        return "parent"
+
+class Child(Parent):
+    @cache_to_memory
+    def describe(self):
+        # same name as the parent method, but a different __qualname__, so a different cache
+        self.calls.append("Child")
+        return "child of " + super().describe()
+
+def test_cache_to_memory_methods_with_the_same_name():
+    child = Child()
+    assert child.describe() == "child of parent"
+    assert child.describe() == "child of parent"
+    assert child.calls == ["Child", "Parent"]
+
+@dataclass
+class UnhashableRecord: # dataclasses with eq=True are unhashable
+    value: int
+    calls: int = 0
+
+    @cache_to_memory
+    def doubled(self):
+        self.calls += 1
+        return self.value * 2
+
+def test_cache_to_memory_on_unhashable_instances():
+    first, second = UnhashableRecord(1), UnhashableRecord(1)
+    assert first.doubled() == 2
+    assert first.doubled() == 2
+    assert second.doubled() == 2 # equal, but a different instance, so a different cache
+    assert first.calls == 1
+    assert second.calls == 1
+
+class SlotsWithoutWeakref:
+    __slots__ = ("value", "calls")
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __repr__(self):
+        return f"SlotsWithoutWeakref({self.value})"
+
+    @cache_to_memory
+    def doubled(self):
+        self.calls += 1
+        return self.value * 2
+
+def test_cache_to_memory_on_instances_without_weakref():
+    instance = SlotsWithoutWeakref(3)
+    assert instance.doubled() == 6
+    assert instance.doubled() == 6
+    assert instance.calls == 1
+    SlotsWithoutWeakref.doubled.cache_clear()
+    assert SlotsWithoutWeakref.doubled.cache_info().currsize == 0
+
+def _run_in_threads(number_of_threads, target):
+    """start all threads at the same time (as far as possible), and return what target returned in each thread"""
+    barrier = threading.Barrier(number_of_threads)
+    results = [None] * number_of_threads
+    errors = []
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target(index)
+        except BaseException as e: # pragma: no cover
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(number_of_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    return results
+
+class SlowService:
+    def __init__(self):
+        self.calls = []
+        self.calls_lock = threading.Lock() # list.append is atomic with the GIL, but the test must also pass without it
+
+    @cache_to_memory
+    def fetch(self, item_id):
+        with self.calls_lock:
+            self.calls.append(item_id)
+        time.sleep(0.05)
+        return {"item_id": item_id}
+
+def test_cache_to_memory_64_threads_same_args():
+    service = SlowService()
+    results = _run_in_threads(64, lambda index: service.fetch(1))
+    assert service.calls == [1]
+    assert all(result is results[0] for result in results)
+
+def test_cache_to_memory_64_threads_different_args():
+    service = SlowService()
+    results = _run_in_threads(64, lambda index: service.fetch(index % 8))
+    assert sorted(service.calls) == list(range(8))
+    assert [result["item_id"] for result in results] == [index % 8 for index in range(64)]
+
+def test_cache_to_memory_64_threads_bounded_cache():
+    calls = []
+    calls_lock = threading.Lock()
+    @cache_to_memory(maxsize=4, policy="lfu")
+    def square(x):
+        with calls_lock:
+            calls.append(x)
+        return x * x
+    results = _run_in_threads(64, lambda index: [square(i % 16) for i in range(index, index + 100)])
+    assert results[5] == [(i % 16) ** 2 for i in range(5, 105)]
+    assert square.cache_info().currsize <= 4
+
+def test_cache_to_memory_threads_share_the_exception():
+    calls = []
+    @cache_to_memory
+    def failing(x):
+        calls.append(x)
+        time.sleep(0.05)
+        raise ValueError("failed")
+    def call(index):
+        try:
+            failing(1)
+        except ValueError as e:
+            return str(e)
+    assert _run_in_threads(16, call) == ["failed"] * 16
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        failing(1) # the exception is not cached
+    assert len(calls) == 2
+
+class AsyncService:
+    def __init__(self):
+        self.calls = []
+
+    @cache_to_memory
+    async def fetch(self, item_id):
+        self.calls.append(item_id)
+        await asyncio.sleep(0.05)
+        return {"item_id": item_id}
+
+    @cache_to_memory
+    async def failing(self, item_id):
+        self.calls.append(item_id)
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream failed")
+
+def test_cache_to_memory_on_async_method():
+    service = AsyncService()
+    async def main():
+        first = await service.fetch(1)
+        second = await service.fetch(1) # a coroutine can only be awaited once, so this fails if the coroutine was cached
+        return first, second
+    first, second = asyncio.run(main())
+    assert first == second == {"item_id": 1}
+    assert service.calls == [1]
+
+def test_cache_to_memory_concurrent_awaiters_share_one_call():
+    service = AsyncService()
+    async def main():
+        return await asyncio.gather(*[service.fetch(1) for _ in range(20)], service.fetch(2))
+    results = asyncio.run(main())
+    assert service.calls == [1, 2]
+    assert all(result is results[0] for result in results[:20])
+
+def test_cache_to_memory_failed_async_calls_are_not_cached():
+    service = AsyncService()
+    async def main():
+        return await asyncio.gather(*[service.failing(1) for _ in range(5)], return_exceptions=True)
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert service.calls == [1]
+    with pytest.raises(ValueError):
+        asyncio.run(service.failing(1)) # tried again, on a new event loop
+    assert service.calls == [1, 1]
+
+def test_cache_to_memory_async_result_is_shared_between_event_loops():
+    service = AsyncService()
+    asyncio.run(service.fetch(1))
+    asyncio.run(service.fetch(1))
+    assert service.calls == [1]
+
+def test_cache_to_memory_max_bytes_evicts_least_recently_used():
+    calls = []
+    @cache_to_memory(max_bytes=250, size_estimator=len)
+    def payload(n):
+        calls.append(n)
+        return b"x" * n
+    payload(100)
+    payload(101)
+    payload(100) # 100 is now the most recently used
+    payload(102) # 100 + 101 + 102 > 250, so 101 is evicted
+    assert payload.cache_info().currsize == 2
+    payload(100)
+    payload(101)
+    assert calls == [100, 101, 102, 101]
+
+def test_cache_to_memory_max_bytes_evicts_largest():
+    calls = []
+    @cache_to_memory(max_bytes=250, size_estimator=len, policy="largest")
+    def payload(n):
+        calls.append(n)
+        return b"x" * n
+    payload(150)
+    payload(10)
+    payload(100) # evicts 150, the largest
+    payload(10)
+    payload(100)
+    assert calls == [150, 10, 100]
+
+def test_cache_to_memory_result_bigger_than_max_bytes_is_not_cached():
+    @cache_to_memory(max_bytes=10, size_estimator=len)
+    def payload(n):
+        return b"x" * n
+    payload(5)
+    payload(11)
+    assert payload.cache_info().currsize == 1
+
+class Dataset:
+    def __init__(self, name):
+        self.name = name
+
+    @cache_to_memory(max_bytes=250, size_estimator=len)
+    def payload(self, n):
+        return b"x" * n
+
+def test_cache_to_memory_max_bytes_is_shared_by_all_instances():
+    datasets = [Dataset(i) for i in range(10)]
+    for dataset in datasets:
+        dataset.payload(100)
+    # 10 instances with 100 bytes each, but only two results fit in the budget of the method
+    assert Dataset.payload.cache_info().currsize == 2
+    datasets[9].payload(100)
+    datasets[9].payload(120) # evicts its own result first, then the result of another instance
+    assert Dataset.payload.cache_info().currsize == 2
+
+def test_cache_to_memory_max_bytes_of_garbage_collected_instances_is_released():
+    dataset = Dataset("big")
+    dataset.payload(200)
+    del dataset
+    gc.collect()
+    other = Dataset("other")
+    other.payload(200) # fits, as the result of the garbage collected instance no longer counts
+    other.payload(40)
+    assert Dataset.payload.cache_info().currsize == 2
+
+@pytest.mark.parametrize("size_estimator", ["shallow", "deep", "pickle"])
+def test_cache_to_memory_size_estimators(size_estimator):
+    @cache_to_memory(max_bytes=10_000_000, size_estimator=size_estimator)
+    def rows(n):
+        return [{"id": i, "name": f"row {i}"} for i in range(n)]
+    gc.collect()
+    gc.disable() # so caches of other tests aren't garbage collected while the usage is compared
+    try:
+        before = memory_cache_usage()
+        rows(1000)
+        after = memory_cache_usage()
+        assert after["entries"] == before["entries"] + 1
+        assert after["bytes"] > before["bytes"]
+        rows.cache_clear()
+        assert memory_cache_usage()["bytes"] == before["bytes"]
+    finally:
+        gc.enable()
+
+def test_deep_sizeof_counts_contents_once():
+    shared = "x" * 1000
+    assert _deep_sizeof([shared, shared]) < _deep_sizeof([shared, "y" * 1000])
+    assert _deep_sizeof({"rows": [shared]}) > _deep_sizeof(shared)
+
+def test_cache_to_memory_unknown_size_estimator():
+    with pytest.raises(ValueError):
+        cache_to_memory(size_estimator="exact")
+
+def _make_snapshot_function(snapshot_file, calls, **kwargs):
+    """a new function with the same qualname on each call, as if the process was restarted"""
+    @cache_to_memory(snapshot_file=snapshot_file, **kwargs)
+    def square(x):
+        calls.append(x)
+        return x * x
+    return square
+
+def test_cache_to_memory_snapshot_survives_restart(tmp_path):
+    snapshot_file = str(tmp_path / "square.snapshot")
+    calls = []
+    square = _make_snapshot_function(snapshot_file, calls)
+    assert square(3) == 9
+    square.save_snapshot()
+    restarted_square = _make_snapshot_function(snapshot_file, calls)
+    assert restarted_square(3) == 9
+    assert calls == [3]
+
+def test_cache_to_memory_snapshot_is_loaded_on_first_call(tmp_path):
+    snapshot_file = str(tmp_path / "square.snapshot")
+    calls = []
+    restarted_square = _make_snapshot_function(snapshot_file, calls) # created before the snapshot exists
+    square = _make_snapshot_function(snapshot_file, calls)
+    square(4)
+    square.save_snapshot()
+    assert restarted_square(4) == 16
+    assert calls == [4]
+
+def test_cache_to_memory_snapshot_keeps_ttl(tmp_path):
+    snapshot_file = str(tmp_path / "square.snapshot")
+    calls = []
+    square = _make_snapshot_function(snapshot_file, calls, ttl=0.1)
+    square(2)
+    square.save_snapshot()
+    time.sleep(0.15)
+    restarted_square = _make_snapshot_function(snapshot_file, calls, ttl=0.1)
+    restarted_square(2) # expired while the process was "down"
+    assert calls == [2, 2]
+
+def test_cache_to_memory_snapshot_with_another_version_is_ignored(tmp_path):
+    snapshot_file = tmp_path / "square.snapshot"
+    calls = []
+    square = _make_snapshot_function(str(snapshot_file), calls)
+    square(5)
+    square.save_snapshot()
+    snapshot = pickle.loads(snapshot_file.read_bytes())
+    snapshot["version"] = 0
+    snapshot_file.write_bytes(pickle.dumps(snapshot))
+    _make_snapshot_function(str(snapshot_file), calls)(5)
+    snapshot_file.write_bytes(b"corrupt")
+    _make_snapshot_function(str(snapshot_file), calls)(5)
+    assert calls == [5, 5, 5]
+
+def test_cache_to_memory_snapshot_on_a_timer(tmp_path):
+    snapshot_file = tmp_path / "square.snapshot"
+    square = _make_snapshot_function(str(snapshot_file), [], snapshot_interval=0.05)
+    square(6)
+    time.sleep(0.2)
+    assert snapshot_file.exists()
+
+def _make_snapshot_class(snapshot_file, calls, with_cache_key=True):
+    """a new class with the same qualname on each call, as if the process was restarted"""
+    class Rates:
+        def __init__(self, currency):
+            self.currency = currency
+
+        if with_cache_key:
+            def __cache_key__(self):
+                return self.currency
+
+        @cache_to_memory(snapshot_file=snapshot_file)
+        def rate(self, day):
+            calls.append(day)
+            return f"{self.currency} on {day}"
+    return Rates
+
+def test_cache_to_memory_snapshot_of_method_with_cache_key(tmp_path):
+    snapshot_file = str(tmp_path / "rates.snapshot")
+    calls = []
+    Rates = _make_snapshot_class(snapshot_file, calls)
+    assert Rates("EUR").rate(1) == "EUR on 1"
+    Rates.rate.save_snapshot()
+    RestartedRates = _make_snapshot_class(snapshot_file, calls)
+    assert RestartedRates("EUR").rate(1) == "EUR on 1" # another instance, with the same key
+    assert RestartedRates("USD").rate(1) == "USD on 1"
+    assert calls == [1, 1]
+
+def test_cache_to_memory_snapshot_of_method_requires_stable_key(tmp_path):
+    Rates = _make_snapshot_class(str(tmp_path / "rates.snapshot"), [], with_cache_key=False)
+    with pytest.raises(TypeError, match="__cache_key__"):
+        Rates("EUR").rate(1) # the default repr contains the memory address, so the key would never match after a restart
+
+def test_cache_to_memory_snapshot_interval_requires_snapshot_file():
+    with pytest.raises(ValueError):
+        cache_to_memory(snapshot_interval=60)
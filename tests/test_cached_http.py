@@ -0,0 +1,147 @@
+import time
+import shutil
+import inspect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from useful_tools.cached_http import cached_http_get, HTTPConnectionPool
+
+def _test_name():
+    """
+    Get the test name (the function name, basically)
+    As we're testing caching, the test name is included in the URL, so the tests don't share cache files.
+    """
+    return str(inspect.stack()[1].function)
+
+class MockConfig:
+    cache_dir = "test_cache_http"
+    def __init__(self):
+        self.cache_enabled = True
+        self.cache_expiration = 0.2
+        self.ignore_cache_expiration = False
+        self.force_cache_expiration = False
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+    etag = '"version-1"'
+    full_responses = 0
+    not_modified_responses = 0
+    connections = set()
+
+    def do_GET(self):
+        _Handler.connections.add(self.client_address)
+        if self.path.startswith("/no-validators"):
+            body = b"no validators"
+            _Handler.full_responses += 1
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.headers.get("If-None-Match") == _Handler.etag:
+            _Handler.not_modified_responses += 1
+            self.send_response(304)
+            self.send_header("ETag", _Handler.etag)
+            self.end_headers()
+        else:
+            body = f'{{"path": "{self.path}", "etag": {_Handler.etag}}}'.encode()
+            _Handler.full_responses += 1
+            self.send_response(200)
+            self.send_header("ETag", _Handler.etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = None
+
+def setup_module(module):
+    global server
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+def teardown_module(module):
+    server.shutdown()
+    server.server_close()
+    try:
+        shutil.rmtree(MockConfig.cache_dir)
+    except: # pragma: no cover
+        pass # pragma: no cover
+
+def _url(path):
+    return f"http://127.0.0.1:{server.server_address[1]}/{path}"
+
+def _reset_counters():
+    _Handler.full_responses = 0
+    _Handler.not_modified_responses = 0
+    _Handler.connections = set()
+
+def test_fresh_response_is_loaded_from_cache():
+    _reset_counters()
+    config = MockConfig()
+    url = _url(_test_name())
+    first = cached_http_get(url, config)
+    key = config.last_saved_cache_file_key
+    second = cached_http_get(url, config)
+    assert first == second
+    assert second.status == 200
+    assert second.json()["path"] == "/test_fresh_response_is_loaded_from_cache"
+    assert _Handler.full_responses == 1
+    assert "cache_loaded" in config.cache_status_dict[key]
+
+def test_expired_response_is_revalidated():
+    _reset_counters()
+    config = MockConfig()
+    url = _url(_test_name())
+    first = cached_http_get(url, config)
+    time.sleep(config.cache_expiration + 0.1)
+    second = cached_http_get(url, config)
+    assert second.body == first.body
+    assert _Handler.full_responses == 1
+    assert _Handler.not_modified_responses == 1
+    assert "cache_revalidated" in config.cache_status_dict[config.last_saved_cache_file_key]
+    # the 304 refreshed the cache time, so the next request doesn't reach the server
+    cached_http_get(url, config)
+    assert _Handler.not_modified_responses == 1
+
+def test_changed_response_is_downloaded_again():
+    _reset_counters()
+    config = MockConfig()
+    url = _url(_test_name())
+    cached_http_get(url, config)
+    time.sleep(config.cache_expiration + 0.1)
+    _Handler.etag = '"version-2"'
+    try:
+        response = cached_http_get(url, config)
+    finally:
+        _Handler.etag = '"version-1"'
+    assert response.json()["etag"] == "version-2"
+    assert _Handler.full_responses == 2
+
+def test_response_without_validators_is_downloaded_again():
+    _reset_counters()
+    config = MockConfig()
+    url = _url("no-validators/" + _test_name())
+    cached_http_get(url, config)
+    time.sleep(config.cache_expiration + 0.1)
+    assert cached_http_get(url, config).text() == "no validators"
+    assert _Handler.full_responses == 2
+
+def test_cache_disabled():
+    _reset_counters()
+    config = MockConfig()
+    config.cache_enabled = False
+    url = _url(_test_name())
+    cached_http_get(url, config)
+    cached_http_get(url, config)
+    assert _Handler.full_responses == 2
+
+def test_connections_are_kept_alive():
+    _reset_counters()
+    config = MockConfig()
+    config.cache_enabled = False
+    pool = HTTPConnectionPool()
+    for i in range(3):
+        cached_http_get(_url(_test_name()), config, pool=pool)
+    assert len(_Handler.connections) == 1 # all requests were sent on the same connection
+    pool.close()
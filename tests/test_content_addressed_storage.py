@@ -0,0 +1,137 @@
+import os
+import pickle
+import time
+import shutil
+import inspect
+from useful_tools.cache_to_disk import cache_to_disk
+from useful_tools.content_addressed_storage import ContentPointer, collect_garbage, read_pointer, OBJECTS_DIR
+
+def _test_name():
+    """
+    Get the test name (the function name, basically)
+    As we're testing caching, the test name is included in the arguments, so the tests don't share cache files.
+    """
+    return str(inspect.stack()[1].function)
+
+class MyClass:
+    cache_enabled = True
+    cache_dir = "test_cache_dedup"
+    cache_expiration = 2 # seconds
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+    cache_deduplicate = True
+
+    def __init__(self):
+        self.number_of_calls = 0
+
+    def __repr__(self):
+        return "MyClass()"
+
+    @cache_to_disk
+    def same_result_for_all_args(self, *args, **kwargs):
+        self.number_of_calls += 1
+        return {"default": "config blob"}
+
+    @cache_to_disk
+    def result_from_args(self, *args, **kwargs):
+        self.number_of_calls += 1
+        return args
+
+def teardown_module(module):
+    try:
+        shutil.rmtree(MyClass.cache_dir)
+    except: # pragma: no cover
+        pass # pragma: no cover
+
+def _payload_files():
+    objects_dir = os.path.join(MyClass.cache_dir, OBJECTS_DIR)
+    return sorted(filename for filename in os.listdir(objects_dir) if filename.endswith(".pkl"))
+
+def test_identical_results_are_stored_once():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.same_result_for_all_args(test, 1)
+    first_cache_file = my_class.last_saved_cache_file
+    my_class.same_result_for_all_args(test, 2)
+    second_cache_file = my_class.last_saved_cache_file
+    assert first_cache_file != second_cache_file
+    assert "cache_payload_reused" in my_class.cache_status_dict[my_class.last_saved_cache_file_key]
+
+    # both cache files are pointers to the same payload
+    assert read_pointer(first_cache_file) == read_pointer(second_cache_file)
+    assert isinstance(read_pointer(first_cache_file), ContentPointer)
+
+    # and the result is loaded through the pointer
+    assert my_class.same_result_for_all_args(test, 1) == {"default": "config blob"}
+    assert my_class.number_of_calls == 2
+
+def test_payload_is_deleted_when_last_reference_is_released():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.result_from_args(test)
+    pointer = read_pointer(my_class.last_saved_cache_file)
+    payload = os.path.join(MyClass.cache_dir, OBJECTS_DIR, f"{pointer.digest}.pkl")
+    assert os.path.exists(payload)
+    my_class.delete_last_saved_cache_file()
+    assert not os.path.exists(payload)
+
+def test_overwriting_a_pointer_releases_the_old_payload():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.result_from_args(test)
+    old_pointer = read_pointer(my_class.last_saved_cache_file)
+    old_payload = os.path.join(MyClass.cache_dir, OBJECTS_DIR, f"{old_pointer.digest}.pkl")
+
+    # save a different result under the same key
+    my_class.cache_deduplicate = False
+    my_class.force_cache_expiration = True
+    my_class.result_from_args(test)
+    assert read_pointer(my_class.last_saved_cache_file) is None # the cache file now holds the result itself
+    assert not os.path.exists(old_payload)
+
+def test_corrupted_pointer_is_treated_as_corrupted_cache_file():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.result_from_args(test)
+    with open(my_class.last_saved_cache_file, "wb") as f:
+        pickle.dump((time.time(), ContentPointer("does_not_exist")), f)
+    my_class.result_from_args(test)
+    assert "cache_file_corrupted" in my_class.cache_status_dict[my_class.last_saved_cache_file_key]
+    assert my_class.number_of_calls == 2
+
+def test_collect_garbage_deletes_expired_pointers_and_unreferenced_payloads():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.result_from_args(test, "expired")
+    expired_cache_file = my_class.last_saved_cache_file
+    expired_digest = read_pointer(expired_cache_file).digest
+    my_class.result_from_args(test, "fresh")
+    fresh_cache_file = my_class.last_saved_cache_file
+
+    # nothing has expired yet
+    stats = collect_garbage(my_class)
+    assert stats["expired_pointers_deleted"] == 0
+    assert os.path.exists(expired_cache_file)
+
+    # pretend the first entry was saved long ago
+    with open(expired_cache_file, "wb") as f:
+        pickle.dump((time.time() - 10, ContentPointer(expired_digest)), f)
+    stats = collect_garbage(my_class)
+    assert stats["expired_pointers_deleted"] == 1
+    assert stats["payloads_deleted"] == 1
+    assert not os.path.exists(expired_cache_file)
+    assert os.path.exists(fresh_cache_file)
+    assert f"{expired_digest}.pkl" not in _payload_files()
+
+def test_missing_payload_is_stored_again():
+    my_class = MyClass()
+    test = _test_name()
+    my_class.result_from_args(test)
+    pointer = read_pointer(my_class.last_saved_cache_file)
+    payload_path = os.path.join(MyClass.cache_dir, OBJECTS_DIR, f"{pointer.digest}.pkl")
+    os.remove(payload_path) # for example deleted by another process, after the counts drifted
+    assert my_class.result_from_args(test) == (test,)
+    assert my_class.number_of_calls == 2
+    assert os.path.exists(payload_path) # the same digest, so only the payload was missing
+    assert my_class.result_from_args(test) == (test,)
+    assert my_class.number_of_calls == 2
@@ -0,0 +1,30 @@
+import os
+import threading
+from useful_tools.file_lock import FileLock
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_file = os.path.join(tmp_path, "test.lock")
+    counter = {"value": 0, "max_concurrent": 0, "concurrent": 0}
+    def work():
+        lock = FileLock(lock_file) # a separate lock object per thread, like separate processes would have
+        for _ in range(50):
+            with lock:
+                counter["concurrent"] += 1
+                counter["max_concurrent"] = max(counter["max_concurrent"], counter["concurrent"])
+                counter["value"] += 1
+                counter["concurrent"] -= 1
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter["value"] == 200
+    assert counter["max_concurrent"] == 1
+    assert os.path.exists(lock_file)
+
+def test_file_lock_is_reentrant(tmp_path):
+    lock = FileLock(os.path.join(tmp_path, "test.lock"))
+    with lock:
+        with lock:
+            pass
+    assert lock._fd is None
@@ -0,0 +1,131 @@
+import os
+import json
+import math
+import pickle
+import shutil
+import pytest
+from useful_tools.cache_to_disk import cache_to_disk
+from useful_tools.lazy_cached_result import LazyCachedResult, peek_cache_time
+
+class LazyClass:
+    cache_enabled = True
+    cache_dir = "test_cache_lazy"
+    cache_expiration = 60
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    def __init__(self):
+        self.number_of_calls = 0
+
+    def __repr__(self):
+        return "LazyClass()" # the instance is part of the cache key
+
+    @property
+    @cache_to_disk(lazy_load=True)
+    def report(self):
+        self.number_of_calls += 1
+        return {"summary": "ok", "rows": list(range(10))}
+
+    @cache_to_disk(lazy_load=True)
+    def count(self):
+        return 21
+
+    @cache_to_disk # not lazy, although another method of the class is
+    def settings(self):
+        return {"mode": "fast"}
+
+def teardown_module(module):
+    shutil.rmtree(LazyClass.cache_dir, ignore_errors=True)
+
+def setup_function(function):
+    shutil.rmtree(LazyClass.cache_dir, ignore_errors=True)
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_peek_cache_time(tmp_path, protocol):
+    filepath = tmp_path / "cache.pkl"
+    with open(filepath, "wb") as f:
+        pickle.dump((1234.5, {"a": 1}), f, protocol=protocol)
+    assert peek_cache_time(filepath) == 1234.5
+
+def test_peek_cache_time_not_a_cache_tuple(tmp_path):
+    filepath = tmp_path / "cache.pkl"
+    with open(filepath, "wb") as f:
+        pickle.dump("not a cache file", f)
+    assert peek_cache_time(filepath) is None
+
+def test_cache_miss_returns_the_result():
+    myclass = LazyClass()
+    report = myclass.report
+    assert not isinstance(report, LazyCachedResult)
+    assert myclass.number_of_calls == 1
+
+def test_cache_hit_is_loaded_on_first_use():
+    LazyClass().report
+    myclass = LazyClass()
+    report = myclass.report
+    assert isinstance(report, LazyCachedResult)
+    assert not report.is_loaded
+    assert "cache_loaded_lazily" in myclass.cache_status
+    assert myclass.last_loaded_cache_file == report.cache_file
+    assert report["summary"] == "ok"
+    assert report.is_loaded
+    assert len(report) == 2
+    assert report == {"summary": "ok", "rows": list(range(10))}
+    assert report.unwrap() == {"summary": "ok", "rows": list(range(10))}
+    assert myclass.number_of_calls == 0
+
+def test_deleted_cache_file_falls_back_to_calling_the_method():
+    LazyClass().report
+    myclass = LazyClass()
+    report = myclass.report
+    os.remove(report.cache_file)
+    assert report["rows"] == list(range(10))
+    assert myclass.number_of_calls == 1
+
+def test_pickling_the_proxy_pickles_the_result():
+    LazyClass().report
+    report = LazyClass().report
+    assert pickle.loads(pickle.dumps(report)) == {"summary": "ok", "rows": list(range(10))}
+
+def test_expired_cache_file_is_not_loaded_lazily():
+    LazyClass().report
+    myclass = LazyClass()
+    myclass.force_cache_expiration = True
+    myclass.cache_expiration = 0
+    report = myclass.report
+    assert not isinstance(report, LazyCachedResult)
+    assert myclass.number_of_calls == 1
+
+def test_lazy_load_is_per_method():
+    LazyClass().settings()
+    settings = LazyClass().settings()
+    assert not isinstance(settings, LazyCachedResult)
+    assert json.dumps(settings) == '{"mode": "fast"}'
+
+def test_numbers_and_indexes():
+    LazyClass().count()
+    count = LazyClass().count()
+    assert isinstance(count, LazyCachedResult)
+    assert (count * 2, count - 1, 1 - count, -count, abs(count), ~count) == (42, 20, -20, -21, 21, -22)
+    assert (count / 2, count // 2, count % 4, divmod(count, 4), count ** 2, 2 ** count) == (10.5, 10, 1, (5, 1), 441, 2097152)
+    assert (count & 1, count | 2, count ^ 1, count << 1, count >> 1, 1.5 + count) == (1, 23, 20, 42, 10, 22.5)
+    assert (int(count), float(count), round(count), math.floor(count)) == (21, 21.0, 21, 21)
+    assert len(range(count)) == 21
+    assert [0][count - 21] == 0
+    assert list(range(30))[count] == 21
+    assert isinstance(count, int)
+    count += 1 # the name is bound to the new value
+    assert count == 22
+
+def test_isinstance_sees_the_result_type():
+    LazyClass().report
+    report = LazyClass().report
+    assert isinstance(report, dict)
+    assert isinstance(report, LazyCachedResult)
+    assert json.dumps(report.unwrap())
+
+def test_lazy_load_on_async_function_is_rejected():
+    with pytest.raises(TypeError):
+        @cache_to_disk(lazy_load=True)
+        async def fetch():
+            pass
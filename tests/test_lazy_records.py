@@ -0,0 +1,105 @@
+import json
+import pytest
+from useful_tools.lazy_records import LazyRecords
+
+def write_jsonl(path, records, blank_lines=False):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            if blank_lines:
+                f.write("\n")
+
+def test_from_jsonl(tmp_path):
+    path = tmp_path / "export.jsonl"
+    write_jsonl(path, [{"id": i} for i in range(25)], blank_lines=True)
+    records = LazyRecords.from_jsonl(path, chunk_size=4, max_chunks=2)
+    assert records[0] == {"id": 0}
+    assert records[9] == {"id": 9}
+    assert len(records._starts) < 25 # only indexed as far as needed
+    assert len(records) == 25
+    assert records[-1] == {"id": 24}
+    assert records[3:7] == [{"id": i} for i in range(3, 7)]
+    assert [record["id"] for record in records] == list(range(25))
+    assert len(records._chunks) <= 2 # bounded memory
+    assert {"id": 5} in records
+    assert records.index({"id": 6}) == 6
+    with pytest.raises(IndexError):
+        records[25]
+    with pytest.raises(IndexError):
+        records[-26]
+    assert repr(records) == f"LazyRecords({str(path)!r}, 25 records)"
+    records.close()
+
+def test_from_jsonl_without_trailing_newline(tmp_path):
+    path = tmp_path / "export.jsonl"
+    path.write_text('{"id": 0}\n{"id": 1}')
+    records = LazyRecords.from_jsonl(path)
+    assert list(records) == [{"id": 0}, {"id": 1}]
+    records.close()
+
+def test_from_iterable_reads_it_when_needed():
+    consumed = []
+    def generate():
+        for i in range(10):
+            consumed.append(i)
+            yield {"id": i, "values": (i, str(i))}
+    records = LazyRecords.from_iterable(generate(), chunk_size=3, max_chunks=1)
+    assert records[1] == {"id": 1, "values": (1, "1")}
+    assert len(consumed) < 10
+    assert len(records) == 10
+    assert len(consumed) == 10
+    assert records[8]["id"] == 8
+    assert records[0]["id"] == 0 # loaded again from the temporary file, as only one chunk is kept
+    assert [record["id"] for record in records] == list(range(10))
+    records.close()
+
+def test_empty():
+    records = LazyRecords.from_iterable([])
+    assert len(records) == 0
+    assert list(records) == []
+    with pytest.raises(IndexError):
+        records[0]
+
+def test_invalid_chunk_size():
+    with pytest.raises(ValueError):
+        LazyRecords.from_iterable([], chunk_size=0)
+
+def test_close_and_context_manager(tmp_path):
+    path = tmp_path / "export.jsonl"
+    write_jsonl(path, [{"id": 0}])
+    with LazyRecords.from_jsonl(path) as records:
+        assert records[0] == {"id": 0}
+        assert not records.closed
+    assert records.closed
+    records.close() # closing again does nothing
+
+def test_file_closed_when_dropped(tmp_path):
+    import gc
+    import warnings
+    path = tmp_path / "export.jsonl"
+    write_jsonl(path, [{"id": 0}])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning) # an unclosed file would warn when it's collected
+        records = LazyRecords.from_jsonl(path)
+        file = records._file
+        del records
+        gc.collect()
+    assert file.closed
+
+def test_scans_load_chunks_not_single_records(tmp_path):
+    path = tmp_path / "export.jsonl"
+    write_jsonl(path, [{"id": i % 7} for i in range(50)])
+    records = LazyRecords.from_jsonl(path, chunk_size=10)
+    decoded_blocks = []
+    decode_block = records._decode_block
+    records._decode_block = lambda block: decoded_blocks.append(block) or decode_block(block)
+    assert records.count({"id": 3}) == 7
+    assert {"id": 6} in records
+    assert {"id": 9} not in records
+    assert records.index({"id": 3}) == 3
+    assert records.index({"id": 3}, 4) == 10
+    assert records.index({"id": 3}, -10) == 45
+    with pytest.raises(ValueError):
+        records.index({"id": 3}, 4, 10)
+    assert len(decoded_blocks) <= 5 + 5 + 5 # a block per chunk per full scan, never one per record
+    records.close()
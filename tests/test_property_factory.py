@@ -1,5 +1,7 @@
 from unittest import TestCase
-from useful_tools.property_factory import PropertyFactory
+import gc
+from dataclasses import dataclass
+from useful_tools.property_factory import PropertyFactory, derived_property, _dependents
 
 class TestPropertyFactory(TestCase):
     def test_property_factory(self):
@@ -59,3 +61,152 @@ class TestPropertyFactoryInACompletelyUselessWay(TestCase):
 
         # Test that accessing the property from the class returns the PropertyFactory instance
         self.assertIsInstance(MyClass.my_property, PropertyFactory)
+
+
+computed = [] # the derived properties computed, in order
+
+class Line:
+    def __init__(self, name, price, quantity):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    @derived_property
+    def total(self):
+        computed.append(f"{self.name}.total")
+        return self.price * self.quantity
+
+class Order:
+    def __init__(self, lines, discount=0):
+        self.lines = lines
+        self.discount = discount
+
+    @derived_property
+    def subtotal(self):
+        computed.append("order.subtotal")
+        return sum(line.total for line in self.lines)
+
+    @derived_property
+    def total(self):
+        computed.append("order.total")
+        return self.subtotal - self.discount
+
+@dataclass
+class Item:
+    """a dataclass is unhashable (it defines __eq__), and instances with the same fields are equal"""
+    name: str
+    price: int
+
+    @derived_property
+    def label(self):
+        computed.append(f"{self.name}.label")
+        return f"{self.name}: {self.price}"
+
+
+class HashedByName:
+    """__hash__ reads an attribute, which must not be recorded as a read while hashing"""
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    @derived_property
+    def title(self):
+        return self.name.title()
+
+
+class TestDerivedProperty(TestCase):
+    def setUp(self):
+        computed.clear()
+
+    def test_computed_once(self):
+        line = Line("a", 10, 2)
+        self.assertEqual(20, line.total)
+        self.assertEqual(20, line.total)
+        self.assertEqual(["a.total"], computed)
+
+    def test_recomputed_when_a_dependency_is_assigned(self):
+        line = Line("a", 10, 2)
+        line.total
+        line.quantity = 3
+        self.assertEqual(30, line.total)
+        self.assertEqual(["a.total", "a.total"], computed)
+
+    def test_not_recomputed_when_another_attribute_is_assigned(self):
+        line = Line("a", 10, 2)
+        line.total
+        line.comment = "not used by total"
+        line.total
+        self.assertEqual(["a.total"], computed)
+
+    def test_chains_are_updated_incrementally(self):
+        order = Order([Line("a", 10, 2), Line("b", 5, 1)], discount=3)
+        self.assertEqual(22, order.total)
+        computed.clear()
+
+        order.lines[1].price = 6
+        self.assertEqual(23, order.total)
+        # the first line is not recomputed
+        self.assertEqual(["order.total", "order.subtotal", "b.total"], computed)
+        computed.clear()
+
+        order.discount = 0
+        self.assertEqual(26, order.total)
+        # the subtotal didn't depend on the discount
+        self.assertEqual(["order.total"], computed)
+
+    def test_assigning_a_new_list(self):
+        order = Order([Line("a", 10, 2)])
+        order.total
+        order.lines = order.lines + [Line("b", 1, 1)]
+        self.assertEqual(21, order.total)
+
+    def test_invalidate(self):
+        order = Order([Line("a", 10, 2)])
+        order.total
+        computed.clear()
+        Order.subtotal.invalidate(order)
+        order.total
+        self.assertEqual(["order.total", "order.subtotal"], computed)
+
+    def test_deleting_a_dependency(self):
+        line = Line("a", 10, 2)
+        line.total
+        del line.price
+        with self.assertRaises(AttributeError):
+            line.total
+
+    def test_dependencies_are_freed_with_the_objects(self):
+        order = Order([Line("a", 10, 2)])
+        order.total
+        number_of_tracked_objects = len(_dependents)
+        del order
+        gc.collect()
+        self.assertLess(len(_dependents), number_of_tracked_objects)
+
+    def test_class_access(self):
+        self.assertIsInstance(Line.total, derived_property)
+
+    def test_dataclass(self):
+        item = Item("a", 10)
+        self.assertEqual("a: 10", item.label)
+        item.price = 11
+        self.assertEqual("a: 11", item.label)
+        self.assertEqual(["a.label", "a.label"], computed)
+
+    def test_equal_instances_are_tracked_separately(self):
+        first, second = Item("a", 10), Item("a", 10)
+        self.assertEqual(first, second)
+        first.label
+        second.label
+        second.price = 11
+        self.assertEqual("a: 11", second.label)
+        self.assertEqual("a: 10", first.label)
+        self.assertEqual(["a.label", "a.label", "a.label"], computed)
+
+    def test_hash_reading_an_attribute(self):
+        obj = HashedByName("report")
+        self.assertEqual("Report", obj.title)
+        obj.name = "summary"
+        self.assertEqual("Summary", obj.title)
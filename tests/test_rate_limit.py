@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+import pytest
+from useful_tools.cache_to_memory import cache_to_memory
+from useful_tools.rate_limit import rate_limited, TokenBucket, FileTokenBucket
+
+def test_calls_within_burst_dont_wait():
+    bucket = TokenBucket(5, per=1.0)
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    assert bucket.reserve() > 0
+
+def test_calls_beyond_the_budget_are_queued():
+    calls = []
+    @rate_limited(20, per=1.0, burst=1)
+    def my_function(i):
+        calls.append(time.monotonic())
+        return i
+    start = time.monotonic()
+    assert [my_function(i) for i in range(5)] == [0, 1, 2, 3, 4]
+    elapsed = time.monotonic() - start
+    assert elapsed >= 4 / 20 * 0.9 # 4 calls had to wait 1/20 s each (with some tolerance for timer resolution)
+    stats = my_function.rate_limit_stats()
+    assert stats["calls"] == 5
+    assert stats["outbound_calls"] == 5
+    assert stats["max_wait"] > 0
+    assert stats["total_wait"] >= stats["max_wait"]
+    assert stats["waiting"] == 0
+
+def test_identical_concurrent_calls_are_coalesced():
+    started = threading.Event()
+    release = threading.Event()
+    outbound = []
+    @rate_limited(100)
+    def slow_function(arg):
+        outbound.append(arg)
+        started.set()
+        release.wait()
+        return f"result for {arg}"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(slow_function("same")))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(slow_function("same"))) for _ in range(7)]
+    for thread in followers:
+        thread.start()
+    while slow_function.rate_limit_stats()["coalesced_calls"] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert outbound == ["same"]
+    assert results == ["result for same"] * 8
+    assert slow_function.rate_limit_stats()["coalesced_calls"] == 7
+
+def test_exception_is_shared_with_coalesced_calls():
+    started = threading.Event()
+    release = threading.Event()
+    @rate_limited(100)
+    def failing_function():
+        started.set()
+        release.wait()
+        raise ValueError("upstream failed")
+
+    errors = []
+    def call():
+        try:
+            failing_function()
+        except ValueError as e:
+            errors.append(str(e))
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    while failing_function.rate_limit_stats()["coalesced_calls"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+    assert errors == ["upstream failed"] * 2
+    assert failing_function.rate_limit_stats()["outbound_calls"] == 1
+
+def test_composes_with_cache_to_memory():
+    class MyClient:
+        def __init__(self):
+            self.outbound = 0
+        @cache_to_memory
+        @rate_limited(1000)
+        def get_data(self, item_id):
+            self.outbound += 1
+            return item_id
+    client = MyClient()
+    for _ in range(3):
+        client.get_data("test_composes_with_cache_to_memory")
+    assert client.outbound == 1
+    assert MyClient.get_data.rate_limit_stats()["calls"] == 1 # cache hits don't reach the rate limiter
+
+def test_budget_is_shared_through_state_file(tmp_path):
+    state_file = os.path.join(tmp_path, "state.json")
+    # two buckets with the same state file behave like two processes sharing the budget
+    bucket1 = FileTokenBucket(2, per=10.0, state_file=state_file)
+    bucket2 = FileTokenBucket(2, per=10.0, state_file=state_file)
+    assert bucket1.reserve() == 0.0
+    assert bucket2.reserve() == 0.0
+    assert bucket1.reserve() == pytest.approx(5.0, abs=0.1) # the budget is used up, so the next token comes in 10/2 seconds
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        rate_limited(0)(lambda: None)
@@ -0,0 +1,132 @@
+import os
+import time
+import pickle
+import multiprocessing
+import pytest
+from useful_tools.cache_to_memory import cache_to_memory
+from useful_tools.shared_memory_cache import SharedMemoryCache
+
+@pytest.fixture
+def shared_cache():
+    cache = SharedMemoryCache(f"useful_tools_test_{os.getpid()}", size=1024 * 1024, slots=64)
+    yield cache
+    cache.unlink()
+
+def test_set_and_get(shared_cache):
+    assert shared_cache.get("missing") is None
+    assert shared_cache.get("missing", "default") == "default"
+    assert shared_cache.set("key", {"rows": [1, 2, 3]})
+    assert shared_cache.get("key") == {"rows": [1, 2, 3]}
+    assert shared_cache.set("key", "replaced")
+    assert shared_cache.get("key") == "replaced"
+    assert len(shared_cache) == 1
+    shared_cache.delete("key")
+    assert shared_cache.get("key") is None
+    assert len(shared_cache) == 0
+
+def test_ttl(shared_cache):
+    shared_cache.set("key", "value", ttl=0.05)
+    assert shared_cache.get("key") == "value"
+    time.sleep(0.06)
+    assert shared_cache.get("key") is None
+
+def test_out_of_band_buffers_are_read_without_copying(shared_cache):
+    data = bytearray(b"x" * 100_000)
+    shared_cache.set("buffer", pickle.PickleBuffer(data))
+    result = shared_cache.get("buffer")
+    # a PickleBuffer is unpickled as the buffer it was given when loading, which is a read-only view of the shared memory
+    assert isinstance(result, memoryview)
+    assert result.readonly
+    assert result == data
+    del result
+
+def test_full_arena_starts_a_new_generation(shared_cache):
+    payload = b"x" * 400_000
+    shared_cache.set("first", payload)
+    first = shared_cache.get("first")
+    shared_cache.set("second", payload)
+    shared_cache.set("third", payload) # doesn't fit, so the cache is emptied
+    assert shared_cache.usage()["generation"] == 1
+    assert shared_cache.get("first") is None
+    assert shared_cache.get("third") == payload
+    assert first == payload # results read before are still intact
+
+def _mapped_segments(name):
+    """the number of shared memory segments of a cache mapped by this process (None where /proc isn't available)"""
+    try:
+        with open("/proc/self/maps") as f:
+            return len({line.split()[-1] for line in f if f"/{name}" in line})
+    except FileNotFoundError: # pragma: no cover
+        return None
+
+def test_retired_segments_are_released(shared_cache):
+    payload = b"x" * 400_000
+    kept = None
+    for i in range(20): # two results fill the arena, so this starts about 10 generations
+        shared_cache.set(i, pickle.PickleBuffer(bytearray(payload)))
+        result = shared_cache.get(i) # a view of the shared memory
+        if i == 3:
+            kept = result
+        assert len(shared_cache._retired_segments) <= 2 # the segments of kept and of the last result
+        assert _mapped_segments(shared_cache.name) in (None, 2, 3, 4) # the control segment, the current one, and the retired ones
+    assert shared_cache.usage()["generation"] >= 9
+    assert kept == payload # the segment it is a view of is still mapped
+    del kept, result
+    shared_cache.clear()
+    assert shared_cache._retired_segments == []
+    assert _mapped_segments(shared_cache.name) in (None, 2)
+
+def test_full_hash_table_starts_a_new_generation(shared_cache):
+    for i in range(64):
+        shared_cache.set(i, i)
+    assert shared_cache.usage()["generation"] >= 1
+    assert shared_cache.get(63) == 63
+
+def test_result_bigger_than_the_arena_is_not_cached(shared_cache):
+    assert not shared_cache.set("too big", b"x" * (2 * 1024 * 1024))
+    assert shared_cache.get("too big") is None
+
+def test_clear(shared_cache):
+    shared_cache.set("key", "value")
+    shared_cache.clear()
+    assert shared_cache.get("key") is None
+
+def _set_in_other_process(name, key, value):
+    SharedMemoryCache(name).set(key, value)
+
+def test_results_are_shared_between_processes(shared_cache):
+    shared_cache.get("warm up") # creates the shared memory
+    process = multiprocessing.get_context("spawn").Process(target=_set_in_other_process, args=(shared_cache.name, "key", [1, 2, 3]))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert shared_cache.get("key") == [1, 2, 3]
+
+class ReferenceData:
+    calls = 0
+
+    def __init__(self, region):
+        self.region = region
+
+    def __repr__(self):
+        return f"ReferenceData({self.region!r})"
+
+def test_cache_to_memory_with_shared_memory_backend(shared_cache):
+    class Service(ReferenceData):
+        @cache_to_memory(backend=shared_cache)
+        def load_table(self, name):
+            ReferenceData.calls += 1
+            return {"region": self.region, "name": name}
+
+    assert Service("eu").load_table("prices") == {"region": "eu", "name": "prices"}
+    assert Service("eu").load_table("prices") == {"region": "eu", "name": "prices"} # another instance with the same state
+    assert ReferenceData.calls == 1
+    assert Service("us").load_table("prices") == {"region": "us", "name": "prices"}
+    assert ReferenceData.calls == 2
+    assert Service.load_table.cache_info().currsize == 2
+    Service.load_table.cache_clear()
+    assert len(shared_cache) == 0
+
+def test_cache_to_memory_backend_and_maxsize():
+    with pytest.raises(ValueError):
+        cache_to_memory(maxsize=10, backend=object())
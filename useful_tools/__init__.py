@@ -1,7 +1,8 @@
 from .act_as_list import act_as_list
-from .cache_to_memory import cache_property, cache_to_memory
+from .cache_to_memory import cache_property, cache_to_memory, memory_cache_usage
 from .cache_to_disk import cache_to_disk, execute_with_cache
 from .modified_dataclasses import modified_dataclass
+from .property_factory import derived_property
 from .exit_if_already_running import exit_if_already_running, is_process_running, kill_process
 from .redirect_stdout import redirect_stdout
 from .ip_address import is_public_ip_address, is_valid_ip_address, is_reserved_ip_address
@@ -16,9 +17,10 @@ from .symbolic_constants import create_symbolic_constants_from_typealias, Symbol
 
 __all__ = [
     'act_as_list',
-    'cache_property', 'cache_to_memory',
+    'cache_property', 'cache_to_memory', 'memory_cache_usage',
     'cache_to_disk', 'execute_with_cache',
     'modified_dataclass',
+    'derived_property',
     'exit_if_already_running', 'is_process_running', 'kill_process',
     'redirect_stdout',
     'is_public_ip_address', 'is_valid_ip_address', 'is_reserved_ip_address', 
@@ -28,6 +30,6 @@ __all__ = [
     'get_disk_uuid',
     'get_dict_slice',
     'generate_test_coverage_report',
-    'shutil'
+    'shutil',
     'create_symbolic_constants_from_typealias', 'SymbolicConstantsDict'
 ]
@@ -0,0 +1,20 @@
+"""
+Small helpers shared by several modules of useful_tools - not part of the public api.
+"""
+
+import os
+import threading
+
+class InFlightCall:
+    """the state of a call that identical calls can wait for (used by @rate_limited and @cache_to_memory)"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+def write_atomically(filepath, data, mode="wb"):
+    # write to a temporary file first, then rename it, so a reader never sees a half-written file
+    tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_filepath, mode) as f:
+        f.write(data)
+    os.replace(tmp_filepath, filepath)
@@ -1,7 +1,42 @@
-def act_as_list(attribute):
+import os
+import array
+import bisect
+import keyword
+from collections import Counter, deque
+from useful_tools.lazy_records import LazyRecords
+
+def act_as_list(attribute, storage="list", typecode="d", slots=False, indexed=False, sorted_by=None, maxlen=None):
     """
 This class decorator adds list-like behavior to a class.
 
+Args:
+    attribute (str): the name of the attribute holding the items
+    storage (str): how the items are stored:
+        "list" (default) - whatever is assigned to the attribute is used as is (normally a list)
+        "array" - whatever is assigned to the attribute is converted to an array.array of the given typecode,
+            which uses a lot less memory for numbers than a list (8 bytes per float instead of about 32)
+        "deque" - whatever is assigned to the attribute is converted to a collections.deque, for work queues:
+            adding and removing items at both ends is O(1), and appendleft(), popleft(), extendleft() and rotate() are added
+            see _DEQUE_METHODS for the complexity of each method
+        "lazy" - read-only, for big record files: a path assigned to the attribute is read as a JSONL file,
+            and any other iterable is read as it is needed (and spooled to a temporary file) - see useful_tools.lazy_records
+            the records are loaded a chunk at a time, so len(), myfakelist[i] and iterating work with bounded memory
+            assign a LazyRecords yourself to choose its chunk_size and max_chunks
+    typecode (str): the array.array typecode, for storage="array" (default: "d", which is a float)
+    maxlen (int): the maximum number of items, for storage="deque" (default: None, no limit)
+        when the deque is full, adding an item at one end drops an item from the other end, like a ring buffer
+    slots (bool): store the attribute in a slot instead of the instance __dict__ (default: False)
+        if the decorated class also defines __slots__ (for its other attributes, or an empty tuple),
+        the instances don't have a __dict__ at all, which saves memory when there are a lot of them
+    indexed (bool): keep a hash index of the items, so `item in myfakelist`, myfakelist.count(item) and myfakelist.index(item)
+        don't have to scan the whole list (default: False)
+        the items have to be hashable, and the list has to be changed through the object, not through the attribute
+        (myfakelist.append(item), not myfakelist.objects.append(item)) - see _ListIndex
+    sorted_by (callable or True): keep the items sorted by this key function (or by the items themselves, if True) (default: None)
+        whatever is assigned to the attribute is sorted (into a new list), and append() and extend() add the items
+        at their sorted position, using a binary search - see _SORTED_METHODS
+        `in`, index(), count() and remove() use a binary search too, and irange(), bisect_left(), bisect_right() and rank() are added
+
 What's the point?
 - working with class instances as if they were lists looks neat in your code
 - you can add other methods to the class, which you can't do with a list
@@ -24,6 +59,10 @@ from cls (the decorated class). This new class overrides several special
 methods to make instances of the class behave like a list, then returns the
 new class.
 
+The list methods are generated from source code (_LIST_METHODS) when the class is decorated, with the name
+of the attribute filled in, so they read the attribute directly (self.objects) instead of calling
+getattr(self, "objects") on every call - the same trick dataclasses uses for __init__ and __eq__.
+
 It then overrides __name__ and other special methods of the new class to
 match those of the original class, so it still looks like the original class.
 
@@ -88,135 +127,112 @@ instead of
 Yes, yes it is.
 
 But it does look neat now, doesn't it?
+
+Usage example 3 - millions of numbers:
+```
+@act_as_list('values', storage="array", typecode="d")
+class Measurements:
+    def __init__(self, values=()):
+        self.values = values # converted to array.array("d", values)
+
+measurements = Measurements([1.5, 2.5])
+measurements.append(3.5)
+numpy.asarray(measurements) # a numpy array sharing the memory of the array.array (no copy), if numpy is installed
+memoryview(measurements)    # the buffer of the array.array (python 3.12+)
+```
     """
+    if not attribute.isidentifier() or keyword.iskeyword(attribute):
+        raise ValueError(f"{attribute!r} is not a valid attribute name")
+    if storage not in ("list", "array", "deque", "lazy"):
+        raise ValueError(f"Unknown storage {storage!r}, use 'list', 'array', 'deque' or 'lazy'")
+    if maxlen is not None and storage != "deque":
+        raise ValueError("maxlen is only supported with storage='deque'")
+    if storage in ("deque", "lazy") and (indexed or sorted_by is not None):
+        raise ValueError(f"storage={storage!r} can't be combined with indexed=True or sorted_by")
+    if storage == "array":
+        array.array(typecode) # raises ValueError if the typecode is not valid
+    if sorted_by is not None and sorted_by is not True and not callable(sorted_by):
+        raise TypeError(f"sorted_by must be a key function or True, not {sorted_by!r}")
+    if sorted_by is not None and indexed:
+        raise ValueError("indexed=True can't be combined with sorted_by - a sorted list is searched with a binary search instead")
+    sort_key = None if sorted_by is True else sorted_by
+
     def decorator(cls):
         """
         Why this complexity?
         Python decorators can't add special methods like `__getitem__` or `__len__` directly to the classes they decorate. This is because these methods are looked up on the class itself, not on its instances.
         To work around this limitation, we create a new class that inherits from the decorated class, and add the special methods to that class. This way, the special methods are looked up on the new class, and they can access the attribute of the original class that we want to make act like a list.
         """
+        slot_names = (attribute, "_act_as_list_index") if indexed else (attribute,)
+        slot_names = tuple(name for name in slot_names if not hasattr(cls, name)) # not if it's already a slot (or a class attribute) of the decorated class
+
         class ActsLikeAList(cls):
             """
 `@act_as_list:`
 This class has been decorated with `@act_as_list` - it looks and acts like a list.
 """
+            if slots:
+                __slots__ = slot_names
+
             def __init__(self, *args, **kwargs):
                 """for creating an instance of the class: myfakelist = MyClassThatLooksLikeAList()"""
                 super().__init__(*args, **kwargs)
 
-            def __eq__(self, other):
-                """for comparison with other lists: myfakelist == ["hello", "world"] """
-                return list(getattr(self, attribute)) == other
-            
-            def __getitem__(self, index):
-                """for getting an item by index: myfakelist[0]"""
-                return getattr(self, attribute)[index]
-
-            def __setitem__(self, index, value):
-                """for setting an item by index: myfakelist[0] = "hello" """
-                getattr(self, attribute)[index] = value
-            
-            def __len__(self):
-                """for getting the length of the list: len(myfakelist)"""
-                return len(getattr(self, attribute))
-
-            def __iter__(self):
-                """for iterating over the list: for item in myfakelist:
-                (although this is also made possible by __getitem__)"""
-                return iter(getattr(self, attribute))
-
-            def __contains__(self, item):
-                """for checking if an item is in the list: "hello" in myfakelist"""
-                return item in getattr(self, attribute)
-
-            def __add__(self, other):
-                """for adding two lists: myfakelist + ["hello", "world"]
-                if the other object is not a list (or a fake list), it will be added to the end of the list: myfakelist + "hello"
-                if the decorated class has a _from_list method, it will be used to create a new instance of the class from the result of the addition
-                if not, the result will be a list
-                """
-                new_list = self.copy()
-                if isinstance(other, list) or isinstance(other, ActsLikeAList):
-                    for item in other:
-                        new_list.append(item)
-                return new_list
-                # alternative implementation:
-                # if isinstance(other, list):
-                #     _tmp_list = list(getattr(self, attribute)) + other
-                # elif isinstance(other, ActsLikeAList):
-                #     _tmp_list = list(getattr(self, attribute)) + list(getattr(other, attribute))
-                # else:
-                #     _tmp_list = list(getattr(self, attribute)) + [other]
-                
-                # if hasattr(self, "_from_list"):
-                #     return self._from_list(_tmp_list) # if the class has a _from_list method, return a new instance of the class
-                # else:
-                #     return _tmp_list # if the class doesn't have a _from_list method, return a list
-
-            def __str__(self):
-                """for printing the list: print(myfakelist)"""
-                return str(getattr(self, attribute))
-
-            def __repr__(self):
-                """for printing the list with the class name: myfakelist"""
-                return f"{self.__class__.__name__}({getattr(self, attribute)})"
-            
-            def __reversed__(self):
-                """for reversing the list without modifying the list: reversed(myfakelist)"""
-                # TODO: this should return a new instance of the class, not a list
-                _tmp_list = reversed(getattr(self, attribute))
-                if hasattr(self, "_from_list"):
-                    return self._from_list(_tmp_list) # if the class has a _from_list method, return a new instance of the class
-                else:
-                    return _tmp_list # if the class doesn't have a _from_list method, return a list
-
-            def reverse(self):
-                """for reversing the list inplace: myfakelist.reverse()"""
-                getattr(self, attribute).reverse()
-
-            def append(self, item):
-                """for appending an item to the list: myfakelist.append("hello")"""
-                getattr(self, attribute).append(item)
-
-            def insert(self, index, item):
-                """for inserting an item at a specific index: myfakelist.insert(0, "hello")"""
-                getattr(self, attribute).insert(index, item)
-
-            def count(self, item):
-                """for counting the number of times an item occurs in the list: myfakelist.count("hello")"""
-                return getattr(self, attribute).count(item)
-            
-            def extend(self, iterable):
-                """for extending the list with another iterable: myfakelist.extend(["hello", "world"])"""
-                getattr(self, attribute).extend(iterable)
-
-            def clear(self):
-                """for clearing the list: myfakelist.clear()"""
-                getattr(self, attribute).clear()
-
-            def copy(self):
-                """for copying the list: myfakelist.copy()"""
-                _tmp_list = getattr(self, attribute).copy()
-                if hasattr(self, "_from_list"):
-                    return self._from_list(_tmp_list) # if the class has a _from_list method, return a new instance of the class
-                else:
-                    return _tmp_list # if the class doesn't have a _from_list method, return a list
-            
-            def index(self, item):
-                """for getting the index of an item in the list: myfakelist.index("hello")"""
-                return getattr(self, attribute).index(item)
-            
-            def pop(self, index = -1):
-                """for popping an item from the list: myfakelist.pop()"""
-                return getattr(self, attribute).pop(index)
-            
-            def remove(self, item):
-                """for removing an item from the list: myfakelist.remove("hello")"""
-                getattr(self, attribute).remove(item)
-
-            def sort(self, *args, **kwargs):
-                """for sorting the list: myfakelist.sort()"""
-                getattr(self, attribute).sort(*args, **kwargs)
+        ActsLikeAList._act_as_list_attribute = attribute # so other @act_as_list classes can find the list of an instance
+
+        # generate the list methods, reading the attribute directly
+        namespace = {**_METHOD_GLOBALS, "ActsLikeAList": ActsLikeAList, "_sort_key": sort_key, "__name__": cls.__module__}
+        methods = {}
+        exec(_LIST_METHODS.format(attribute=attribute), namespace, methods)
+        if indexed:
+            exec(_INDEXED_METHODS.format(attribute=attribute), namespace, methods) # replaces the methods that use or change the index
+        if sorted_by is not None:
+            exec(_SORTED_METHODS.format(attribute=attribute), namespace, methods) # replaces the methods that add items or search for them
+        if storage == "deque":
+            exec(_DEQUE_METHODS.format(attribute=attribute), namespace, methods) # replaces the methods a deque doesn't support, and adds its own
+        if storage == "lazy":
+            exec(_LAZY_METHODS.format(attribute=attribute), namespace, methods) # replaces the methods that change the list
+        for name, method in methods.items():
+            function = method.fget if isinstance(method, property) else method
+            function.__qualname__ = f"{cls.__qualname__}.{name}"
+            setattr(ActsLikeAList, name, method)
+        if cls.__hash__ in (object.__hash__, None):
+            # __eq__ compares the items, so instances are unhashable, like lists - Python only does this itself for an __eq__
+            # defined in the class body, not for one set afterwards. A __hash__ defined by the decorated class is kept
+            ActsLikeAList.__hash__ = None
+
+        if storage != "list" or sorted_by is not None:
+            def __setattr__(self, name, value):
+                """converts whatever is assigned to the attribute (in __init__ or later) to an array.array, a deque or LazyRecords, and/or sorts it
+                (a __setattr__ instead of a descriptor, so reading the attribute stays a plain instance attribute lookup)"""
+                if name == attribute:
+                    if sorted_by is not None:
+                        value = sorted(value, key=sort_key) # a new list, so the list that was assigned isn't changed
+                    if storage == "array" and not (isinstance(value, array.array) and value.typecode == typecode):
+                        value = array.array(typecode, value)
+                    elif storage == "deque" and not (isinstance(value, deque) and value.maxlen == maxlen):
+                        value = deque(value, maxlen)
+                    elif storage == "lazy" and not isinstance(value, LazyRecords):
+                        value = LazyRecords.from_jsonl(value) if isinstance(value, (str, os.PathLike)) else LazyRecords.from_iterable(value)
+                super(ActsLikeAList, self).__setattr__(name, value)
+
+            ActsLikeAList.__setattr__ = __setattr__
+
+        if storage == "array":
+            def __array__(self, dtype=None, copy=None):
+                """for numpy: numpy.asarray(myfakelist) - a numpy array sharing the memory of the array.array, without copying it"""
+                import numpy # only imported when numpy calls this, so numpy is installed
+                result = numpy.frombuffer(getattr(self, attribute), dtype=typecode)
+                if copy:
+                    result = result.copy()
+                return result if dtype is None else result.astype(dtype, copy=False)
+
+            def __buffer__(self, flags):
+                """for the buffer protocol (python 3.12+): memoryview(myfakelist) - the buffer of the array.array"""
+                return memoryview(getattr(self, attribute))
+
+            ActsLikeAList.__array__ = __array__
+            ActsLikeAList.__buffer__ = __buffer__
 
         # assign name, qualname, etc. of the original class to the new class
         # otherwise, the name of the class will be 'ActsLikeAList'
@@ -226,3 +242,775 @@ This class has been decorated with `@act_as_list` - it looks and acts like a lis
         ActsLikeAList.__doc__ = (cls.__doc__ or "") + "\n" + ActsLikeAList.__doc__
         return ActsLikeAList
     return decorator
+
+# helpers for the list methods
+
+def _from_list(self, items):
+    """a new instance of the decorated class made from items if it has a _from_list method, or items as they are if not"""
+    if hasattr(self, "_from_list"):
+        return self._from_list(items)
+    return items
+
+def _items_of(other):
+    """the items of a list, array, deque, LazyRecords or @act_as_list object (without copying them), or None if other is none of those"""
+    if isinstance(other, (list, array.array, deque, LazyRecords)):
+        return other
+    attribute = getattr(type(other), "_act_as_list_attribute", None)
+    if attribute is not None:
+        return getattr(other, attribute)
+    return None
+
+def _as_storage_type(storage, items):
+    """items as the same type as storage, so they can be concatenated or assigned to a slice of it"""
+    if isinstance(storage, array.array):
+        if not (isinstance(items, array.array) and items.typecode == storage.typecode):
+            items = array.array(storage.typecode, items)
+    elif isinstance(storage, deque):
+        if not isinstance(items, deque):
+            items = deque(items)
+    elif not isinstance(items, list):
+        items = list(items)
+    return items
+
+def _comparable(storage, items):
+    """storage and items, as lists if they are not of the same kind (a list is never equal to an array or a deque)"""
+    if type(storage) is type(items) or isinstance(storage, list) and isinstance(items, list):
+        return storage, items
+    return list(storage), list(items)
+
+def _sorted_position(storage, item, key):
+    """the position of the first occurrence of item in a list sorted by key, or None if it isn't there"""
+    key_value = item if key is None else key(item)
+    start = bisect.bisect_left(storage, key_value, key=key)
+    stop = bisect.bisect_right(storage, key_value, lo=start, key=key)
+    for position in range(start, stop): # the items with the same key, which is normally just one
+        if storage[position] == item:
+            return position
+    return None
+
+# helpers for the list methods that array.array or deque don't have
+
+def _clear(storage):
+    if hasattr(storage, "clear"):
+        storage.clear()
+    else: # array.array
+        del storage[:]
+
+def _copy(storage):
+    if hasattr(storage, "copy"):
+        return storage.copy()
+    return storage[:] # array.array - a slice of an array is a new array
+
+def _sort(storage, key=None, reverse=False):
+    if hasattr(storage, "sort"):
+        storage.sort(key=key, reverse=reverse)
+    elif isinstance(storage, deque):
+        items = sorted(storage, key=key, reverse=reverse)
+        storage.clear()
+        storage.extend(items)
+    else: # array.array
+        storage[:] = array.array(storage.typecode, sorted(storage, key=key, reverse=reverse))
+
+# the list methods of ActsLikeAList, generated for each decorated class with the name of the attribute filled in,
+# so they read self.objects directly instead of getattr(self, "objects"), which is a lot slower in tight loops
+_LIST_METHODS = '''
+def __eq__(self, other):
+    """for comparison with other lists: myfakelist == ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage == items
+
+def __ne__(self, other):
+    """for comparison with other lists: myfakelist != ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage != items
+
+def __lt__(self, other):
+    """for comparison with other lists, item by item like lists: myfakelist < ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage < items
+
+def __le__(self, other):
+    """for comparison with other lists: myfakelist <= ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage <= items
+
+def __gt__(self, other):
+    """for comparison with other lists: myfakelist > ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage > items
+
+def __ge__(self, other):
+    """for comparison with other lists: myfakelist >= ["hello", "world"] """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage, items = _comparable(self.{attribute}, items)
+    return storage >= items
+
+def __getitem__(self, index):
+    """for getting an item by index: myfakelist[0]
+    or a slice: myfakelist[1:3] - if the decorated class has a _from_list method, it is used to create a new instance of the class from the slice
+    """
+    if isinstance(index, slice):
+        return _from_list(self, self.{attribute}[index])
+    return self.{attribute}[index]
+
+def __setitem__(self, index, value):
+    """for setting an item by index: myfakelist[0] = "hello"
+    or replacing a slice: myfakelist[1:3] = ["hello", "world"] (done by the list in one go, not item by item)
+    """
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        items = _items_of(value)
+        value = _as_storage_type(storage, value if items is None else items)
+    storage[index] = value
+
+def __delitem__(self, index):
+    """for deleting an item or a slice: del myfakelist[0], del myfakelist[1:3]"""
+    del self.{attribute}[index]
+
+def __len__(self):
+    """for getting the length of the list: len(myfakelist)"""
+    return len(self.{attribute})
+
+def __iter__(self):
+    """for iterating over the list: for item in myfakelist:
+    (although this is also made possible by __getitem__)"""
+    return iter(self.{attribute})
+
+def __contains__(self, item):
+    """for checking if an item is in the list: "hello" in myfakelist"""
+    return item in self.{attribute}
+
+def __add__(self, other):
+    """for adding two lists: myfakelist + ["hello", "world"]
+    the other object has to be a list (or a fake list), like when adding to a list - if not, a TypeError is raised
+    if the decorated class has a _from_list method, it will be used to create a new instance of the class from the result of the addition
+    if not, the result will be a list
+    """
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage = self.{attribute}
+    return _from_list(self, storage + _as_storage_type(storage, items)) # concatenated by the list in one go
+
+def __radd__(self, other):
+    """for adding a fake list to a list: ["hello", "world"] + myfakelist"""
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    storage = self.{attribute}
+    return _from_list(self, _as_storage_type(storage, items) + storage)
+
+def __iadd__(self, other):
+    """for extending the list in place with any iterable, like a list: myfakelist += ["hello", "world"]"""
+    storage = self.{attribute}
+    items = _items_of(other)
+    storage.extend(other if items is None else _as_storage_type(storage, items))
+    return self
+
+def __mul__(self, times):
+    """for repeating the list: myfakelist * 3 (a new instance of the class if it has a _from_list method, a list if not)"""
+    if not hasattr(type(times), "__index__"):
+        return NotImplemented
+    return _from_list(self, self.{attribute} * times)
+
+def __rmul__(self, times):
+    """for repeating the list: 3 * myfakelist"""
+    return self.__mul__(times)
+
+def __imul__(self, times):
+    """for repeating the list in place: myfakelist *= 3"""
+    if not hasattr(type(times), "__index__"):
+        return NotImplemented
+    storage = self.{attribute}
+    storage *= times # in place, for both lists and arrays
+    return self
+
+def __str__(self):
+    """for printing the list: print(myfakelist)"""
+    return str(self.{attribute})
+
+def __repr__(self):
+    """for printing the list with the class name: myfakelist"""
+    return f"{{self.__class__.__name__}}({{self.{attribute}}})"
+
+def __reversed__(self):
+    """for reversing the list without modifying the list: reversed(myfakelist)"""
+    if hasattr(self, "_from_list"):
+        return self._from_list(self.{attribute}[::-1]) # if the class has a _from_list method, return a new instance of the class, from a reversed copy
+    else:
+        return reversed(self.{attribute}) # if the class doesn't have a _from_list method, return a reverse iterator, like a list
+
+def reverse(self):
+    """for reversing the list inplace: myfakelist.reverse()"""
+    self.{attribute}.reverse()
+
+def append(self, item):
+    """for appending an item to the list: myfakelist.append("hello")"""
+    self.{attribute}.append(item)
+
+def insert(self, index, item):
+    """for inserting an item at a specific index: myfakelist.insert(0, "hello")"""
+    self.{attribute}.insert(index, item)
+
+def count(self, item):
+    """for counting the number of times an item occurs in the list: myfakelist.count("hello")"""
+    return self.{attribute}.count(item)
+
+def extend(self, iterable):
+    """for extending the list with another iterable: myfakelist.extend(["hello", "world"])"""
+    self.{attribute}.extend(iterable)
+
+def clear(self):
+    """for clearing the list: myfakelist.clear()"""
+    _clear(self.{attribute})
+
+def copy(self):
+    """for copying the list: myfakelist.copy()"""
+    _tmp_list = _copy(self.{attribute})
+    if hasattr(self, "_from_list"):
+        return self._from_list(_tmp_list) # if the class has a _from_list method, return a new instance of the class
+    else:
+        return _tmp_list # if the class doesn't have a _from_list method, return a list
+
+def index(self, item):
+    """for getting the index of an item in the list: myfakelist.index("hello")"""
+    return self.{attribute}.index(item)
+
+def pop(self, index = -1):
+    """for popping an item from the list: myfakelist.pop()"""
+    return self.{attribute}.pop(index)
+
+def remove(self, item):
+    """for removing an item from the list: myfakelist.remove("hello")"""
+    self.{attribute}.remove(item)
+
+def sort(self, *args, **kwargs):
+    """for sorting the list: myfakelist.sort()"""
+    _sort(self.{attribute}, *args, **kwargs)
+'''
+
+class _ListIndex:
+    """
+    The hash index of an @act_as_list(indexed=True) object:
+    - counts: value -> number of times it is in the list, which makes `in` and count() O(1)
+    - first positions: value -> position of its first occurrence, for index()
+
+    The counts are updated on every change. The first positions are updated when items are added to the end, replaced, or popped
+    from the end, but changes that move items (insert, remove, pop from the middle, sort, ...) make every position after them wrong,
+    so the first positions are dropped then, and built again (in one go) on the next call to index().
+    Those changes are O(n) on the list itself anyway.
+
+    The index remembers which list it was built for, and its length, so it is built again if the attribute is replaced,
+    or the list was appended to (or popped from) directly. Other direct changes to the list can't be detected.
+    """
+    __slots__ = ("storage", "length", "counts", "first_positions")
+    # counts is a Counter, but counts.get(item, 0) + 1 is used instead of counts[item] += 1, which calls Counter.__missing__ for new items
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.length = len(storage)
+        self.counts = Counter(storage) # raises TypeError if an item isn't hashable
+        self.first_positions = None # built on the first call to index()
+
+    def first_position(self, item):
+        if self.first_positions is None:
+            storage = self.storage
+            # later keys win, so going backwards leaves the first position of each value
+            self.first_positions = dict(zip(reversed(storage), range(len(storage) - 1, -1, -1)))
+        return self.first_positions.get(item)
+
+    def appended_one(self, item, position):
+        """item has been appended at position (the same as appended((item,), position), without the overhead of Counter.update)"""
+        self.counts[item] = self.counts.get(item, 0) + 1
+        if self.first_positions is not None and item not in self.first_positions:
+            self.first_positions[item] = position
+        self.length += 1
+
+    def appended(self, items, start, added_counts=None):
+        """items have been added to the end of the list, the first of them at position start (added_counts: Counter(items), if known)"""
+        self.counts.update(items if added_counts is None else added_counts)
+        if self.first_positions is not None:
+            for position, item in enumerate(items, start):
+                self.first_positions.setdefault(item, position)
+        self.length = len(self.storage)
+
+    def inserted(self, item):
+        self.counts[item] = self.counts.get(item, 0) + 1
+        self.first_positions = None
+        self.length = len(self.storage)
+
+    def removed(self, item, position=None):
+        """item has been removed from position (None if not known)"""
+        self._uncount(item)
+        if position is not None and position < 0:
+            position += self.length
+        if position != self.length - 1: # not the last item, so the items after it have moved
+            self.first_positions = None
+        elif item not in self.counts and self.first_positions is not None:
+            del self.first_positions[item]
+        self.length -= 1
+
+    def replaced(self, position, old_item, new_item):
+        """the item at position has been replaced"""
+        self._uncount(old_item)
+        self.counts[new_item] = self.counts.get(new_item, 0) + 1
+        if self.first_positions is not None:
+            if position < 0:
+                position += self.length
+            if self.first_positions.get(old_item) == position:
+                self.first_positions = None # the next occurrence of old_item (if any) is not known
+            elif self.first_positions.get(new_item, position) >= position:
+                self.first_positions[new_item] = position
+
+    def repeated(self, times):
+        """the list has been repeated in place"""
+        if times <= 0:
+            self.counts.clear()
+            self.first_positions = None
+        else:
+            for item in self.counts:
+                self.counts[item] *= times # the first positions are still the same
+        self.length = len(self.storage)
+
+    def moved(self):
+        """the items have been moved around (sorted, reversed, ...), without adding or removing any"""
+        self.first_positions = None
+
+    def _uncount(self, item):
+        count = self.counts[item] - 1
+        if count:
+            self.counts[item] = count
+        else:
+            del self.counts[item]
+
+def _list_index(instance, storage):
+    """the _ListIndex of an @act_as_list(indexed=True) instance, (re)built if it isn't the index of storage"""
+    try:
+        index = instance._act_as_list_index
+    except AttributeError:
+        index = None
+    if index is None or index.storage is not storage or index.length != len(storage):
+        index = instance._act_as_list_index = _ListIndex(storage)
+    return index
+
+# the list methods of @act_as_list(indexed=True) classes that use or update the index, replacing those in _LIST_METHODS
+# changes that can fail (on an array of the wrong type, for example) are made before the index is updated,
+# and items are hashed first where needed, so a failed change doesn't leave the index out of date
+_INDEXED_METHODS = '''
+def __contains__(self, item):
+    """for checking if an item is in the list: "hello" in myfakelist - a lookup in the index"""
+    storage = self.{attribute}
+    try:
+        return item in _list_index(self, storage).counts
+    except TypeError: # item isn't hashable, but could still be equal to an item of the list
+        return item in storage
+
+def count(self, item):
+    """for counting the number of times an item occurs in the list: myfakelist.count("hello") - a lookup in the index"""
+    storage = self.{attribute}
+    try:
+        return _list_index(self, storage).counts[item]
+    except TypeError:
+        return storage.count(item)
+
+def index(self, item):
+    """for getting the index of an item in the list: myfakelist.index("hello") - a lookup in the index"""
+    storage = self.{attribute}
+    try:
+        position = _list_index(self, storage).first_position(item)
+    except TypeError:
+        return storage.index(item)
+    if position is None:
+        raise ValueError(f"{{item!r}} is not in list")
+    return position
+
+def append(self, item):
+    """for appending an item to the list: myfakelist.append("hello")"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    hash(item) # before changing the list, so it isn't changed if the item can't be indexed
+    storage.append(item)
+    list_index.appended_one(item, len(storage) - 1)
+
+def extend(self, iterable):
+    """for extending the list with another iterable: myfakelist.extend(["hello", "world"])"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    start = len(storage)
+    items = _as_storage_type(storage, iterable) # a copy if it isn't a list, as an iterator can only be read once
+    if items is storage: # myfakelist.extend(myfakelist)
+        items = items[:]
+    added_counts = Counter(items) # hashes the items before changing the list, so it isn't changed if they can't be indexed
+    storage.extend(items)
+    list_index.appended(items, start, added_counts)
+
+def __iadd__(self, other):
+    """for extending the list in place with any iterable, like a list: myfakelist += ["hello", "world"]"""
+    items = _items_of(other)
+    self.extend(other if items is None else items)
+    return self
+
+def insert(self, index, item):
+    """for inserting an item at a specific index: myfakelist.insert(0, "hello")"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    hash(item)
+    storage.insert(index, item)
+    list_index.inserted(item)
+
+def pop(self, index = -1):
+    """for popping an item from the list: myfakelist.pop()"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    item = storage.pop(index)
+    list_index.removed(item, index)
+    return item
+
+def remove(self, item):
+    """for removing an item from the list: myfakelist.remove("hello")"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    position = self.index(item) # raises ValueError if it isn't there, like a list
+    del storage[position]
+    list_index.removed(item, position)
+
+def __setitem__(self, index, value):
+    """for setting an item by index: myfakelist[0] = "hello", or replacing a slice: myfakelist[1:3] = ["hello", "world"]"""
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        items = _items_of(value)
+        storage[index] = _as_storage_type(storage, value if items is None else items)
+        self._act_as_list_index = None # built again when it is needed, as a slice can change the length and move everything after it
+        return
+    list_index = _list_index(self, storage)
+    hash(value)
+    old_item = storage[index]
+    storage[index] = value
+    list_index.replaced(index, old_item, value)
+
+def __delitem__(self, index):
+    """for deleting an item or a slice: del myfakelist[0], del myfakelist[1:3]"""
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        del storage[index]
+        self._act_as_list_index = None
+        return
+    list_index = _list_index(self, storage)
+    item = storage[index]
+    del storage[index]
+    list_index.removed(item, index)
+
+def __imul__(self, times):
+    """for repeating the list in place: myfakelist *= 3"""
+    if not hasattr(type(times), "__index__"):
+        return NotImplemented
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    storage *= times
+    list_index.repeated(times)
+    return self
+
+def clear(self):
+    """for clearing the list: myfakelist.clear()"""
+    storage = self.{attribute}
+    _clear(storage)
+    self._act_as_list_index = _ListIndex(storage)
+
+def reverse(self):
+    """for reversing the list inplace: myfakelist.reverse()"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    storage.reverse()
+    list_index.moved()
+
+def sort(self, *args, **kwargs):
+    """for sorting the list: myfakelist.sort()"""
+    storage = self.{attribute}
+    list_index = _list_index(self, storage)
+    _sort(storage, *args, **kwargs)
+    list_index.moved()
+'''
+
+# extend() on a sorted list adds up to this many items one by one at their sorted position,
+# and more items by adding them to the end and sorting the whole list, which is faster for big batches,
+# as sort() merges the two sorted runs in one go
+_SORTED_EXTEND_ONE_BY_ONE = 32
+
+# the list methods of @act_as_list(sorted_by=key) classes, replacing those in _LIST_METHODS
+# the list is kept sorted by _sort_key (None to sort by the items themselves), so items are found with a binary search,
+# and can't be put at a position of your choice (insert(), myfakelist[0] = item, reverse() raise a TypeError)
+_SORTED_METHODS = '''
+def __contains__(self, item):
+    """for checking if an item is in the list: "hello" in myfakelist - a binary search"""
+    return _sorted_position(self.{attribute}, item, _sort_key) is not None
+
+def index(self, item):
+    """for getting the index of an item in the list: myfakelist.index("hello") - a binary search"""
+    position = _sorted_position(self.{attribute}, item, _sort_key)
+    if position is None:
+        raise ValueError(f"{{item!r}} is not in list")
+    return position
+
+def count(self, item):
+    """for counting the number of times an item occurs in the list: myfakelist.count("hello") - a binary search"""
+    storage = self.{attribute}
+    key_value = item if _sort_key is None else _sort_key(item)
+    start = bisect.bisect_left(storage, key_value, key=_sort_key)
+    stop = bisect.bisect_right(storage, key_value, lo=start, key=_sort_key)
+    return storage[start:stop].count(item)
+
+def remove(self, item):
+    """for removing an item from the list: myfakelist.remove("hello")"""
+    del self.{attribute}[self.index(item)]
+
+def append(self, item):
+    """for adding an item at its sorted position: myfakelist.append("hello") - a binary search, and moving the items after it up"""
+    bisect.insort(self.{attribute}, item, key=_sort_key)
+
+def extend(self, iterable):
+    """for adding the items of another iterable at their sorted positions: myfakelist.extend(["hello", "world"])"""
+    storage = self.{attribute}
+    items = _as_storage_type(storage, iterable)
+    if len(items) <= _SORTED_EXTEND_ONE_BY_ONE:
+        for item in items:
+            bisect.insort(storage, item, key=_sort_key)
+    else:
+        storage.extend(items)
+        _sort(storage, key=_sort_key)
+
+def __iadd__(self, other):
+    """for adding the items of any iterable at their sorted positions: myfakelist += ["hello", "world"]"""
+    items = _items_of(other)
+    self.extend(other if items is None else items)
+    return self
+
+def __imul__(self, times):
+    """for repeating the items in place: myfakelist *= 3 (each item 3 times, in sorted order)"""
+    if not hasattr(type(times), "__index__"):
+        return NotImplemented
+    storage = self.{attribute}
+    storage *= times
+    _sort(storage, key=_sort_key)
+    return self
+
+def insert(self, index, item):
+    """a sorted list decides where the items go: use append()"""
+    raise TypeError(f"{{type(self).__name__}} is kept sorted, so items can't be inserted at a position - use append()")
+
+def __setitem__(self, index, value):
+    """a sorted list decides where the items go: remove the old item, and append() the new one"""
+    raise TypeError(f"{{type(self).__name__}} is kept sorted, so items can't be set at a position - use remove() and append()")
+
+def reverse(self):
+    """a sorted list can't be reversed in place: use reversed(myfakelist)"""
+    raise TypeError(f"{{type(self).__name__}} is kept sorted, so it can't be reversed in place - use reversed()")
+
+def sort(self, *args, **kwargs):
+    """the list is always sorted, so this does nothing - sorting it by something else raises a TypeError"""
+    if args or kwargs:
+        raise TypeError(f"{{type(self).__name__}} is kept sorted by its sorted_by key, so it can't be sorted by something else")
+
+def irange(self, lo=None, hi=None, inclusive=(True, True)):
+    """iterate over the items with a key from lo to hi: myfakelist.irange(10, 20)
+    (with a key function, lo and hi are keys, not items; None means no limit)
+    inclusive (tuple of 2 bools): whether items with a key equal to lo and hi are included
+    """
+    storage = self.{attribute}
+    if lo is None:
+        start = 0
+    elif inclusive[0]:
+        start = bisect.bisect_left(storage, lo, key=_sort_key)
+    else:
+        start = bisect.bisect_right(storage, lo, key=_sort_key)
+    if hi is None:
+        stop = len(storage)
+    elif inclusive[1]:
+        stop = bisect.bisect_right(storage, hi, lo=start, key=_sort_key)
+    else:
+        stop = bisect.bisect_left(storage, hi, lo=start, key=_sort_key)
+    return iter(storage[start:stop]) # a copy of just those items, so the list can be changed while iterating
+
+def bisect_left(self, key_value):
+    """the position where an item with this key would be added before the items with the same key: myfakelist.bisect_left(10)"""
+    return bisect.bisect_left(self.{attribute}, key_value, key=_sort_key)
+
+def bisect_right(self, key_value):
+    """the position where an item with this key would be added after the items with the same key: myfakelist.bisect_right(10)"""
+    return bisect.bisect_right(self.{attribute}, key_value, key=_sort_key)
+
+def rank(self, key_value):
+    """the number of items with a key lower than key_value: myfakelist.rank(10)"""
+    return bisect.bisect_left(self.{attribute}, key_value, key=_sort_key)
+'''
+
+# the list methods of @act_as_list(storage="deque") classes, replacing those in _LIST_METHODS that a deque doesn't support,
+# and adding the methods of a deque - with the complexity of each (n is the number of items)
+# the other list methods work on a deque as they are: append(), extend(), clear(), copy(), `+`, `*`, len(), iter() are the same
+# as on a list, insert() is O(1) at both ends and O(n) towards the middle, and `in`, count(), index(), remove(), reverse()
+# and sort() are O(n) (O(n log n) for sort()), like on a list
+_DEQUE_METHODS = '''
+def __getitem__(self, index):
+    """for getting an item by index: myfakelist[0] - O(1) at both ends, O(n) towards the middle
+    or a slice: myfakelist[1:3] - O(n), a deque, or a new instance of the class if it has a _from_list method
+    """
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        return _from_list(self, deque(list(storage)[index]))
+    return storage[index]
+
+def __setitem__(self, index, value):
+    """for setting an item by index: myfakelist[0] = "hello" - O(1) at both ends, O(n) towards the middle
+    or replacing a slice: myfakelist[1:3] = ["hello", "world"] - O(n), as all the items are copied
+    """
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        items = list(storage)
+        new_items = _items_of(value)
+        items[index] = value if new_items is None else new_items
+        storage.clear()
+        storage.extend(items) # the same deque, so its maxlen is kept
+    else:
+        storage[index] = value
+
+def __delitem__(self, index):
+    """for deleting an item: del myfakelist[0] - O(1) at both ends, O(n) towards the middle
+    or a slice: del myfakelist[1:3] - O(n)
+    """
+    storage = self.{attribute}
+    if isinstance(index, slice):
+        items = list(storage)
+        del items[index]
+        storage.clear()
+        storage.extend(items)
+    else:
+        del storage[index]
+
+def __reversed__(self):
+    """for reversing the list without modifying the list: reversed(myfakelist) - O(1), or O(n) with a _from_list method"""
+    if hasattr(self, "_from_list"):
+        return self._from_list(deque(reversed(self.{attribute})))
+    return reversed(self.{attribute})
+
+def pop(self, index = -1):
+    """for popping an item from the list: myfakelist.pop() - O(1) for the first or last item (pop(0), pop()), O(n) towards the middle"""
+    storage = self.{attribute}
+    if index == -1:
+        return storage.pop()
+    if index == 0:
+        return storage.popleft()
+    item = storage[index]
+    del storage[index]
+    return item
+
+def appendleft(self, item):
+    """for adding an item at the start: myfakelist.appendleft("hello") - O(1)"""
+    self.{attribute}.appendleft(item)
+
+def popleft(self):
+    """for removing and returning the first item: myfakelist.popleft() - O(1)"""
+    return self.{attribute}.popleft()
+
+def extendleft(self, iterable):
+    """for adding the items of an iterable at the start, in reverse order: myfakelist.extendleft(["hello", "world"]) - O(k) for k items"""
+    self.{attribute}.extendleft(iterable)
+
+def rotate(self, n=1):
+    """for moving the last n items to the start (or the first n items to the end, if n is negative): myfakelist.rotate(1) - O(n) for n steps"""
+    self.{attribute}.rotate(n)
+
+@property
+def maxlen(self):
+    """the maximum number of items, or None if there is no limit"""
+    return self.{attribute}.maxlen
+'''
+
+def _read_only(self, method_name):
+    raise TypeError(f"{type(self).__name__} is read-only (storage='lazy'), so {method_name}() is not supported")
+
+# the list methods of @act_as_list(storage="lazy") classes, replacing those in _LIST_METHODS
+# the records are read-only, so the methods that would change them raise a TypeError
+# `+` and `*` return a list (or a new instance of the class, with a _from_list method), so they load all the records,
+# like copy(), slices and comparisons (`==`, `<`, ...) do - `in`, index() and count() go through the records a chunk at a time
+# (LazyRecords.__contains__, index() and count(), which the generated methods call)
+_LAZY_METHODS = '''
+def __add__(self, other):
+    """for adding a list: myfakelist + ["hello", "world"] - loads all the records into a new list"""
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    return _from_list(self, list(self.{attribute}) + list(items))
+
+def __radd__(self, other):
+    """for adding to a list: ["hello", "world"] + myfakelist - loads all the records into a new list"""
+    items = _items_of(other)
+    if items is None:
+        return NotImplemented
+    return _from_list(self, list(items) + list(self.{attribute}))
+
+def __mul__(self, times):
+    """for repeating the records: myfakelist * 3 - loads all the records into a new list"""
+    if not hasattr(type(times), "__index__"):
+        return NotImplemented
+    return _from_list(self, list(self.{attribute}) * times)
+
+def __setitem__(self, index, value):
+    _read_only(self, "__setitem__")
+
+def __delitem__(self, index):
+    _read_only(self, "__delitem__")
+
+def __iadd__(self, other):
+    _read_only(self, "__iadd__")
+
+def __imul__(self, times):
+    _read_only(self, "__imul__")
+
+def append(self, item):
+    _read_only(self, "append")
+
+def insert(self, index, item):
+    _read_only(self, "insert")
+
+def extend(self, iterable):
+    _read_only(self, "extend")
+
+def pop(self, index = -1):
+    _read_only(self, "pop")
+
+def remove(self, item):
+    _read_only(self, "remove")
+
+def clear(self):
+    _read_only(self, "clear")
+
+def reverse(self):
+    _read_only(self, "reverse")
+
+def sort(self, *args, **kwargs):
+    _read_only(self, "sort")
+'''
+
+# the names the generated methods use
+_METHOD_GLOBALS = {
+    "bisect": bisect, "deque": deque, "Counter": Counter, "_read_only": _read_only,
+    "_clear": _clear, "_copy": _copy, "_sort": _sort, "_from_list": _from_list, "_items_of": _items_of,
+    "_as_storage_type": _as_storage_type, "_comparable": _comparable, "_sorted_position": _sorted_position,
+    "_list_index": _list_index, "_ListIndex": _ListIndex, "_SORTED_EXTEND_ONE_BY_ONE": _SORTED_EXTEND_ONE_BY_ONE,
+}
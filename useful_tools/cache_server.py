@@ -0,0 +1,353 @@
+"""
+A network-shared cache for @cache_to_disk and execute_with_cache, so processes on different machines
+can share cached results instead of each keeping a private cache_dir.
+
+It consists of:
+- CacheServer: a pure-Python reference server, good enough for tests and small deployments
+- RemoteCacheClient: a client with connection pooling and pipelined batch gets
+
+The protocol is a simple line-based TCP protocol. Keys can't contain whitespace, values are raw bytes:
+
+    GET <key>\\n                          ->  VALUE <nbytes>\\n<bytes>  or  MISS\\n
+    SET <key> <ttl> <nbytes>\\n<bytes>    ->  STORED\\n        (ttl in seconds, "-" for no expiry)
+    DEL <key>\\n                          ->  DELETED\\n  or  NOT_FOUND\\n
+    anything else                        ->  ERROR <message>\\n
+
+Several requests can be sent without waiting for the responses (pipelining) - they are answered in order.
+
+Usage with @cache_to_disk:
+```
+from useful_tools.cache_server import RemoteCacheClient
+class MyClass:
+    cache_enabled = True
+    cache_dir = "cache"
+    cache_expiration = 3600
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+    cache_backend = RemoteCacheClient("cache-server.internal", 7711, secret=b"shared secret") # the same secret on all machines
+    cache_near_cache = True # optional: also keep a copy in cache_dir, which is checked before the server
+```
+
+To run the reference server (it listens on 127.0.0.1 by default, so only local processes can use it):
+python -m useful_tools.cache_server --port 7711
+
+The server has no authentication, and cache_to_disk unpickles what it gets from it - unpickling data can run arbitrary code.
+So only make it listen on other interfaces (--host 0.0.0.0) on a trusted network, and give the clients a secret:
+values are then signed with an HMAC of the secret (and the key), and values with a missing or wrong signature are rejected
+before they are unpickled - they are treated as a cache miss.
+"""
+
+import hmac
+import time
+import heapq
+import queue
+import hashlib
+import itertools
+import socket
+import argparse
+import threading
+import socketserver
+from contextlib import contextmanager
+
+DEFAULT_PORT = 7711
+_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+class RemoteCacheError(OSError):
+    """
+    Exception raised when the cache server returns an error or an unexpected response.
+    It's an OSError, like the errors raised when the server can't be reached, so cache_to_disk treats both as a cache miss.
+    """
+    pass
+
+def _validate_key(key):
+    if not key or any(char.isspace() for char in key):
+        raise ValueError(f"Invalid cache key {key!r}: keys must be non-empty and can't contain whitespace")
+    return key
+
+def _format_ttl(ttl):
+    return "-" if ttl is None else repr(float(ttl))
+
+def _parse_ttl(ttl):
+    return None if ttl == "-" else float(ttl)
+
+class _CacheRequestHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection, answering requests until the client disconnects"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return # client disconnected
+            try:
+                response = self.handle_command(line.decode("utf-8").split())
+            except (ValueError, IndexError) as e:
+                response = f"ERROR {e}\n".encode("utf-8")
+            self.wfile.write(response)
+
+    def handle_command(self, parts):
+        store = self.server.store
+        command = parts[0].upper() if parts else ""
+        if command == "GET" and len(parts) == 2:
+            value = store.get(parts[1])
+            if value is None:
+                return b"MISS\n"
+            return f"VALUE {len(value)}\n".encode("utf-8") + value
+        if command == "SET" and len(parts) == 4:
+            nbytes = int(parts[3])
+            value = self.rfile.read(nbytes)
+            if len(value) != nbytes:
+                raise ValueError("connection closed before the whole value was received")
+            store.set(parts[1], value, _parse_ttl(parts[2]))
+            return b"STORED\n"
+        if command == "DEL" and len(parts) == 2:
+            return b"DELETED\n" if store.delete(parts[1]) else b"NOT_FOUND\n"
+        raise ValueError(f"unknown command {' '.join(parts)!r}")
+
+class _ExpiringStore:
+    """
+    Thread-safe dict of key -> (expires_at, value), where expired entries are removed when they are looked up,
+    and when entries are stored, so keys that are never read again don't stay in memory
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # (expires_at, insertion number, key) of the entries with a ttl, soonest first - entries of replaced values are skipped
+        self._expirations = []
+        self._insertion_numbers = itertools.count() # so the keys themselves are never compared
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        now = time.monotonic()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            self._remove_expired(now)
+            self._entries[key] = (expires_at, value)
+            if expires_at is not None:
+                heapq.heappush(self._expirations, (expires_at, next(self._insertion_numbers), key))
+                if len(self._expirations) > 2 * len(self._entries) + 64:
+                    # mostly entries of values that were replaced or deleted since, so build it again from the entries
+                    self._expirations = [
+                        (entry_expires_at, next(self._insertion_numbers), entry_key)
+                        for entry_key, (entry_expires_at, _value) in self._entries.items() if entry_expires_at is not None
+                    ]
+                    heapq.heapify(self._expirations)
+
+    def _remove_expired(self, now):
+        """remove the entries that have expired (called with the lock held)"""
+        expirations = self._expirations
+        while expirations and expirations[0][0] <= now:
+            expires_at, _insertion_number, key = heapq.heappop(expirations)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == expires_at: # not replaced by a newer value since
+                del self._entries[key]
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class CacheServer:
+    """
+    Pure-Python reference cache server.
+
+    Usage:
+    ```
+    with CacheServer(port=0) as server: # port 0 picks a free port
+        client = RemoteCacheClient(*server.address)
+        client.set("key", b"value", ttl=60)
+        client.get("key") # returns b"value"
+    ```
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self._server = _ThreadingTCPServer((host, port), _CacheRequestHandler)
+        self._server.store = _ExpiringStore()
+        self._thread = None
+
+    @property
+    def address(self):
+        """(host, port) the server is listening on"""
+        return self._server.server_address[:2]
+
+    @property
+    def store(self):
+        return self._server.store
+
+    def start(self):
+        """start serving in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="CacheServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """serve in the current thread, until stop() is called from another thread (or Ctrl-C)"""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+class _Connection:
+    def __init__(self, address, timeout):
+        self.socket = socket.create_connection(address, timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.socket.makefile("rb")
+
+    def read_response(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("connection closed by the cache server")
+        parts = line.decode("utf-8").split(maxsplit=1)
+        if parts[0] == "VALUE":
+            nbytes = int(parts[1])
+            value = self.rfile.read(nbytes)
+            if len(value) != nbytes:
+                raise ConnectionError("connection closed before the whole value was received")
+            return value
+        if parts[0] == "MISS":
+            return None
+        if parts[0] in ("STORED", "DELETED", "NOT_FOUND"):
+            return parts[0]
+        raise RemoteCacheError(line.decode("utf-8").strip())
+
+    def close(self):
+        try:
+            self.rfile.close()
+            self.socket.close()
+        except OSError: # pragma: no cover
+            pass # pragma: no cover
+
+class RemoteCacheClient:
+    """
+    Client for CacheServer, with a pool of persistent connections, so it can be shared between threads.
+
+    Args:
+        host (str): host name or ip address of the cache server
+        port (int): port of the cache server
+        max_idle_connections (int): number of idle connections to keep open for reuse
+        timeout (float): socket timeout in seconds
+        secret (bytes or str, optional): shared secret - values are stored with an HMAC-SHA256 signature of the key and value,
+            and get() raises RemoteCacheError for a value whose signature doesn't match (stored without the secret, or tampered with)
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, max_idle_connections=8, timeout=5.0, secret=None):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self._idle_connections = queue.LifoQueue(maxsize=max_idle_connections)
+
+    def __repr__(self):
+        # the client is often set as a class attribute on a cached class, so keep the repr short and stable
+        return f"RemoteCacheClient('{self.address[0]}', {self.address[1]})"
+
+    @contextmanager
+    def _connection(self):
+        try:
+            connection = self._idle_connections.get_nowait()
+        except queue.Empty:
+            connection = _Connection(self.address, self.timeout)
+        try:
+            yield connection
+        except BaseException:
+            # the connection may be in the middle of a response, so it can't be reused
+            connection.close()
+            raise
+        try:
+            self._idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _signature(self, key, value):
+        return hmac.new(self._secret, key.encode("utf-8") + b"\n" + value, hashlib.sha256).digest()
+
+    def _sign(self, key, value):
+        if self._secret is None:
+            return value
+        return self._signature(key, value) + value
+
+    def _verify(self, key, value):
+        """the value without its signature - raises RemoteCacheError if the signature doesn't match"""
+        if self._secret is None or value is None:
+            return value
+        signature, value = value[:_SIGNATURE_SIZE], value[_SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._signature(key, value)):
+            raise RemoteCacheError(f"invalid signature for the value of {key!r}")
+        return value
+
+    def get(self, key):
+        """return the value stored under key (bytes), or None if it doesn't exist or has expired"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """
+        Get several keys in one round trip - all requests are sent before the first response is read.
+        Returns a list of values (bytes or None) in the same order as the keys.
+        """
+        if not keys:
+            return []
+        request = b"".join(f"GET {_validate_key(key)}\n".encode("utf-8") for key in keys)
+        with self._connection() as connection:
+            connection.socket.sendall(request)
+            values = [connection.read_response() for _ in keys]
+        # checked once all the responses are read, so the connection can still be reused
+        return [self._verify(key, value) for key, value in zip(keys, values)]
+
+    def set(self, key, value, ttl=None):
+        """store value (bytes) under key, expiring after ttl seconds (None: never expires)"""
+        value = self._sign(key, value)
+        header = f"SET {_validate_key(key)} {_format_ttl(ttl)} {len(value)}\n".encode("utf-8")
+        with self._connection() as connection:
+            connection.socket.sendall(header + value)
+            connection.read_response()
+
+    def delete(self, key):
+        """delete key - returns True if it existed"""
+        with self._connection() as connection:
+            connection.socket.sendall(f"DEL {_validate_key(key)}\n".encode("utf-8"))
+            return connection.read_response() == "DELETED"
+
+    def close(self):
+        """close all idle connections"""
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+if __name__ == "__main__": # pragma: no cover
+    parser = argparse.ArgumentParser(description="Run the reference cache server for @cache_to_disk")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    arguments = parser.parse_args()
+    server = CacheServer(arguments.host, arguments.port)
+    print(f"Cache server listening on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -3,9 +3,12 @@ import os
 import time
 import pickle
 import inspect
+import threading
 from functools import wraps
 from useful_tools.property_factory import PropertyFactory
-from useful_tools.hash_functions import make_arg_hash
+from useful_tools.hash_functions import make_arg_hash, instance_hash_info
+from useful_tools.content_addressed_storage import ContentPointer, save_deduplicated, load_payload, release_cache_file
+from useful_tools.lazy_cached_result import LazyCachedResult, peek_cache_time
 
 # decorators to cache the result of a function to disk
 # this is used in order to avoid sending the same request multiple times
@@ -31,7 +34,7 @@ class FormattedCacheStatusProperty:
             # the result is that you get the cache_status_dict_key on one line, followed by all the log entries for that key
             return newline.join(list(f"{k}: \n{newline.join([log_item for log_item in v]) if isinstance(v, list) else v}\n" for k, v in instance.cache_status_dict.items()))
 
-def cache_to_disk(func):
+def cache_to_disk(func=None, *, cache_key_attrs=None, lazy_load=False):
     """
 @cache_to_disk decorator to cache the result of a method to disk
 uses pickle to save the result to disk
@@ -42,6 +45,12 @@ this decorator can only be used in classes that have the following attributes:
 - force_cache_expiration  (True or False)
 - ignore_cache_expiration (True or False)
 
+Optional attributes:
+- cache_deduplicate       (True or False, default False) - store identical results only once, see content_addressed_storage.py
+- cache_backend           (default None) - a RemoteCacheClient to share the cache between machines, see cache_server.py
+- cache_near_cache        (True or False, default False) - with a cache_backend, also keep a copy in cache_dir, which is checked first
+- cache_backend_ttl       (default cache_expiration) - number of seconds before the cache server deletes an entry
+
 If used in conjunction with @property, the property decorator must be defined before the cache_to_disk decorator, like this:
 
 from useful_tools.cache_decorators import cache_to_disk
@@ -64,49 +73,85 @@ print(myclass.my_property)  # prints "my_property called 1 times"
 print(myclass.cache_status_dict) # gives info about the use of cache in the previous call
 print(myclass.my_property)  # prints "my_property called 1 times", as the result is cached
 print(myclass.cache_status_dict) # gives info about the use of cache in the previous call
+
+The instance is part of the cache key, as the result of a method usually depends on the state of the instance.
+By default repr(instance) is used. If that is slow, or contains memory addresses (so the cache can't be reused
+by another process), define __cache_key__ on the class, returning the state that matters:
+
+class MyClass:
+    ...
+    def __cache_key__(self):
+        return (self.customer_id, self.region)
+
+or name the attributes on the decorator: @cache_to_disk(cache_key_attrs=["customer_id", "region"])
+
+For methods returning big results, @cache_to_disk(lazy_load=True) returns a LazyCachedResult on a cache hit,
+which is only unpickled when it is used - see lazy_cached_result.py for what the proxy does and doesn't support.
+
+On a generator function, the items it produces are cached (written to the cache file while they are consumed),
+and replayed one at a time from the cache file on later calls. A stream is only saved when it has been consumed completely.
     """
+    if func is None:
+        # the decorator was called with arguments: @cache_to_disk(cache_key_attrs=[...])
+        return lambda func: cache_to_disk(func, cache_key_attrs=cache_key_attrs, lazy_load=lazy_load)
+
     # raise an error if the decorator is used on a property, as this will fail
     if isinstance(func, property):
         raise TypeError(f"Cannot cache a property. Apply @property above @cache_to_disk, not below.")
 
+    # coroutine functions are cached by the async variant, which awaits the result before caching it
+    if inspect.iscoroutinefunction(func):
+        if lazy_load:
+            raise TypeError(f"lazy_load can't be used on async functions like {func.__qualname__}")
+        from useful_tools.cache_to_disk_async import cache_to_disk as async_cache_to_disk
+        return async_cache_to_disk(func, cache_key_attrs=cache_key_attrs)
+
     @wraps(func)
     def wrapper(self, *args, **kwargs):
-        # method to delete the last saved cache file
-        def delete_last_saved_cache_file(self):
-            if hasattr(self, "cache_status_dict") and "last_saved_cache_file" in self.cache_status_dict:
-                file = self.cache_status_dict["last_saved_cache_file"]
-                key  = self.cache_status_dict.get("last_saved_cache_file_key")
-                if os.path.exists(file):
-                    os.remove(file) # delete the file
-                    del(self.cache_status_dict["last_saved_cache_file"]) # remove the key from the cache_status_dict
-                    if key in self.cache_status_dict:
-                        self.cache_status_dict[key].append("cache_file_deleted")
-                    return file
-            return None
-
-        # Attach properties and methods to the instance
-        type(self).cache_status = FormattedCacheStatusProperty()
-        type(self).last_saved_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file"))
-        type(self).last_saved_cache_file_key = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file_key"))
-        type(self).delete_last_saved_cache_file = delete_last_saved_cache_file
-
-        result, cache_status_dict = execute_with_instance_and_cache(self, func, args, kwargs)
-
-        # update cache_status_dict attribute
-        if not hasattr(self, "cache_status_dict"):
-            self.cache_status_dict = {}
-        self.cache_status_dict.update(cache_status_dict)
-        
+        _attach_cache_status_properties(self)
+        result, cache_status_dict = execute_with_instance_and_cache(self, func, args, kwargs, cache_key_attrs=cache_key_attrs, lazy_load=lazy_load)
+        _update_instance_cache_status(self, cache_status_dict)
         return result
 
     return wrapper
 
+def _delete_last_saved_cache_file(self):
+    """method to delete the last saved cache file - attached to classes using @cache_to_disk as delete_last_saved_cache_file"""
+    backend = getattr(self, "cache_backend", None)
+    if backend is not None and hasattr(self, "cache_status_dict") and self.cache_status_dict.get("last_saved_cache_file_key"):
+        backend.delete(self.cache_status_dict["last_saved_cache_file_key"]) # also delete the entry on the cache server
+    if hasattr(self, "cache_status_dict") and "last_saved_cache_file" in self.cache_status_dict:
+        file = self.cache_status_dict["last_saved_cache_file"]
+        key  = self.cache_status_dict.get("last_saved_cache_file_key")
+        if file is not None and os.path.exists(file):
+            release_cache_file(self.cache_dir, file) # if it's a pointer file, release the payload it refers to
+            os.remove(file) # delete the file
+            del(self.cache_status_dict["last_saved_cache_file"]) # remove the key from the cache_status_dict
+            if key in self.cache_status_dict:
+                self.cache_status_dict[key].append("cache_file_deleted")
+            return file
+    return None
+
+def _attach_cache_status_properties(self):
+    """Attach properties and methods to the class of the instance with a decorated method"""
+    type(self).cache_status = FormattedCacheStatusProperty()
+    type(self).last_saved_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file"))
+    type(self).last_saved_cache_file_key = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file_key"))
+    type(self).last_loaded_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_loaded_cache_file"))
+    type(self).delete_last_saved_cache_file = _delete_last_saved_cache_file
+
+def _update_instance_cache_status(self, cache_status_dict):
+    """update cache_status_dict attribute"""
+    if not hasattr(self, "cache_status_dict"):
+        self.cache_status_dict = {}
+    self.cache_status_dict.update(cache_status_dict)
+
 # TODO for v.1.00: rewrite this to use a more generic function that takes a config object as an argument in addition to the (optional) instance and function/method
 # the input params for config_obj and instance should be separate, and only config_obj should be required
 # it should return only the result and the cache status, and the last_saved_cache_file should be set as an attribute on the config object
 # as it is not, it has become messy, as the origin of the decorator was to be used on a method.
 
-def execute_with_cache(func, args, kwargs, config=None):
+def execute_with_cache(func, args, kwargs, config=None, lazy_load=False):
     """
     Executes a function with caching based on the provided configuration. 
     This is meant to be used on a function, rather than a method.
@@ -116,6 +161,7 @@ def execute_with_cache(func, args, kwargs, config=None):
         args: The positional arguments to be passed to the function.
         kwargs: The keyword arguments to be passed to the function.
         config: The configuration object that determines how caching is handled.
+        lazy_load: On a cache hit, return a LazyCachedResult that is only unpickled when used (default: False).
 
     Returns:
         The result of the function execution.
@@ -126,24 +172,28 @@ def execute_with_cache(func, args, kwargs, config=None):
     if config is not None:
         # check if cache_enabled is defined in the config
         if hasattr(config, "cache_enabled"):
-            result, cache_status_dict = execute_with_instance_and_cache(None, func, args, kwargs, config=config)
-            if not hasattr(config, "cache_status_dict"):
-                config.cache_status_dict = {}
-            config.cache_status_dict.update(cache_status_dict)
-
-            # TODO: Gotta find a better way of doing this, as these properties are duplicates of what is set in the wrapper function, and I don't like dupliation!
-            # I'm sure there's a simple solution, but I don't have time to find it now.
-            type(config).cache_status = FormattedCacheStatusProperty()
-            type(config).last_saved_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file"))
-            type(config).last_saved_cache_file_key = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file_key"))
-            
+            result, cache_status_dict = execute_with_instance_and_cache(None, func, args, kwargs, config=config, lazy_load=lazy_load)
+            _update_config_cache_status(config, cache_status_dict)
             return result
         else:
             raise ValueError("cache_enabled is not in the config -- is this a config object?")
     else:
         raise ValueError("config is required when using the execute_with_cache function")
 
-def execute_with_instance_and_cache(instance, func, args, kwargs, config=None):
+def _update_config_cache_status(config, cache_status_dict):
+    """store the cache status on the config object, and attach the same properties as the @cache_to_disk wrapper does"""
+    if not hasattr(config, "cache_status_dict"):
+        config.cache_status_dict = {}
+    config.cache_status_dict.update(cache_status_dict)
+
+    # TODO: Gotta find a better way of doing this, as these properties are duplicates of what is set in the wrapper function, and I don't like dupliation!
+    # I'm sure there's a simple solution, but I don't have time to find it now.
+    type(config).cache_status = FormattedCacheStatusProperty()
+    type(config).last_saved_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file"))
+    type(config).last_saved_cache_file_key = PropertyFactory(lambda self: self.cache_status_dict.get("last_saved_cache_file_key"))
+    type(config).last_loaded_cache_file = PropertyFactory(lambda self: self.cache_status_dict.get("last_loaded_cache_file"))
+
+def execute_with_instance_and_cache(instance, func, args, kwargs, config=None, cache_key_attrs=None, lazy_load=False):
     """
     Execute the function and cache the result to disk.
 
@@ -153,10 +203,45 @@ def execute_with_instance_and_cache(instance, func, args, kwargs, config=None):
     args (tuple): The positional arguments to be passed to the function.
     kwargs (dict): The keyword arguments to be passed to the function.
     config (object, optional): The configuration object that determines the caching behavior. Defaults to None. If not provided, the cache_enabled attribute must be set on the instance.
+    cache_key_attrs (list, optional): Names of the instance attributes to include in the cache key. Defaults to None, which uses instance.__cache_key__() if defined, otherwise repr(instance).
+    lazy_load (bool, optional): On a cache hit, return a LazyCachedResult that is only unpickled when used. Defaults to False.
 
     Returns:
     tuple: A tuple containing the result of the function execution, the path of the last saved cache file, and the cache status dictionary.
     """
+    config, cache_status_dict, cache_status_dict_key = _prepare_cache_call(instance, func, args, kwargs, config, cache_key_attrs)
+    cache_log = cache_status_dict[cache_status_dict_key]
+
+    # If cache is disabled, call the function and return the result
+    # when mocking requests, the cache is disabled
+    # this is done in handle_request() in main.py
+    if not config.cache_enabled:
+        cache_log.append("cache_disabled")
+        cache_log.append("method_called")
+        return execute_func(func, instance, *args, **kwargs), cache_status_dict
+
+    if inspect.isgeneratorfunction(func):
+        return _execute_stream_with_cache(config, cache_status_dict, cache_status_dict_key, func, instance, args, kwargs), cache_status_dict
+
+    found, result = _lookup_cache(config, cache_status_dict, cache_status_dict_key, lazy_load=lazy_load,
+                                  fallback=lambda: execute_func(func, instance, *args, **kwargs))
+    if found:
+        return result, cache_status_dict
+    
+    # call the function - this will happen if the cache_expiration is not set or the cache file doesn't exist or is expired
+    result = execute_func(func, instance, *args, **kwargs)
+    cache_log.append("method_called")
+
+    _store_in_cache(config, cache_status_dict, cache_status_dict_key, result)
+    return result, cache_status_dict
+
+def _prepare_cache_call(instance, func, args, kwargs, config, cache_key_attrs):
+    """
+    validate the config and make the cache key and an empty cache status for a call
+
+    Returns:
+    tuple: (config, cache_status_dict, cache_status_dict_key)
+    """
     if config is None:
         config = instance
 
@@ -171,98 +256,313 @@ def execute_with_instance_and_cache(instance, func, args, kwargs, config=None):
             config_class_name = config.__class__.__name__
             raise AttributeError(f"{config_class_name} does not have the attribute '{attr}', required by the @cache_to_disk decorator.")
 
-    arg_hash = make_arg_hash(args, kwargs, supplemental_hash_info=repr(instance))
+    arg_hash = make_arg_hash(args, kwargs, supplemental_hash_info=instance_hash_info(instance, cache_key_attrs))
 
     cache_status_dict = {}
 
-    cache_status_dict_key = f"{inspect.getmodule(func).__name__}.{func.__qualname__}.{arg_hash}"
-    # remove invalid characters from the key (as it's also used as a filename)
-    cache_status_dict_key = re.sub(r'[<>:"/\\|?*]', '', cache_status_dict_key)
-    # Note: for a function defined inside another function, __qualname__ may look like this: 'test_execute_with_instance_and_cache_disabled.<locals>.test_func'
-    # it is therefore crucial to remove the invalid characters from the key, as it is used as a filename
+    cache_status_dict_key = _make_cache_key(inspect.getmodule(func).__name__, func.__qualname__, arg_hash)
 
     cache_status_dict[cache_status_dict_key] = []
     cache_status_dict["last_saved_cache_file"] = None
     cache_status_dict["last_saved_cache_file_key"] = None
+    cache_status_dict["last_loaded_cache_file"] = None
+    return config, cache_status_dict, cache_status_dict_key
+
+def _cache_locations(config, cache_status_dict_key):
+    """
+    the result can be cached in cache_dir, on a remote cache server (cache_backend), or both (cache_near_cache)
+
+    Returns:
+    tuple: (filepath, backend) - filepath is None if cache_dir isn't used, backend is None if there's no cache server
+    """
+    backend = getattr(config, "cache_backend", None)
+    if backend is not None and not getattr(config, "cache_near_cache", False):
+        return None, backend
 
-    # If cache is disabled, call the function and return the result
-    # when mocking requests, the cache is disabled
-    # this is done in handle_request() in main.py
-    if not config.cache_enabled:
-        cache_status_dict[cache_status_dict_key].append("cache_disabled")
-        cache_status_dict[cache_status_dict_key].append("method_called")
-        return execute_func(func, instance, *args, **kwargs), cache_status_dict
-    
     # Create cache directory if it doesn't exist
     if not os.path.exists(config.cache_dir):
         os.makedirs(config.cache_dir)
     
     # Create a unique filename based on the class name, method name and arguments
     filename = f"{cache_status_dict_key}.pkl"
-    filepath = os.path.join(config.cache_dir, filename)
+    return os.path.join(config.cache_dir, filename), backend
+
+def _lookup_cache(config, cache_status_dict, cache_status_dict_key, lazy_load=False, fallback=None):
+    """
+    Try to load the result from the cache, if the config allows it.
+    With lazy_load, a result in cache_dir is returned as a LazyCachedResult, which uses fallback to compute the result
+    if the cache file can't be loaded after all.
+
+    Returns:
+    tuple: (found, result)
+    """
+    cache_log = cache_status_dict[cache_status_dict_key]
+    if not _should_read_from_cache(config, cache_log):
+        return False, None
+    filepath, backend = _cache_locations(config, cache_status_dict_key)
+    found, result = False, None
+    if filepath is not None:
+        found, result = _read_from_cache(config, filepath, cache_log, lazy_load=lazy_load, fallback=fallback)
+        if found:
+            cache_status_dict["last_loaded_cache_file"] = filepath
+    if not found and backend is not None:
+        found, result, cache_time = _read_from_backend(config, backend, cache_status_dict_key, cache_log)
+        if found and filepath is not None:
+            # keep a copy in the near cache, with the original cache time so it expires at the same time
+            _write_to_cache(config, filepath, result, cache_log, cache_time=cache_time)
+    return found, result
+
+def _store_in_cache(config, cache_status_dict, cache_status_dict_key, result):
+    """save the result to the cache, if the config allows it"""
+    # If cache is enabled for the model (or cache is forced to expire), save the result to the cache
+    if config.cache_expiration is None and not config.force_cache_expiration:
+        return
+    cache_log = cache_status_dict[cache_status_dict_key]
+    filepath, backend = _cache_locations(config, cache_status_dict_key)
+    cache_time = time.time()
+    if filepath is not None:
+        _write_to_cache(config, filepath, result, cache_log, cache_time=cache_time)
+        cache_status_dict["last_saved_cache_file"] = filepath
+    if backend is not None:
+        _write_to_backend(config, backend, cache_status_dict_key, result, cache_time, cache_log)
+    cache_status_dict["last_saved_cache_file_key"] = cache_status_dict_key
 
+def _make_cache_key(module_name, qualname, arg_hash):
+    """make the key used in cache_status_dict, which is also the name of the cache file (without .pkl)"""
+    cache_status_dict_key = f"{module_name}.{qualname}.{arg_hash}"
+    # remove invalid characters from the key (as it's also used as a filename)
+    # Note: for a function defined inside another function, __qualname__ may look like this: 'test_execute_with_instance_and_cache_disabled.<locals>.test_func'
+    # it is therefore crucial to remove the invalid characters from the key, as it is used as a filename
+    return re.sub(r'[<>:"/\\|?*]', '', cache_status_dict_key)
+
+def _should_read_from_cache(config, cache_log):
+    """decide, based on the config, whether an existing cache file may be used, and log the decision"""
     read_from_cache = False
     if config.ignore_cache_expiration:
         if config.force_cache_expiration:
-            cache_status_dict[cache_status_dict_key].append("ignore_cache_expiration and force_cache_expiration are both True - force_cache_expiration takes precedence")
+            cache_log.append("ignore_cache_expiration and force_cache_expiration are both True - force_cache_expiration takes precedence")
         else:
-            cache_status_dict[cache_status_dict_key].append("cache_expiration_ignored")
+            cache_log.append("cache_expiration_ignored")
             read_from_cache = True
 
     if config.force_cache_expiration:
-        cache_status_dict[cache_status_dict_key].append("cache_expiration_forced")
+        cache_log.append("cache_expiration_forced")
         read_from_cache = False
     else:
         if config.cache_expiration is not None:
-            cache_status_dict[cache_status_dict_key].append(f"cache_expiration_set: {config.cache_expiration}s")
+            cache_log.append(f"cache_expiration_set: {config.cache_expiration}s")
             read_from_cache = True
         else:
-            cache_status_dict[cache_status_dict_key].append("cache_expiration_not_set")
+            cache_log.append("cache_expiration_not_set")
             read_from_cache = False
-        
-    if read_from_cache:
-        if not os.path.exists(filepath):
-            cache_status_dict[cache_status_dict_key].append("cache_file_does_not_exist")
-        else:
-            cache_status_dict[cache_status_dict_key].append("cache_file_exists")
-            with open(filepath, 'rb') as f:
-                try:
-                    cache_time, result = pickle.load(f)
-                    time_since_cache = time.time() - cache_time
-                    skip_cache_file = False
-                except EOFError:
-                    cache_status_dict[cache_status_dict_key].append("cache_file_corrupted")
-                    skip_cache_file = True
-                if not skip_cache_file:
-                    if config.ignore_cache_expiration \
-                    or time_since_cache < config.cache_expiration:
-                        cache_status_dict[cache_status_dict_key].append("cache_loaded")
-                        return result, cache_status_dict
-                    else:
-                        if time_since_cache < 10:
-                            time_since_cache_formatted = f"{time_since_cache:.3f}s"
-                        # the following lines are not covered by tests, as it is not possible to mock time.time()
-                        elif time_since_cache < 60:                                         #  pragma: no cover
-                            time_since_cache_formatted = f"{time_since_cache:.1f}s"         #  pragma: no cover
-                        elif time_since_cache < 3600:                                       #  pragma: no cover
-                            time_since_cache_formatted = f"{time_since_cache/60:.1f}m"      #  pragma: no cover
-                        else:                                                               #  pragma: no cover
-                            time_since_cache_formatted = f"{time_since_cache/3600:.1f}h"    #  pragma: no cover
-                        cache_status_dict[cache_status_dict_key].append(f"cache_expired: {time_since_cache_formatted} passed")
-    
-    # call the function - this will happen if the cache_expiration is not set or the cache file doesn't exist or is expired
-    result = execute_func(func, instance, *args, **kwargs)
-    cache_status_dict[cache_status_dict_key].append("method_called")
+    return read_from_cache
 
-    # If cache is enabled for the model (or cache is forced to expire), save the result to the cache
-    if config.cache_expiration is not None or config.force_cache_expiration:
+def _format_time_since_cache(time_since_cache):
+    if time_since_cache < 10:
+        return f"{time_since_cache:.3f}s"
+    # the following lines are not covered by tests, as it is not possible to mock time.time()
+    elif time_since_cache < 60:                                         #  pragma: no cover
+        return f"{time_since_cache:.1f}s"                               #  pragma: no cover
+    elif time_since_cache < 3600:                                       #  pragma: no cover
+        return f"{time_since_cache/60:.1f}m"                            #  pragma: no cover
+    else:                                                               #  pragma: no cover
+        return f"{time_since_cache/3600:.1f}h"                          #  pragma: no cover
+
+def _is_fresh(config, cache_time, cache_log):
+    """check if a cache entry saved at cache_time can still be used, and log it if it has expired"""
+    time_since_cache = time.time() - cache_time
+    if config.ignore_cache_expiration \
+    or time_since_cache < config.cache_expiration:
+        return True
+    cache_log.append(f"cache_expired: {_format_time_since_cache(time_since_cache)} passed")
+    return False
+
+def _read_cache_file(config, filepath):
+    """
+    read a cache file and return (cache_time, result)
+    if the cache file is a pointer record (see content_addressed_storage.py), the result is loaded from the content-addressed store
+    raises EOFError if the file, or the payload it points to, is missing or corrupted
+    """
+    with open(filepath, 'rb') as f:
+        cache_time, result = pickle.load(f)
+    if isinstance(result, ContentPointer):
+        try:
+            result = load_payload(config.cache_dir, result)
+        except FileNotFoundError:
+            raise EOFError(f"the payload {result.digest} referenced by {filepath} does not exist")
+    return cache_time, result
+
+def _load_result(config, filepath):
+    """load the result of a cache file (used by LazyCachedResult) - raises EOFError if the file doesn't hold a result"""
+    _cache_time, result = _read_cache_file(config, filepath)
+    if isinstance(result, CachedStream):
+        raise EOFError(f"{filepath} holds a cached stream")
+    return result
+
+def _read_from_cache(config, filepath, cache_log, expect_stream=False, lazy_load=False, fallback=None):
+    """
+    Try to load a result from the cache file.
+    For a cached stream (see _execute_stream_with_cache), only the header is read, and the result is the CachedStream header.
+    With lazy_load, only the cache time is read, and the result is a LazyCachedResult.
+
+    Returns:
+    tuple: (found, result) - found is True if the cache file exists, is readable and has not expired
+    """
+    if not os.path.exists(filepath):
+        cache_log.append("cache_file_does_not_exist")
+        return False, None
+    cache_log.append("cache_file_exists")
+    if lazy_load and not expect_stream:
+        cache_time = peek_cache_time(filepath)
+        if cache_time is not None: # otherwise it's not a file we can peek into, so load it the normal way
+            if not _is_fresh(config, cache_time, cache_log):
+                return False, None
+            cache_log.append("cache_loaded_lazily")
+            return True, LazyCachedResult(lambda: _load_result(config, filepath), fallback, cache_file=filepath)
+    try:
+        cache_time, result = _read_cache_file(config, filepath)
+    except EOFError:
+        cache_log.append("cache_file_corrupted")
+        return False, None
+    if isinstance(result, CachedStream) != expect_stream:
+        # the function has changed between a generator function and a regular function since the cache file was saved
+        cache_log.append("cache_file_type_mismatch")
+        return False, None
+    if _is_fresh(config, cache_time, cache_log):
+        cache_log.append("cache_loaded")
+        return True, result
+    return False, None
+
+def _write_to_cache(config, filepath, result, cache_log, cache_time=None):
+    """
+    save the result to the cache file
+    if cache_deduplicate is True on the config, the result is stored once per unique content,
+    and the cache file only contains a pointer to it (see content_addressed_storage.py)
+    """
+    if cache_time is None:
+        cache_time = time.time()
+    if getattr(config, "cache_deduplicate", False):
+        _digest, payload_reused = save_deduplicated(config.cache_dir, filepath, cache_time, result)
+        if payload_reused:
+            cache_log.append("cache_payload_reused")
+    else:
+        # the file may be a pointer record written with cache_deduplicate enabled, so release the payload it refers to
+        release_cache_file(config.cache_dir, filepath)
         with open(filepath, 'wb') as f:
-            pickle.dump((time.time(), result), f)
-            cache_status_dict[cache_status_dict_key].append("cache_saved")
-        cache_status_dict["last_saved_cache_file"] = filepath
-        cache_status_dict["last_saved_cache_file_key"] = cache_status_dict_key
-    
-    return result, cache_status_dict
+            pickle.dump((cache_time, result), f)
+    cache_log.append("cache_saved")
+
+class CachedStream:
+    """
+    Header of a cache file holding the items produced by a generator function.
+    The file contains the pickled header (cache_time, CachedStream()), followed by one pickle per item,
+    so the items can be replayed one at a time, without loading the whole file.
+    """
+    def __repr__(self):
+        return "CachedStream()"
+
+def _execute_stream_with_cache(config, cache_status_dict, cache_status_dict_key, func, instance, args, kwargs):
+    """
+    Cache the items produced by a generator function in cache_dir (cache_deduplicate and cache_backend are not used for streams).
+
+    On a cache hit, the items are replayed lazily from the cache file, so memory use doesn't depend on the size of the stream.
+    On a cache miss, the items are written to a temporary file while they are consumed, and the file only replaces
+    the cache file when the generator has been consumed completely - a partially consumed stream is never saved.
+
+    Returns:
+    generator: the generator to return to the caller
+    """
+    cache_log = cache_status_dict[cache_status_dict_key]
+    if not os.path.exists(config.cache_dir):
+        os.makedirs(config.cache_dir)
+    filepath = os.path.join(config.cache_dir, f"{cache_status_dict_key}.pkl")
+
+    if _should_read_from_cache(config, cache_log):
+        found, _header = _read_from_cache(config, filepath, cache_log, expect_stream=True)
+        if found:
+            return _replay_stream(filepath)
+
+    generator = execute_func(func, instance, *args, **kwargs)
+    cache_log.append("method_called")
+    if config.cache_expiration is None and not config.force_cache_expiration:
+        return generator
+    # last_saved_cache_file is only set when the stream has been consumed completely, and the file is really saved
+    return _record_stream(generator, config, filepath, cache_status_dict, cache_status_dict_key)
+
+def _replay_stream(filepath):
+    with open(filepath, 'rb') as f:
+        pickle.load(f) # skip the header
+        while True:
+            try:
+                item = pickle.load(f)
+            except EOFError:
+                return
+            yield item
+
+def _record_stream(generator, config, filepath, cache_status_dict, cache_status_dict_key):
+    cache_log = cache_status_dict[cache_status_dict_key]
+    tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.partial"
+    completed = False
+    try:
+        with open(tmp_filepath, 'wb') as f:
+            pickle.dump((time.time(), CachedStream()), f)
+            for item in generator:
+                pickle.dump(item, f)
+                yield item
+        completed = True
+    finally:
+        if completed:
+            release_cache_file(config.cache_dir, filepath) # the file may be a pointer record written with cache_deduplicate enabled
+            os.replace(tmp_filepath, filepath)
+            # the status of this call has already been copied to config.cache_status_dict (by the wrapper) when the stream is consumed
+            for status_dict in (cache_status_dict, getattr(config, "cache_status_dict", cache_status_dict)):
+                status_dict["last_saved_cache_file"] = filepath
+                status_dict["last_saved_cache_file_key"] = cache_status_dict_key
+            cache_log.append("cache_saved")
+        else:
+            # the stream was not consumed completely (or the generator raised an exception), so it must not be saved
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            cache_log.append("stream_incomplete_not_saved")
+
+def _read_from_backend(config, backend, key, cache_log):
+    """
+    Try to load a result from the remote cache (see cache_server.py).
+    If the cache server can't be reached or returns an error (RemoteCacheError is an OSError), this is logged and treated as a cache miss.
+
+    Returns:
+    tuple: (found, result, cache_time)
+    """
+    try:
+        value = backend.get(key)
+    except OSError as e:
+        cache_log.append(f"remote_cache_error: {e}")
+        return False, None, None
+    if value is None:
+        cache_log.append("remote_cache_miss")
+        return False, None, None
+    try:
+        cache_time, result = pickle.loads(value)
+    except (EOFError, pickle.UnpicklingError):
+        cache_log.append("remote_cache_corrupted")
+        return False, None, None
+    if _is_fresh(config, cache_time, cache_log):
+        cache_log.append("remote_cache_loaded")
+        return True, result, cache_time
+    return False, None, None
+
+def _write_to_backend(config, backend, key, result, cache_time, cache_log):
+    """
+    save the result to the remote cache - the server expires it after cache_backend_ttl (default: cache_expiration) seconds
+    If the cache server can't be reached or returns an error, this is logged and the result is just not shared.
+    """
+    ttl = getattr(config, "cache_backend_ttl", config.cache_expiration)
+    try:
+        backend.set(key, pickle.dumps((cache_time, result)), ttl=ttl)
+    except OSError as e:
+        cache_log.append(f"remote_cache_error: {e}")
+        return
+    cache_log.append("remote_cache_saved")
 
 def execute_func(func, instance, *args, **kwargs):
     if instance is not None:
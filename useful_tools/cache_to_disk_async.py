@@ -0,0 +1,120 @@
+# identical to useful_tools/cache_to_disk.py, but for coroutine functions and methods (async def), for use in an async context, such as in FastAPI
+# the awaited result is cached (not the coroutine object), and reading and writing cache files happens in a thread,
+# so the event loop is not blocked by file I/O
+# concurrent calls with the same cache key share a single call, instead of all missing the cache and all calling the function
+
+import asyncio
+from functools import wraps
+from useful_tools.cache_to_disk import (
+    _prepare_cache_call, _lookup_cache, _store_in_cache,
+    _attach_cache_status_properties, _update_instance_cache_status, _update_config_cache_status,
+)
+
+# futures of calls in progress, by (event loop, cache key)
+_in_flight = {}
+
+def cache_to_disk(func=None, *, cache_key_attrs=None):
+    """
+@cache_to_disk decorator for async methods - see useful_tools.cache_to_disk.cache_to_disk for the configuration attributes
+(useful_tools.cache_to_disk.cache_to_disk uses this automatically when it is applied to an async method)
+
+from useful_tools.cache_to_disk_async import cache_to_disk
+class MyClass:
+    cache_enabled = True
+    cache_dir = "cache"
+    cache_expiration = 30 # seconds
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    @cache_to_disk
+    async def my_method(self, item_id):
+        return await fetch_item(item_id)
+
+myclass = MyClass()
+await myclass.my_method(1) # calls fetch_item
+await myclass.my_method(1) # loaded from the cache
+print(myclass.cache_status_dict) # gives info about the use of cache in the previous call
+    """
+    if func is None:
+        # the decorator was called with arguments: @cache_to_disk(cache_key_attrs=[...])
+        return lambda func: cache_to_disk(func, cache_key_attrs=cache_key_attrs)
+
+    if isinstance(func, property):
+        raise TypeError(f"Cannot cache a property. Apply @property above @cache_to_disk, not below.")
+    if not asyncio.iscoroutinefunction(func):
+        raise TypeError(f"{func.__qualname__} is not an async function - use useful_tools.cache_to_disk.cache_to_disk instead.")
+
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        _attach_cache_status_properties(self)
+        result, cache_status_dict = await execute_with_instance_and_cache(self, func, args, kwargs, cache_key_attrs=cache_key_attrs)
+        _update_instance_cache_status(self, cache_status_dict)
+        return result
+
+    return wrapper
+
+async def execute_with_cache(func, args, kwargs, config=None):
+    """
+    Executes an async function with caching based on the provided configuration.
+    See useful_tools.cache_to_disk.execute_with_cache
+    """
+    if config is None:
+        raise ValueError("config is required when using the execute_with_cache function")
+    if not hasattr(config, "cache_enabled"):
+        raise ValueError("cache_enabled is not in the config -- is this a config object?")
+    result, cache_status_dict = await execute_with_instance_and_cache(None, func, args, kwargs, config=config)
+    _update_config_cache_status(config, cache_status_dict)
+    return result
+
+async def _execute_func(func, instance, *args, **kwargs):
+    if instance is not None:
+        return await func(instance, *args, **kwargs)
+    else:
+        return await func(*args, **kwargs)
+
+async def execute_with_instance_and_cache(instance, func, args, kwargs, config=None, cache_key_attrs=None):
+    """
+    Await the function and cache the result to disk - see useful_tools.cache_to_disk.execute_with_instance_and_cache
+
+    If a call with the same cache key is already in progress on this event loop, its result is shared
+    instead of calling the function again. The cache status of such a call only contains "in_flight_call_awaited".
+
+    Returns:
+    tuple: (result, cache_status_dict)
+    """
+    config, cache_status_dict, cache_status_dict_key = _prepare_cache_call(instance, func, args, kwargs, config, cache_key_attrs)
+    cache_log = cache_status_dict[cache_status_dict_key]
+
+    if not config.cache_enabled:
+        cache_log.append("cache_disabled")
+        cache_log.append("method_called")
+        return await _execute_func(func, instance, *args, **kwargs), cache_status_dict
+
+    in_flight_key = (asyncio.get_running_loop(), cache_status_dict_key)
+    in_flight_future = _in_flight.get(in_flight_key)
+    if in_flight_future is not None:
+        cache_log.append("in_flight_call_awaited")
+        # shield the shared future, so cancelling this caller doesn't cancel the call for everyone else
+        return await asyncio.shield(in_flight_future), cache_status_dict
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[in_flight_key] = future
+    try:
+        found, result = await asyncio.to_thread(_lookup_cache, config, cache_status_dict, cache_status_dict_key)
+        if not found:
+            # call the function - this will happen if the cache_expiration is not set or the cache file doesn't exist or is expired
+            result = await _execute_func(func, instance, *args, **kwargs)
+            cache_log.append("method_called")
+            await asyncio.to_thread(_store_in_cache, config, cache_status_dict, cache_status_dict_key, result)
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception() # mark the exception as retrieved, so asyncio doesn't warn about it if no one else awaited it
+        raise
+    else:
+        future.set_result(result)
+    finally:
+        del _in_flight[in_flight_key]
+    return result, cache_status_dict
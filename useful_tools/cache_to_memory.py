@@ -1,28 +1,504 @@
-from functools import wraps
-from useful_tools.hash_functions import make_arg_hash
+import os
+import sys
+import time
+import atexit
+import pickle
+import asyncio
+import heapq
+import inspect
+import weakref
+import itertools
+import threading
+from types import MemberDescriptorType
+from collections import OrderedDict, deque, namedtuple
+from functools import wraps, update_wrapper
+from useful_tools.hash_functions import make_arg_hash, make_fast_arg_key, instance_hash_info
+from useful_tools._internal import InFlightCall, write_atomically
 
 
 # decorators to cache the result of a function to memory
 # this is used in order to avoid sending the same request multiple times
-# cache_property works only for properties, while cache_to_memory works for any method
+# cache_property works only for properties (and is the fastest way to cache them), while cache_to_memory works for any method
 
-def cache_property(func):
+class cache_property:
     """
-Legacy decorator to cache the result of a property to memory. You can now use the @cache_to_memory decorator instead, as long as you define the property decorator before the cache_to_memory decorator, like this:
-@property
-@cache_to_memory
-def my_property(self):
-    return "my_property"
+Decorator to cache the value of a property, computed on first access, like functools.cached_property:
+
+class MyClass:
+    @cache_property
+    def my_property(self):
+        return "my_property"
+
+The value is written into the instance __dict__ under the name of the property. As cache_property is a non-data descriptor
+(it has no __set__), later reads find it there, and are a plain attribute lookup, without calling any Python code.
+For classes with __slots__ (and no __dict__), add a slot named after the property with a leading underscore, which is used instead:
+
+class MySlottedClass:
+    __slots__ = ("_my_property",)
+
+    @cache_property
+    def my_property(self):
+        return "my_property"
+
+MyClass.my_property.invalidate(obj) forgets the cached value, so the next access computes it again.
+
+It can still be used below @property, as before (@property @cache_property) - the value is then stored as _my_property,
+but every access goes through the property, so it is slower. (The same goes for @property @cache_to_memory.)
     """
-    @wraps(func)
-    def wrapper(self):
-        attr_name = f"_{func.__name__}"
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, func(self))
-        return getattr(self, attr_name)
-    return wrapper
 
-def cache_to_memory(func):
+    def __init__(self, func):
+        self.func = func
+        self.attr_name = func.__name__
+        self.slot = None # the member descriptor of the slot for the value, for classes with __slots__
+        update_wrapper(self, func)
+
+    def __set_name__(self, owner, name):
+        self.attr_name = name
+        slot = getattr(owner, self.slot_name, None)
+        if isinstance(slot, MemberDescriptorType):
+            self.slot = slot
+
+    @property
+    def slot_name(self):
+        return f"_{self.attr_name}"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.slot is not None:
+            try:
+                return self.slot.__get__(instance, owner)
+            except AttributeError: # not computed yet
+                value = self.func(instance)
+                self.slot.__set__(instance, value)
+                return value
+        try:
+            instance_dict = instance.__dict__
+        except AttributeError: # __slots__ without __dict__
+            return self._get_from_slot(instance)
+        # only called when the value isn't in the instance __dict__ yet, as that takes precedence over a non-data descriptor
+        value = instance_dict[self.attr_name] = self.func(instance)
+        return value
+
+    def _get_from_slot(self, instance):
+        try:
+            return getattr(instance, self.slot_name)
+        except AttributeError:
+            pass
+        value = self.func(instance)
+        try:
+            setattr(instance, self.slot_name, value)
+        except AttributeError:
+            raise TypeError(
+                f"Cannot cache {type(instance).__name__}.{self.attr_name}: the class has no __dict__ - add {self.slot_name!r} to its __slots__"
+            ) from None
+        return value
+
+    def __call__(self, instance):
+        # legacy use below @property: the property calls this on every access
+        try:
+            return getattr(instance, self.slot_name)
+        except AttributeError:
+            value = self.func(instance)
+            setattr(instance, self.slot_name, value)
+            return value
+
+    def invalidate(self, instance):
+        """forget the cached value of an instance, so it's computed again on the next access"""
+        instance_dict = getattr(instance, "__dict__", {})
+        instance_dict.pop(self.attr_name, None)
+        try:
+            delattr(instance, self.slot_name)
+        except AttributeError:
+            pass
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+_MISSING = object()
+
+def _deep_sizeof(obj):
+    """the size of an object and everything it refers to (containers, attributes), each object counted once"""
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, complex, bool)) or obj is None:
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                stack.append(getattr(obj, slot))
+    return size
+
+def _pickled_size(obj):
+    """the length of the pickled object - results that can't be pickled are measured with _deep_sizeof instead"""
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return _deep_sizeof(obj)
+
+# functions estimating the memory used by a cached result, selected with cache_to_memory(size_estimator=...)
+SIZE_ESTIMATORS = {
+    "shallow": sys.getsizeof, # fast, but doesn't include the items of containers or the attributes of objects
+    "deep": _deep_sizeof,
+    "pickle": _pickled_size,
+}
+
+# all memory caches in the process, for memory_cache_usage()
+_all_memory_caches = weakref.WeakSet()
+
+def memory_cache_usage():
+    """
+    the memory held by all caches of @cache_to_memory in this process, as estimated by their size_estimator
+    returns a dict with the number of caches, the number of cached results (entries) and their estimated size (bytes)
+    """
+    caches = list(_all_memory_caches)
+    usage = {"caches": len(caches), "entries": 0, "bytes": 0}
+    for cache in caches:
+        with cache._lock:
+            usage["entries"] += len(cache._entries)
+            usage["bytes"] += cache.current_bytes
+    return usage
+
+# locks protecting the calls in progress (_MemoryCache._in_flight) - a key uses the lock at hash(key) % 64,
+# so threads working on different keys rarely wait for each other, without needing a lock per key
+# the locks are only held to look up and register calls, never while a result is computed
+_stripe_locks = [threading.Lock() for _ in range(64)]
+
+class _ByteBudget:
+    """
+    The max_bytes of a function decorated with @cache_to_memory, shared by all its caches (a method has one per instance),
+    so the results of all instances together stay within max_bytes.
+    The caches sharing a budget also share its lock, so a cache can evict results of the others.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.lock = threading.RLock() # reentrant, as the garbage collector can clear the cache of an instance while it is held
+        self.caches = weakref.WeakSet()
+
+class _MemoryCache:
+    """
+    The cached results of one function decorated with @cache_to_memory.
+
+    Args:
+        maxsize (int, optional): maximum number of results to keep (default: no limit)
+        ttl (float, optional): number of seconds a result is kept (default: forever)
+        policy (str): which result to evict when the cache is full - "lru" (least recently used), "lfu" (least frequently used)
+            or "largest" (the result using the most memory)
+        max_bytes (int, optional): maximum estimated size of all results together (default: no limit)
+        size_estimator (str or callable): how the size of a result is estimated - "shallow", "deep", "pickle" (see SIZE_ESTIMATORS)
+            or a function returning the size of a result in bytes
+        byte_budget (_ByteBudget, optional): max_bytes shared with other caches, instead of a max_bytes of its own
+    """
+
+    def __init__(self, maxsize=None, ttl=None, policy="lru", max_bytes=None, size_estimator="shallow", byte_budget=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.estimate_size = SIZE_ESTIMATORS.get(size_estimator, size_estimator)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> [result, expiration time (or None), number of hits, estimated size], ordered from least to most recently used
+        self._entries = OrderedDict()
+        # for policy="lfu": number of hits -> the keys with that number of hits, least recently used first,
+        # so the result to evict is found without looking at all the results
+        self._keys_by_use_count = {}
+        self._min_use_count = None # the lowest number of hits, None when it must be looked up again
+        # (expiration time, insertion number, key) of the results with an expiration time, soonest first, so expired results
+        # are removed when results are added, even if they are never looked up again - entries of replaced results are skipped
+        self._expirations = []
+        self._insertion_numbers = itertools.count() # so the keys themselves are never compared
+        self._budget = byte_budget
+        if byte_budget is None:
+            self._lock = threading.Lock()
+        else:
+            self.max_bytes = byte_budget.max_bytes
+            self._lock = byte_budget.lock
+            byte_budget.caches.add(self)
+        # calls in progress, by key, so concurrent calls with the same key wait for the result instead of computing it again
+        self._in_flight = {}
+        # the same for coroutine functions: futures of calls in progress, by (event loop, key)
+        self._in_flight_futures = {}
+        _all_memory_caches.add(self)
+
+    def get(self, key):
+        """return the cached result, or _MISSING"""
+        if self.maxsize is None and self.ttl is None and self.max_bytes is None:
+            # nothing is ever evicted or reordered, so no lock is needed: reading a dict is atomic
+            # (the hits and misses counters may miss an update when threads race, which is fine for statistics)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self.hits += 1
+            return entry[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key) # expired
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self.hits += 1
+            if self.policy == "lfu":
+                self._count_hit(key, entry[2])
+            entry[2] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _peek(self, key):
+        """return the cached result without counting a hit or a miss, or _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+                return _MISSING
+            return entry[0]
+
+    def get_or_compute(self, key, compute):
+        """
+        return the cached result, or call compute() and cache its result
+        only one thread computes the result of a key: threads asking for the same key in the meantime wait for it,
+        and get the same result (or exception)
+        """
+        result = self.get(key)
+        if result is not _MISSING:
+            return result
+
+        stripe_lock = _stripe_locks[hash(key) % len(_stripe_locks)]
+        with stripe_lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                # the thread that computed it may have finished since get()
+                result = self._peek(key)
+                if result is not _MISSING:
+                    return result
+                call = self._in_flight[key] = InFlightCall()
+
+        if not is_leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = compute()
+            self.set(key, call.result)
+            return call.result
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with stripe_lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    async def get_or_compute_async(self, key, compute):
+        """
+        return the cached result, or await compute() and cache its result
+        coroutines asking for the same key in the meantime (on the same event loop) share one future, so compute() is awaited once
+        a failed call is not cached, and its future is forgotten, so the next call tries again
+        """
+        result = self.get(key)
+        if result is not _MISSING:
+            return result
+
+        loop = asyncio.get_running_loop()
+        in_flight_key = (loop, key)
+        future = self._in_flight_futures.get(in_flight_key)
+        if future is not None:
+            # shield the shared future, so cancelling this caller doesn't cancel the call for everyone else
+            return await asyncio.shield(future)
+
+        future = self._in_flight_futures[in_flight_key] = loop.create_future()
+        try:
+            result = await compute()
+            self.set(key, result)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception() # mark the exception as retrieved, so asyncio doesn't warn about it if no one else awaited it
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._in_flight_futures[in_flight_key]
+        return result
+
+    def set(self, key, result):
+        expiration_time = None if self.ttl is None else time.monotonic() + self.ttl
+        self._set(key, result, expiration_time)
+
+    def _set(self, key, result, expiration_time, use_count=0):
+        if self.maxsize == 0:
+            return
+        size = self.estimate_size(result) # estimated outside the lock, as it can be slow for big results
+        if self.max_bytes is not None and size > self.max_bytes:
+            return # it would never fit
+        with self._lock:
+            self._remove_expired()
+            entry = self._remove(key)
+            if entry is not None:
+                use_count = entry[2]
+            while True:
+                if self._entries and self.maxsize is not None and len(self._entries) >= self.maxsize:
+                    self._evict()
+                elif self.max_bytes is not None and self._bytes_in_use() + size > self.max_bytes:
+                    cache = self._cache_to_evict_from()
+                    if cache is None:
+                        break
+                    cache._evict()
+                else:
+                    break
+            self._entries[key] = [result, expiration_time, use_count, size]
+            self._add_bytes(size)
+            if expiration_time is not None:
+                heapq.heappush(self._expirations, (expiration_time, next(self._insertion_numbers), key))
+                if len(self._expirations) > 2 * len(self._entries) + 64:
+                    # mostly entries of results that were replaced or evicted since, so build it again from the results
+                    self._expirations = [
+                        (entry[1], next(self._insertion_numbers), entry_key) for entry_key, entry in self._entries.items() if entry[1] is not None
+                    ]
+                    heapq.heapify(self._expirations)
+            if self.policy == "lfu":
+                self._add_use_count(key, use_count)
+
+    def _remove_expired(self):
+        """remove the results that have expired (called with the lock held)"""
+        expirations = self._expirations
+        if not expirations:
+            return
+        now = time.monotonic()
+        while expirations and expirations[0][0] <= now:
+            expiration_time, _insertion_number, key = heapq.heappop(expirations)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expiration_time: # not replaced by a newer result since
+                self._remove(key)
+
+    def _add_bytes(self, size):
+        self.current_bytes += size
+        if self._budget is not None:
+            self._budget.current_bytes += size
+
+    def _bytes_in_use(self):
+        """the bytes counted against max_bytes - of all the caches sharing the budget, if there is one"""
+        return self.current_bytes if self._budget is None else self._budget.current_bytes
+
+    def _cache_to_evict_from(self):
+        """
+        this cache, or if it is empty, the cache using the most bytes of those sharing the budget (None if they are all empty)
+        results are evicted from this cache first, so the policy decides which of its own results goes, as without a budget
+        """
+        if self._entries or self._budget is None:
+            return self if self._entries else None
+        return max((cache for cache in self._budget.caches if cache._entries), key=lambda cache: cache.current_bytes, default=None)
+
+    def _remove(self, key):
+        """remove a result and return its entry, or None (called with the lock held)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._add_bytes(-entry[3])
+            if self.policy == "lfu":
+                self._remove_use_count(key, entry[2])
+        return entry
+
+    # the lfu bookkeeping (called with the lock held): a key moves to the next bucket on every hit, to the end,
+    # so within a bucket the keys are ordered from least to most recently used, like _entries
+
+    def _add_use_count(self, key, use_count):
+        keys = self._keys_by_use_count.get(use_count)
+        if keys is None:
+            keys = self._keys_by_use_count[use_count] = OrderedDict()
+        keys[key] = None
+        # new results have 0 hits, which is always the lowest
+        if use_count == 0 or len(self._keys_by_use_count) == 1 or (self._min_use_count is not None and use_count < self._min_use_count):
+            self._min_use_count = use_count
+
+    def _remove_use_count(self, key, use_count):
+        keys = self._keys_by_use_count[use_count]
+        del keys[key]
+        if not keys:
+            del self._keys_by_use_count[use_count]
+            if use_count == self._min_use_count:
+                self._min_use_count = None
+
+    def _count_hit(self, key, use_count):
+        was_lowest = use_count == self._min_use_count
+        self._remove_use_count(key, use_count)
+        if was_lowest and self._min_use_count is None:
+            self._min_use_count = use_count + 1 # the key was the last one with the lowest number of hits
+        self._add_use_count(key, use_count + 1)
+
+    def _evict(self):
+        """remove one result to make room for a new one (called with the lock held)"""
+        if not self._entries:
+            return # cleared in the meantime, because its instance was garbage collected
+        if self.policy == "lru":
+            key = next(iter(self._entries))
+        elif self.policy == "lfu":
+            # least frequently used - on a tie, the least recently used of them, as it is first in its bucket
+            if self._min_use_count is None:
+                # only after the last results with the lowest number of hits expired or were replaced
+                self._min_use_count = min(self._keys_by_use_count)
+            key = next(iter(self._keys_by_use_count[self._min_use_count]))
+        else:
+            key = max(self._entries, key=lambda key: self._entries[key][3])
+        self._remove(key)
+
+    def snapshot(self):
+        """the results that haven't expired, as (key, result, expiration time, number of hits), from least to most recently used
+        the expiration times are wall-clock times (time.time()), so they can be restored in another process"""
+        now_monotonic, now = time.monotonic(), time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        return [
+            (key, result, None if expiration_time is None else now + (expiration_time - now_monotonic), use_count)
+            for key, (result, expiration_time, use_count, _size) in entries
+            if expiration_time is None or expiration_time > now_monotonic
+        ]
+
+    def restore(self, entries):
+        """add the results of a snapshot, skipping those that have expired since"""
+        now_monotonic, now = time.monotonic(), time.time()
+        for key, result, expiration_time, use_count in entries:
+            if expiration_time is not None and expiration_time <= now:
+                continue
+            self._set(key, result, None if expiration_time is None else now_monotonic + (expiration_time - now), use_count)
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expirations.clear()
+            self._keys_by_use_count.clear()
+            self._min_use_count = None
+            self._add_bytes(-self.current_bytes)
+            self.hits = 0
+            self.misses = 0
+
+def cache_to_memory(func=None, *, maxsize=None, ttl=None, policy="lru", max_bytes=None, size_estimator="shallow", backend=None,
+                    snapshot_file=None, snapshot_interval=None):
     """
 @cache_to_memory decorator to cache the result of a method to memory
 If used in conjunction with @property, the property decorator must be defined before the cache_to_memory decorator, like this:
@@ -40,18 +516,352 @@ class MyClass:
 my_object = MyClass()
 print(my_object.my_property) # should show that my_property was called 1 time
 print(my_object.my_property) # should show that my_property was called 1 time again, because it was cached
+
+By default every result is kept forever. To limit the memory used, give the decorator a size limit and/or an expiration time:
+
+@cache_to_memory(maxsize=1000, ttl=60, policy="lru") # policy is "lru" (least recently used, default) or "lfu" (least frequently used)
+def my_method(self, item_id):
+    ...
+
+Expired results are removed when they are looked up, and when new results are added, so they don't pile up without a maxsize.
+
+It is thread safe: if several threads call it with the same arguments at the same time, the function is only called once,
+and the other threads wait for its result.
+
+On async functions (async def), the awaited result is cached. Concurrent calls with the same arguments share a single call.
+
+Like functools.lru_cache, the wrapper has cache_info() (hits, misses, maxsize, currsize) and cache_clear().
+
+To limit the memory used instead of the number of results, give it a budget in bytes:
+
+@cache_to_memory(max_bytes=100_000_000, size_estimator="deep", policy="largest")
+def my_method(self, item_id):
+    ...
+
+size_estimator is "shallow" (sys.getsizeof, fast, default), "deep" (follows containers and attributes), "pickle" (the pickled length),
+or a function returning the size of a result. policy="largest" evicts the biggest results first.
+memory_cache_usage() reports the estimated memory held by all caches in the process.
+
+To share the results between processes (like the workers of a web server), keep them in shared memory:
+
+from useful_tools.shared_memory_cache import SharedMemoryCache
+@cache_to_memory(backend=SharedMemoryCache("my_reference_data", size=512 * 1024 * 1024))
+def load_table(self, name):
+    ...
+
+With a backend, the instance is part of the cache key (as in cache_to_disk), and the results are not freed with the instance.
+The key must be the same in every process, so the class of a cached method must define __cache_key__() (or a __repr__() without
+memory addresses) - with the default repr, calling the method raises a TypeError.
+
+To keep the cached results when the process restarts, save them to a snapshot file:
+
+@cache_to_memory(ttl=3600, snapshot_file="cache/my_method.snapshot", snapshot_interval=300)
+def my_method(self, item_id):
+    ...
+
+The snapshot is loaded on the first call, and saved when the process exits and every snapshot_interval seconds (if given),
+or when my_method.save_snapshot() is called. Results keep their expiration time. As with a backend, the instance is part of the cache key,
+so the class of a method must define __cache_key__() (or __repr__()), or the results could never be found after a restart.
+
+The results of a method (a function whose first parameter is named self) are kept per instance, and are freed when the instance is garbage collected.
+maxsize applies to the results of each instance, and max_bytes to the results of all instances together.
     """
+    if policy not in ("lru", "lfu", "largest"):
+        raise ValueError(f"Unknown eviction policy {policy!r}, use 'lru', 'lfu' or 'largest'")
+    if size_estimator not in SIZE_ESTIMATORS and not callable(size_estimator):
+        raise ValueError(f"Unknown size estimator {size_estimator!r}, use {', '.join(map(repr, SIZE_ESTIMATORS))} or a function")
+    if maxsize is not None and maxsize < 0:
+        raise ValueError("maxsize must be None or a positive number")
+    if backend is not None and (maxsize is not None or max_bytes is not None):
+        raise ValueError("maxsize and max_bytes can't be used with a backend - the size of the backend is set when it is created")
+    if backend is not None and snapshot_file is not None:
+        raise ValueError("snapshot_file can't be used with a backend")
+    if snapshot_interval is not None and snapshot_file is None:
+        raise ValueError("snapshot_interval requires a snapshot_file")
+    if func is None:
+        # the decorator was called with arguments: @cache_to_memory(maxsize=...)
+        return lambda func: cache_to_memory(
+            func, maxsize=maxsize, ttl=ttl, policy=policy, max_bytes=max_bytes, size_estimator=size_estimator, backend=backend,
+            snapshot_file=snapshot_file, snapshot_interval=snapshot_interval,
+        )
+
     if isinstance(func, property):
         raise TypeError(f"Cannot cache a property. Apply @property above @cache_to_memory, not below.")
     
-    cache = {}
+    caches = _FunctionCaches(
+        func, dict(maxsize=maxsize, ttl=ttl, policy=policy, max_bytes=max_bytes, size_estimator=size_estimator),
+        backend, snapshot_file, snapshot_interval,
+    )
+
+    if inspect.isgeneratorfunction(func):
+        # cache the items produced by the generator, not the generator object (which can only be consumed once)
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            cache, key = caches.cache_for(args, kwargs)
+            items = cache.get(key)
+            if items is not _MISSING:
+                return (item for item in items)
+            return _record_items(func(*args, **kwargs), cache, key)
+        generator_wrapper.cache_info = caches.info
+        generator_wrapper.cache_clear = caches.clear
+        generator_wrapper.save_snapshot = caches.save_snapshot
+        return generator_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        # cache the awaited result, not the coroutine object (which can only be awaited once)
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            cache, key = caches.cache_for(args, kwargs)
+            return await cache.get_or_compute_async(key, lambda: func(*args, **kwargs))
+        async_wrapper.cache_info = caches.info
+        async_wrapper.cache_clear = caches.clear
+        async_wrapper.save_snapshot = caches.save_snapshot
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        attr_name = func.__name__
-        arg_hash = make_arg_hash(args, kwargs)
-        if attr_name not in cache:
-            cache[attr_name] = {}
-        if arg_hash not in cache[attr_name]:
-            cache[attr_name][arg_hash] = func(*args, **kwargs)
-        return cache[attr_name][arg_hash]
+        cache, key = caches.cache_for(args, kwargs)
+        return cache.get_or_compute(key, lambda: func(*args, **kwargs))
+    wrapper.cache_info = caches.info
+    wrapper.cache_clear = caches.clear
+    wrapper.save_snapshot = caches.save_snapshot
     return wrapper
+
+# the caches of methods, per instance, so they are freed together with the instance:
+# id(instance) -> (weak reference to the instance, {method __qualname__: _MemoryCache})
+# the instance is not used as a key itself (as in a WeakKeyDictionary), as that would give equal instances the same cache,
+# and wouldn't work for unhashable instances (like dataclasses)
+_instance_caches = {}
+_instance_caches_lock = threading.RLock() # reentrant, as _forget_instance can be called by the garbage collector while the lock is held
+
+def _caches_of_instance(instance):
+    """the {qualname: _MemoryCache} dict of an instance, or None if the instance can't be weakly referenced (__slots__ without __weakref__)"""
+    instance_id = id(instance)
+    entry = _instance_caches.get(instance_id)
+    if entry is not None and entry[0]() is instance:
+        return entry[1]
+    with _instance_caches_lock:
+        entry = _instance_caches.get(instance_id)
+        if entry is None or entry[0]() is not instance:
+            try:
+                instance_ref = weakref.ref(instance, lambda instance_ref: _forget_instance(instance_id, instance_ref))
+            except TypeError:
+                return None
+            entry = _instance_caches[instance_id] = (instance_ref, {})
+        return entry[1]
+
+def _forget_instance(instance_id, instance_ref):
+    """called when an instance is garbage collected"""
+    with _instance_caches_lock:
+        entry = _instance_caches.get(instance_id)
+        if entry is None or entry[0] is not instance_ref:
+            return
+        del _instance_caches[instance_id]
+    # clear the caches (outside _instance_caches_lock, which is taken before cache locks), so their bytes no longer count against a shared max_bytes
+    for cache in entry[1].values():
+        cache.clear()
+
+class _BackendCache(_MemoryCache):
+    """
+    A _MemoryCache keeping its results in a backend shared with other processes (see shared_memory_cache.SharedMemoryCache)
+    instead of in this process. Concurrent calls in this process are still made only once, by get_or_compute.
+    """
+
+    def __init__(self, backend, ttl=None):
+        super().__init__(ttl=ttl)
+        self.backend = backend
+
+    def get(self, key):
+        result = self.backend.get(key, _MISSING)
+        if result is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _peek(self, key):
+        return self.backend.get(key, _MISSING)
+
+    def set(self, key, result):
+        self.backend.set(key, result, ttl=self.ttl)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, None, len(self.backend))
+
+    def clear(self):
+        """clear the backend - for all functions (and processes) using it"""
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+class _FunctionCaches:
+    """
+    The caches of one function decorated with @cache_to_memory.
+    Functions have a single cache. Methods (functions whose first parameter is named self) have a cache per instance,
+    which is freed when the instance is garbage collected, and self is not part of the cache key.
+    Instances that can't be weakly referenced share a single cache, with self as part of the key (they are kept alive by the cache).
+    With a backend or a snapshot file, all calls use a single cache, with keys that are the same in every process.
+    """
+
+    def __init__(self, func, cache_options, backend=None, snapshot_file=None, snapshot_interval=None):
+        self.cache_options = cache_options # the arguments of each _MemoryCache
+        self.qualname = func.__qualname__
+        self.module_name = func.__module__
+        parameters = list(inspect.signature(func).parameters)
+        self.is_method = bool(parameters) and parameters[0] == "self"
+        self.backend = backend
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_loaded = False
+        self._snapshot_lock = threading.Lock()
+        # for methods, max_bytes applies to the results of all instances together
+        self.byte_budget = None if cache_options["max_bytes"] is None else _ByteBudget(cache_options["max_bytes"])
+        if backend is None:
+            self.shared_cache = _MemoryCache(**cache_options, byte_budget=self.byte_budget)
+        else:
+            self.shared_cache = _BackendCache(backend, cache_options["ttl"])
+
+    def cache_for(self, args, kwargs):
+        """the cache to use for a call, and the key of the call in that cache"""
+        if self.snapshot_file is not None and not self._snapshot_loaded:
+            self.load_snapshot()
+        if self.backend is not None or self.snapshot_file is not None:
+            # the key must be the same in all processes, so the instance is represented by its state, as in cache_to_disk
+            if self.is_method and args:
+                arg_hash = make_arg_hash(args[1:], kwargs, supplemental_hash_info=self._stable_instance_key(args[0]))
+            else:
+                arg_hash = make_arg_hash(args, kwargs)
+            return self.shared_cache, f"{self.module_name}.{self.qualname}:{arg_hash}"
+        if self.is_method and args:
+            caches = _caches_of_instance(args[0])
+            if caches is not None:
+                cache = caches.get(self.qualname)
+                if cache is None:
+                    cache = caches.setdefault(self.qualname, _MemoryCache(**self.cache_options, byte_budget=self.byte_budget))
+                return cache, _make_key(args[1:], kwargs)
+        return self.shared_cache, _make_key(args, kwargs)
+
+    def _stable_instance_key(self, instance):
+        """
+        the state of the instance, for keys that are the same in every process (and after a restart)
+        the default repr contains the memory address of the instance, so the class must define __cache_key__() or __repr__()
+        """
+        cls = type(instance)
+        if getattr(cls, "__cache_key__", None) is None and cls.__repr__ is object.__repr__:
+            where = "a backend" if self.backend is not None else "a snapshot_file"
+            raise TypeError(
+                f"{self.qualname} is cached with {where}, so its cache keys must be the same in every process, but {cls.__name__} "
+                f"has the default repr, which contains the memory address of the instance - define __cache_key__() (or __repr__()) on it"
+            )
+        return instance_hash_info(instance)
+
+    def load_snapshot(self):
+        """
+        load the snapshot file (once), and from then on save it at exit and every snapshot_interval seconds
+        it's not loaded when the module is imported, but on the first call, so importing stays fast
+        """
+        with self._snapshot_lock:
+            if self._snapshot_loaded:
+                return
+            _load_snapshot(self.shared_cache, self.snapshot_file)
+            self._snapshot_loaded = True
+        # the snapshot is only saved once it has been loaded, so results of earlier runs aren't overwritten by an empty cache
+        atexit.register(self.save_snapshot)
+        if self.snapshot_interval is not None:
+            threading.Thread(target=self._save_periodically, name=f"snapshot of {self.qualname}", daemon=True).start()
+
+    def save_snapshot(self):
+        """save the cached results to the snapshot file"""
+        if self.snapshot_file is None:
+            raise ValueError(f"{self.qualname} has no snapshot_file")
+        if not self._snapshot_loaded:
+            self.load_snapshot() # so the results of the previous snapshot are kept
+        _save_snapshot(self.shared_cache, self.snapshot_file)
+
+    def _save_periodically(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.save_snapshot()
+
+    def _all_caches(self):
+        caches = [self.shared_cache]
+        if self.backend is not None or self.snapshot_file is not None:
+            return caches
+        with _instance_caches_lock:
+            for _instance_ref, instance_caches in _instance_caches.values():
+                if self.qualname in instance_caches:
+                    caches.append(instance_caches[self.qualname])
+        return caches
+
+    def info(self):
+        """
+        the totals of all caches - for methods, maxsize is the maximum size of the cache of each instance
+        with a backend, currsize is the number of results in the backend (of all functions using it)
+        """
+        infos = [cache.info() for cache in self._all_caches()]
+        return CacheInfo(sum(info.hits for info in infos), sum(info.misses for info in infos), self.cache_options["maxsize"], sum(info.currsize for info in infos))
+
+    def clear(self):
+        for cache in self._all_caches():
+            cache.clear()
+
+# identifies snapshot files, and the version of their layout - snapshots with another version are ignored
+SNAPSHOT_FORMAT = "useful_tools.cache_to_memory snapshot"
+SNAPSHOT_VERSION = 1
+
+def _is_picklable(obj):
+    try:
+        pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
+
+def _save_snapshot(cache, snapshot_file):
+    """save the results of a _MemoryCache to a file - results that can't be pickled are left out"""
+    snapshot = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "saved_at": time.time(), "entries": cache.snapshot()}
+    try:
+        data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        snapshot["entries"] = [entry for entry in snapshot["entries"] if _is_picklable(entry)]
+        data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    snapshot_dir = os.path.dirname(snapshot_file)
+    if snapshot_dir:
+        os.makedirs(snapshot_dir, exist_ok=True)
+    write_atomically(snapshot_file, data) # so a crash while saving doesn't destroy the previous snapshot
+
+def _load_snapshot(cache, snapshot_file):
+    """
+    add the results saved in a snapshot file to a _MemoryCache, and return the number of results in the snapshot
+    a missing, corrupt or outdated snapshot is ignored - the cache just starts empty
+    """
+    try:
+        with open(snapshot_file, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return 0
+    except Exception: # corrupt, or a result refers to a class that no longer exists
+        return 0
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("version") != SNAPSHOT_VERSION:
+        return 0
+    cache.restore(snapshot["entries"])
+    return len(snapshot["entries"])
+
+def _make_key(args, kwargs):
+    """
+    the key of the arguments in the cache
+    hashable arguments (the common case) use a flat tuple, which is much faster than hashing the arguments with make_arg_hash
+    make_arg_hash is only used for unhashable arguments, like lists and dicts
+    """
+    try:
+        return make_fast_arg_key(args, kwargs)
+    except TypeError:
+        return make_arg_hash(args, kwargs)
+
+def _record_items(generator, cache, key):
+    """pass on the items of the generator, and cache them once the generator has been consumed completely"""
+    items = []
+    for item in generator:
+        items.append(item)
+        yield item
+    # only reached when the generator is exhausted - a partially consumed stream is never cached
+    cache.set(key, tuple(items))
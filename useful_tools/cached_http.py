@@ -0,0 +1,222 @@
+"""
+Cached HTTP GET requests, built on the same cache configuration and cache files as @cache_to_disk.
+
+Unlike wrapping a GET request in @cache_to_disk, an expired response is not simply downloaded again:
+if the server sent an ETag or Last-Modified header, the request is sent with If-None-Match / If-Modified-Since,
+and if the server answers 304 Not Modified, the cached body is kept and its cache time refreshed,
+without transferring the body again.
+
+Connections are kept open and reused for later requests to the same host (keep-alive).
+
+Usage:
+```
+from useful_tools.cached_http import cached_http_get
+class Config:
+    cache_enabled = True
+    cache_dir = "cache"
+    cache_expiration = 300 # seconds before the response is revalidated with the server
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+config = Config()
+response = cached_http_get("https://example.com/data.json", config)
+response.status # 200
+response.json() # the parsed body
+print(config.cache_status) # shows if the response was loaded from the cache, revalidated or downloaded
+```
+"""
+
+import os
+import json
+import time
+import queue
+import http.client
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+from useful_tools.hash_functions import make_arg_hash
+from useful_tools.cache_to_disk import (
+    _make_cache_key, _should_read_from_cache, _is_fresh, _read_cache_file, _write_to_cache, _update_config_cache_status
+)
+
+@dataclass
+class CachedResponse:
+    """The parts of an HTTP response that are cached. Header names are lowercase."""
+    url: str
+    status: int
+    headers: dict = field(default_factory=dict)
+    body: bytes = b""
+
+    def text(self, encoding="utf-8"):
+        return self.body.decode(encoding)
+
+    def json(self):
+        return json.loads(self.body)
+
+class HTTPConnectionPool:
+    """
+    Keeps idle HTTP(S) connections open, per (scheme, host, port), so they can be reused (keep-alive).
+
+    Args:
+        max_idle_connections_per_host (int): number of idle connections to keep open for each host
+        timeout (float): socket timeout in seconds
+    """
+
+    def __init__(self, max_idle_connections_per_host=4, timeout=10.0):
+        self.max_idle_connections_per_host = max_idle_connections_per_host
+        self.timeout = timeout
+        self._idle_connections = {}
+
+    def _new_connection(self, scheme, host, port):
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        if scheme == "http":
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+        raise ValueError(f"Unsupported URL scheme: {scheme!r}")
+
+    def _release(self, pool_key, connection):
+        idle_connections = self._idle_connections.setdefault(pool_key, queue.LifoQueue(maxsize=self.max_idle_connections_per_host))
+        try:
+            idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, url, headers=None):
+        """
+        Send a request and read the whole response.
+
+        Returns:
+            tuple: (status, headers, body) - header names are lowercase
+        """
+        parts = urlsplit(url)
+        pool_key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = dict(headers or {})
+        headers.setdefault("Connection", "keep-alive")
+
+        try:
+            connection = self._idle_connections[pool_key].get_nowait()
+            reused = True
+        except (KeyError, queue.Empty):
+            connection = self._new_connection(parts.scheme, parts.hostname, parts.port)
+            reused = False
+
+        try:
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            connection.close()
+            if not reused:
+                raise
+            # the server closed the idle connection in the meantime - retry once on a new connection
+            connection = self._new_connection(parts.scheme, parts.hostname, parts.port)
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+        except BaseException:
+            connection.close()
+            raise
+
+        body = response.read()
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(pool_key, connection)
+        return response.status, response_headers, body
+
+    def close(self):
+        """close all idle connections"""
+        for idle_connections in self._idle_connections.values():
+            while True:
+                try:
+                    idle_connections.get_nowait().close()
+                except queue.Empty:
+                    break
+        self._idle_connections.clear()
+
+_default_pool = HTTPConnectionPool()
+
+def _conditional_headers(cached_response):
+    """the validators of a cached response, as request headers"""
+    headers = {}
+    if "etag" in cached_response.headers:
+        headers["If-None-Match"] = cached_response.headers["etag"]
+    if "last-modified" in cached_response.headers:
+        headers["If-Modified-Since"] = cached_response.headers["last-modified"]
+    return headers
+
+def cached_http_get(url, config, headers=None, pool=None):
+    """
+    Send a GET request, using the cache configured on config (the same attributes as used by @cache_to_disk).
+
+    Only responses with status 200 are cached. Fresh cached responses are returned without contacting the server.
+    Expired cached responses are revalidated with If-None-Match / If-Modified-Since, and a 304 response
+    refreshes the cache time of the cached response instead of downloading the body again.
+
+    Args:
+        url (str): the URL to get
+        config: object with cache_enabled, cache_dir, cache_expiration, force_cache_expiration and ignore_cache_expiration
+        headers (dict, optional): extra request headers - they are part of the cache key
+        pool (HTTPConnectionPool, optional): the connection pool to use (default: a pool shared by all calls)
+
+    Returns:
+        CachedResponse: the response (from the cache or the server)
+    """
+    pool = _default_pool if pool is None else pool
+    headers = dict(headers or {})
+
+    cache_status_dict_key = _make_cache_key(__name__, "cached_http_get", make_arg_hash((url,), headers))
+    cache_status_dict = {cache_status_dict_key: [], "last_saved_cache_file": None, "last_saved_cache_file_key": None}
+    cache_log = cache_status_dict[cache_status_dict_key]
+
+    if not config.cache_enabled:
+        cache_log.append("cache_disabled")
+        status, response_headers, body = pool.request("GET", url, headers)
+        cache_log.append("request_sent")
+        _update_config_cache_status(config, cache_status_dict)
+        return CachedResponse(url, status, response_headers, body)
+
+    if not os.path.exists(config.cache_dir):
+        os.makedirs(config.cache_dir)
+    filepath = os.path.join(config.cache_dir, f"{cache_status_dict_key}.pkl")
+
+    # a stale cached response is still useful, as its validators let the server answer 304 Not Modified
+    cached_response = None
+    if _should_read_from_cache(config, cache_log):
+        if not os.path.exists(filepath):
+            cache_log.append("cache_file_does_not_exist")
+        else:
+            cache_log.append("cache_file_exists")
+            try:
+                cache_time, cached_response = _read_cache_file(config, filepath)
+            except EOFError:
+                cache_log.append("cache_file_corrupted")
+            else:
+                if _is_fresh(config, cache_time, cache_log):
+                    cache_log.append("cache_loaded")
+                    _update_config_cache_status(config, cache_status_dict)
+                    return cached_response
+
+    request_headers = dict(headers)
+    if cached_response is not None:
+        request_headers.update(_conditional_headers(cached_response))
+    status, response_headers, body = pool.request("GET", url, request_headers)
+    cache_log.append("request_sent")
+
+    if status == 304 and cached_response is not None:
+        # the cached body is still valid - refresh its cache time, and any headers the server sent again
+        cache_log.append("cache_revalidated")
+        cached_response.headers.update({name: value for name, value in response_headers.items() if name not in ("content-length", "transfer-encoding")})
+        response = cached_response
+    else:
+        response = CachedResponse(url, status, response_headers, body)
+
+    can_be_saved = config.cache_expiration is not None or config.force_cache_expiration
+    if response.status == 200 and can_be_saved:
+        _write_to_cache(config, filepath, response, cache_log, cache_time=time.time())
+        cache_status_dict["last_saved_cache_file"] = filepath
+        cache_status_dict["last_saved_cache_file_key"] = cache_status_dict_key
+
+    _update_config_cache_status(config, cache_status_dict)
+    return response
@@ -0,0 +1,201 @@
+"""
+Content-addressed storage for the @cache_to_disk decorator.
+
+When cache_deduplicate is True on the config object, each cache file ({cache_status_dict_key}.pkl)
+no longer contains the result itself, but a small pointer record: (cache_time, ContentPointer(digest)).
+The pickled result is stored once in cache_dir/objects/{digest}.pkl, no matter how many argument
+combinations produce the same result, and cache_dir/objects/{digest}.refs holds the number of
+pointer files referring to it.
+
+When a pointer file is overwritten or deleted, the reference count of the payload it pointed to is
+decreased, and the payload is deleted when nothing refers to it anymore.
+collect_garbage() deletes expired pointer files, recounts all references from the pointer files
+that are left (repairing counts that drifted, for example if several processes wrote to the same
+cache_dir at the same time) and deletes payloads that are no longer referenced.
+The reference counts are updated while holding a FileLock (cache_dir/objects/refcounts.lock), shared by all processes.
+If a payload is missing when a result is saved again, it is stored again.
+
+Cache files written without cache_deduplicate are left untouched, so the two layouts can share a cache_dir.
+"""
+
+import os
+import time
+import pickle
+import hashlib
+from useful_tools.file_lock import FileLock
+from useful_tools._internal import write_atomically
+
+OBJECTS_DIR = "objects"
+
+class ContentPointer:
+    """Pointer record stored in a cache file instead of the result, when cache_deduplicate is enabled"""
+    __slots__ = ("digest",)
+
+    def __init__(self, digest):
+        self.digest = digest
+
+    def __eq__(self, other):
+        return isinstance(other, ContentPointer) and other.digest == self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f"ContentPointer('{self.digest}')"
+
+def _objects_dir(cache_dir):
+    return os.path.join(cache_dir, OBJECTS_DIR)
+
+def _payload_path(cache_dir, digest):
+    return os.path.join(_objects_dir(cache_dir), f"{digest}.pkl")
+
+def _refs_path(cache_dir, digest):
+    return os.path.join(_objects_dir(cache_dir), f"{digest}.refs")
+
+def _refcount_lock(cache_dir):
+    """
+    reference counts are read-modify-write operations on small files, shared by all processes using the cache_dir,
+    so they are serialized with a lock file in the objects dir (which must exist)
+    """
+    return FileLock(os.path.join(_objects_dir(cache_dir), "refcounts.lock"))
+
+def _read_refcount(cache_dir, digest):
+    try:
+        with open(_refs_path(cache_dir, digest), "r") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _delete_payload(cache_dir, digest):
+    for filepath in (_payload_path(cache_dir, digest), _refs_path(cache_dir, digest)):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+def _change_refcount(cache_dir, digest, delta):
+    """change the reference count of a payload, deleting the payload when the count drops to zero - call with _refcount_lock(cache_dir) held"""
+    refcount = max(_read_refcount(cache_dir, digest) + delta, 0)
+    if refcount == 0:
+        _delete_payload(cache_dir, digest)
+    else:
+        write_atomically(_refs_path(cache_dir, digest), str(refcount), mode="w")
+    return refcount
+
+def read_pointer(filepath):
+    """return the ContentPointer stored in a cache file, or None if the file does not exist or holds a result"""
+    try:
+        with open(filepath, "rb") as f:
+            _cache_time, content = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+        return None
+    return content if isinstance(content, ContentPointer) else None
+
+def release_cache_file(cache_dir, filepath):
+    """
+    Drop the reference a cache file holds on its payload (if it is a pointer file).
+    Call this before overwriting or deleting a cache file.
+    Returns the digest of the released payload, or None if the file was not a pointer file.
+    """
+    if not os.path.isdir(_objects_dir(cache_dir)):
+        return None # cache_deduplicate has never been used in this cache_dir, so there is nothing to release
+    pointer = read_pointer(filepath)
+    if pointer is None:
+        return None
+    with _refcount_lock(cache_dir):
+        _change_refcount(cache_dir, pointer.digest, -1)
+    return pointer.digest
+
+def save_deduplicated(cache_dir, filepath, cache_time, result):
+    """
+    Save result in the content-addressed store and write a pointer record to filepath.
+
+    Returns:
+        tuple: (digest, payload_reused) - payload_reused is True if an identical result was already stored
+    """
+    data = pickle.dumps(result)
+    digest = hashlib.sha256(data).hexdigest()
+    os.makedirs(_objects_dir(cache_dir), exist_ok=True)
+
+    pointer_record = pickle.dumps((cache_time, ContentPointer(digest)))
+
+    payload_path = _payload_path(cache_dir, digest)
+    with _refcount_lock(cache_dir):
+        # if the cache file already points to the same payload, there is nothing to do but refresh the timestamp
+        previous_pointer = read_pointer(filepath)
+        if previous_pointer is not None and previous_pointer.digest == digest:
+            payload_reused = os.path.exists(payload_path)
+            if not payload_reused:
+                # the payload was deleted while this pointer still referred to it (the counts drifted), so store it again
+                write_atomically(payload_path, data)
+                if _read_refcount(cache_dir, digest) == 0:
+                    _change_refcount(cache_dir, digest, +1)
+            write_atomically(filepath, pointer_record)
+            return digest, payload_reused
+
+        payload_reused = os.path.exists(payload_path)
+        if not payload_reused:
+            write_atomically(payload_path, data)
+        _change_refcount(cache_dir, digest, +1)
+        write_atomically(filepath, pointer_record)
+        if previous_pointer is not None:
+            _change_refcount(cache_dir, previous_pointer.digest, -1)
+    return digest, payload_reused
+
+def load_payload(cache_dir, pointer):
+    """load the result a ContentPointer refers to - raises FileNotFoundError if the payload has been deleted"""
+    with open(_payload_path(cache_dir, pointer.digest), "rb") as f:
+        return pickle.load(f)
+
+def collect_garbage(config, now=None):
+    """
+    Delete expired pointer files and unreferenced payloads from config.cache_dir.
+
+    Pointer files are considered expired using the same rule as @cache_to_disk: older than config.cache_expiration seconds.
+    If config.cache_expiration is None or config.ignore_cache_expiration is True, no pointer files are deleted,
+    but reference counts are still repaired and unreferenced payloads deleted.
+    Only pointer files are deleted - cache files holding a result directly are left alone.
+
+    Args:
+        config: object with the same cache attributes as used by @cache_to_disk (cache_dir, cache_expiration, ...)
+        now (float, optional): the current time, as returned by time.time() (default: time.time())
+
+    Returns:
+        dict: number of "expired_pointers_deleted", "payloads_deleted" and "payloads_kept"
+    """
+    cache_dir = config.cache_dir
+    now = time.time() if now is None else now
+    cache_expiration = getattr(config, "cache_expiration", None)
+    expiry_enabled = cache_expiration is not None and not getattr(config, "ignore_cache_expiration", False)
+    stats = {"expired_pointers_deleted": 0, "payloads_deleted": 0, "payloads_kept": 0}
+    if not os.path.isdir(_objects_dir(cache_dir)):
+        return stats
+
+    refcounts = {}
+    with _refcount_lock(cache_dir):
+        for filename in os.listdir(cache_dir):
+            filepath = os.path.join(cache_dir, filename)
+            if not filename.endswith(".pkl") or not os.path.isfile(filepath):
+                continue
+            try:
+                with open(filepath, "rb") as f:
+                    cache_time, content = pickle.load(f)
+            except Exception:
+                continue # not a cache file we can read, so it can't hold a reference either
+            if not isinstance(content, ContentPointer):
+                continue
+            if expiry_enabled and now - cache_time >= cache_expiration:
+                os.remove(filepath)
+                stats["expired_pointers_deleted"] += 1
+            else:
+                refcounts[content.digest] = refcounts.get(content.digest, 0) + 1
+
+        for filename in os.listdir(_objects_dir(cache_dir)):
+            if not filename.endswith(".pkl"):
+                continue
+            digest = filename[:-len(".pkl")]
+            if digest in refcounts:
+                write_atomically(_refs_path(cache_dir, digest), str(refcounts[digest]), mode="w")
+                stats["payloads_kept"] += 1
+            else:
+                _delete_payload(cache_dir, digest)
+                stats["payloads_deleted"] += 1
+    return stats
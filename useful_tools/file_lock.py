@@ -0,0 +1,81 @@
+"""
+A simple cross-process lock based on locking a file, used to protect state shared between processes
+(for example the state file of a rate limiter, or a shared memory cache).
+
+Usage:
+```
+from useful_tools.file_lock import FileLock
+lock = FileLock("my_state.lock")
+with lock:
+    # only one process (and one thread) at a time gets here
+    ...
+```
+"""
+
+import os
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None # windows
+    import msvcrt
+
+class FileLock:
+    """
+    Exclusive lock shared by all processes (and threads) using the same lock file.
+    The lock file is created if it doesn't exist, and is never deleted, as another process may be waiting for it.
+    The lock is reentrant within a thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock() # file locks are per process, so threads need their own lock
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth > 1:
+            return
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else: # pragma: no cover
+                while True:
+                    try:
+                        msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1) # raises OSError after trying for 10 seconds
+                        break
+                    except OSError:
+                        time.sleep(0.01)
+        except BaseException:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._depth -= 1
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else: # pragma: no cover
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -23,3 +23,38 @@ def make_arg_hash(args, kwargs, supplemental_hash_info=None):
     encoded_arg_str = f"{hashable_args}_{hashable_kwargs}_{hashable_supplemental_hash_info}".encode()
     sha256hash = hashlib.sha256(encoded_arg_str).hexdigest()
     return sha256hash
+
+_KWARGS_MARK = object() # separates the args from the kwargs in a fast key, so f(1, ("a", 2)) and f(1, a=2) get different keys
+
+def make_fast_arg_key(args, kwargs):
+    """
+    make a flat tuple of the arguments that can be used as a key in an in-memory cache, the way functools.lru_cache does
+    this is much faster than make_arg_hash, but only works if all the arguments are hashable - otherwise TypeError is raised
+    like make_arg_hash, the order of the kwargs doesn't matter
+    like make_arg_hash (and functools.lru_cache(typed=True)), arguments that are equal but of different types (1, 1.0 and True)
+    give different keys, as the type of each argument is part of the key - only the arguments themselves, not the items in them
+    """
+    if not kwargs:
+        key = args + tuple(map(type, args))
+    else:
+        items = tuple(kwargs.items()) if len(kwargs) == 1 else tuple(sorted(kwargs.items())) # nothing to sort if there's one
+        key = args + (_KWARGS_MARK,) + items + tuple(map(type, args)) + tuple([type(value) for _name, value in items])
+    hash(key) # raises TypeError if an argument is unhashable
+    return key
+
+def instance_hash_info(instance, cache_key_attrs=None):
+    """
+    return the part of the instance state that should be included in the cache key of a method
+    - if cache_key_attrs is given, only those attributes are used
+    - otherwise, if the instance defines __cache_key__(), its return value is used
+    - otherwise, repr(instance) is used - this may be slow for big objects, and the cache is never reused
+      across processes if the repr contains memory addresses (like the default object repr does)
+    """
+    if instance is None:
+        return repr(instance)
+    if cache_key_attrs is not None:
+        return tuple((attr, getattr(instance, attr)) for attr in cache_key_attrs)
+    cache_key = getattr(type(instance), "__cache_key__", None)
+    if cache_key is not None:
+        return cache_key(instance)
+    return repr(instance)
@@ -0,0 +1,257 @@
+"""
+Lazy-loading handle for results loaded from the cache by @cache_to_disk, used for methods decorated with @cache_to_disk(lazy_load=True).
+
+On a cache hit, only the cache time at the start of the cache file is read, to check if the result has expired.
+Instead of the result, a LazyCachedResult is returned right away, and the result is only unpickled from the cache file
+when it is actually used (an attribute is read, it is compared, iterated, printed, ...).
+This is useful for big cached results that are often only checked for existence, or rarely used in full.
+
+Usage:
+```
+class MyClass:
+    cache_enabled = True
+    cache_dir = "cache"
+    cache_expiration = 3600
+    force_cache_expiration = False
+    ignore_cache_expiration = False
+
+    @property
+    @cache_to_disk(lazy_load=True) # only this method returns lazily loaded results
+    def big_report(self):
+        return build_big_report()
+
+myclass = MyClass()
+report = myclass.big_report # on a cache hit, nothing has been unpickled yet
+report.is_loaded            # False
+report["summary"]           # the result is unpickled here
+report.unwrap()             # the result itself, for code that needs the real object
+```
+
+The proxy passes on attribute access, comparisons, hashing, the container protocols (len, iteration, in, indexing),
+calls, the arithmetic and bitwise operators (including the reflected and in-place forms), the unary operators,
+conversions (int(), float(), complex(), bytes(), round(), math.floor(), ...) and __index__, so it can be used as an index or in range().
+isinstance(report, dict) is True if the result is a dict, as __class__ is passed on too.
+
+What it can't do is pass as the real object where the exact type is checked: type(report) is LazyCachedResult,
+and C code that requires a real dict, list, str, ... (json.dumps(), str.join() of a proxy str, struct.pack(), ...) rejects it.
+Call unwrap() first in those cases. Pickling the proxy pickles the result.
+"""
+
+import io
+import math
+import operator
+import pickletools
+
+def peek_cache_time(filepath):
+    """
+    Read the cache time at the start of a cache file holding a pickled (cache_time, result) tuple, without unpickling the result.
+    Returns None if the file doesn't start with a float, so the caller can fall back to loading the whole file.
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(64) # enough for the protocol, frame and float opcodes of every pickle protocol
+    try:
+        for opcode, arg, _position in pickletools.genops(io.BytesIO(head)):
+            if opcode.name in ("PROTO", "FRAME", "MARK"):
+                continue
+            if opcode.name in ("BINFLOAT", "FLOAT"):
+                return arg
+            return None
+    except ValueError: # the head ended in the middle of an opcode
+        pass
+    return None
+
+_NOT_LOADED = object()
+
+class LazyCachedResult:
+    """
+    Proxy for a cached result that is loaded from the cache file on first use.
+
+    Args:
+        loader (callable): loads and returns the result
+        fallback (callable, optional): computes the result if the loader fails (for example if the cache file has been deleted since the cache hit)
+        cache_file (str, optional): the cache file the result is loaded from
+    """
+    __slots__ = ("_loader", "_fallback", "_result", "cache_file")
+
+    def __init__(self, loader, fallback=None, cache_file=None):
+        object.__setattr__(self, "_loader", loader)
+        object.__setattr__(self, "_fallback", fallback)
+        object.__setattr__(self, "_result", _NOT_LOADED)
+        object.__setattr__(self, "cache_file", cache_file)
+
+    @property
+    def is_loaded(self):
+        return self._result is not _NOT_LOADED
+
+    def unwrap(self):
+        """load (if needed) and return the cached result itself"""
+        if self._result is _NOT_LOADED:
+            try:
+                result = self._loader()
+            except (EOFError, FileNotFoundError):
+                if self._fallback is None:
+                    raise
+                result = self._fallback()
+            object.__setattr__(self, "_result", result)
+            # the loader and fallback hold references to the instance and arguments, which are no longer needed
+            object.__setattr__(self, "_loader", None)
+            object.__setattr__(self, "_fallback", None)
+        return self._result
+
+    @property
+    def __wrapped__(self):
+        return self.unwrap()
+
+    @property
+    def __class__(self):
+        # so isinstance(proxy, dict) is True for a dict result (isinstance(proxy, LazyCachedResult) is still True, as it checks type() first)
+        return type(self.unwrap())
+
+    # attribute access is passed on to the result
+    def __getattr__(self, name):
+        return getattr(self.unwrap(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.unwrap(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.unwrap(), name)
+
+    def __dir__(self):
+        return dir(self.unwrap())
+
+    # special methods are looked up on the class, so they have to be passed on one by one
+    def __repr__(self):
+        if not self.is_loaded:
+            return f"LazyCachedResult(not loaded, cache_file={self.cache_file!r})"
+        return repr(self._result)
+
+    def __str__(self):
+        return str(self.unwrap())
+
+    def __bool__(self):
+        return bool(self.unwrap())
+
+    def __len__(self):
+        return len(self.unwrap())
+
+    def __iter__(self):
+        return iter(self.unwrap())
+
+    def __contains__(self, item):
+        return item in self.unwrap()
+
+    def __getitem__(self, key):
+        return self.unwrap()[key]
+
+    def __setitem__(self, key, value):
+        self.unwrap()[key] = value
+
+    def __delitem__(self, key):
+        del self.unwrap()[key]
+
+    def __call__(self, *args, **kwargs):
+        return self.unwrap()(*args, **kwargs)
+
+    def __hash__(self):
+        return hash(self.unwrap())
+
+    def __eq__(self, other):
+        return self.unwrap() == other
+
+    def __ne__(self, other):
+        return self.unwrap() != other
+
+    def __lt__(self, other):
+        return self.unwrap() < other
+
+    def __le__(self, other):
+        return self.unwrap() <= other
+
+    def __gt__(self, other):
+        return self.unwrap() > other
+
+    def __ge__(self, other):
+        return self.unwrap() >= other
+
+    def __format__(self, format_spec):
+        return format(self.unwrap(), format_spec)
+
+    def __index__(self):
+        return operator.index(self.unwrap())
+
+    def __int__(self):
+        return int(self.unwrap())
+
+    def __float__(self):
+        return float(self.unwrap())
+
+    def __complex__(self):
+        return complex(self.unwrap())
+
+    def __bytes__(self):
+        return bytes(self.unwrap())
+
+    def __round__(self, ndigits=None):
+        return round(self.unwrap(), ndigits)
+
+    def __trunc__(self):
+        return math.trunc(self.unwrap())
+
+    def __floor__(self):
+        return math.floor(self.unwrap())
+
+    def __ceil__(self):
+        return math.ceil(self.unwrap())
+
+    def __reversed__(self):
+        return reversed(self.unwrap())
+
+    def __neg__(self):
+        return -self.unwrap()
+
+    def __pos__(self):
+        return +self.unwrap()
+
+    def __abs__(self):
+        return abs(self.unwrap())
+
+    def __invert__(self):
+        return ~self.unwrap()
+
+    def __divmod__(self, other):
+        return divmod(self.unwrap(), other)
+
+    def __rdivmod__(self, other):
+        return divmod(other, self.unwrap())
+
+    def __pow__(self, other, modulo=None):
+        return pow(self.unwrap(), other, modulo)
+
+    def __rpow__(self, other):
+        return pow(other, self.unwrap())
+
+    def __reduce_ex__(self, protocol):
+        # pickle the result, not the proxy (the loader can't be pickled) - it is unpickled as the result itself
+        return (_unpickle_result, (self.unwrap(),))
+
+def _unpickle_result(result):
+    return result
+
+# the binary operators are passed on with the operator module, so the usual rules apply to the result
+# (like trying the reflected method of the other operand when the result doesn't support the operation)
+# the in-place forms return the new value, which the name is bound to - a mutable result (like a list) is changed in place
+
+def _binary_operator(operation):
+    return lambda self, other: operation(self.unwrap(), other)
+
+def _reflected_operator(operation):
+    return lambda self, other: operation(other, self.unwrap())
+
+for _name in ("add", "sub", "mul", "matmul", "truediv", "floordiv", "mod", "lshift", "rshift", "and", "xor", "or"):
+    _operation = getattr(operator, f"{_name}_" if _name in ("and", "or") else _name)
+    setattr(LazyCachedResult, f"__{_name}__", _binary_operator(_operation))
+    setattr(LazyCachedResult, f"__r{_name}__", _reflected_operator(_operation))
+    setattr(LazyCachedResult, f"__i{_name}__", _binary_operator(getattr(operator, f"i{_name}")))
+setattr(LazyCachedResult, "__ipow__", _binary_operator(operator.ipow))
+del _name, _operation
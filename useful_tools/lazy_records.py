@@ -0,0 +1,237 @@
+"""
+Read-only, lazily loaded sequence of records, for @act_as_list(storage="lazy") - or on its own.
+
+The records stay on disk: in a JSONL file (one json record per line), or, for an iterator, in a temporary file
+the records are spooled to (pickled) as they are read from the iterator.
+The start of each record is kept in an offset index (8 bytes per record), which is built in one streaming pass,
+as far as it is needed: reading record 10 only indexes the first chunk, len() indexes the whole file (or reads the whole iterator).
+Iterating loads the records a chunk at a time, and only the last few chunks are kept in memory,
+so len(), records[i] and iterating over the records work with bounded memory, however big the file is.
+records[i] uses the chunk of record i if it is in memory, and otherwise only reads and decodes record i,
+so random reads don't decode a whole chunk for every record.
+
+Usage:
+```
+from useful_tools.lazy_records import LazyRecords
+
+records = LazyRecords.from_jsonl("export.jsonl", chunk_size=1000, max_chunks=8)
+len(records)      # the number of records (indexes the whole file once)
+records[123456]   # reads just that record
+for record in records: # streams through the file, a chunk at a time
+    ...
+records[10:20]    # a list of those records
+
+records = LazyRecords.from_iterable(fetch_all_pages()) # the records are read from the iterator when they are needed
+
+with LazyRecords.from_jsonl("export.jsonl") as records: # closes the file at the end
+    ...
+```
+The file is also closed when the LazyRecords is garbage collected (for example, when the @act_as_list object owning it is dropped).
+"""
+
+import io
+import os
+import json
+import array
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+class LazyRecords(Sequence):
+    """
+    Read-only sequence of the records in a file, loaded a chunk at a time - see the module docstring.
+    Use LazyRecords.from_jsonl() or LazyRecords.from_iterable() to create one.
+
+    Args:
+        file: binary file the records are read from
+        decode_block (callable): bytes of a number of whole records -> list of records
+        records (iterator, optional): records to spool to the end of file when more are needed (None if the file is complete)
+        chunk_size (int): number of records loaded at a time (default: 1000)
+        max_chunks (int): number of chunks kept in memory (default: 8)
+        name (str): shown in the repr
+    """
+
+    def __init__(self, file, decode_block, records=None, chunk_size=1000, max_chunks=8, name=""):
+        if chunk_size < 1 or max_chunks < 1:
+            file.close() # it was handed over to this instance
+            raise ValueError("chunk_size and max_chunks must be at least 1")
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.name = name
+        self._file = file
+        self._decode_block = decode_block
+        self._records = records
+        self._starts = array.array("q") # the position in the file where each record starts
+        self._end = 0 # the position in the file up to which the records are indexed
+        self._complete = False
+        self._chunks = OrderedDict() # chunk number -> list of records, least recently used first
+        self._lock = threading.RLock() # the file position is shared
+
+    @classmethod
+    def from_jsonl(cls, path, chunk_size=1000, max_chunks=8):
+        """the records of a JSONL file (empty lines are skipped) - the file is kept open, and must not be changed"""
+        return cls(open(path, "rb"), _decode_jsonl_block, chunk_size=chunk_size, max_chunks=max_chunks, name=os.fspath(path))
+
+    @classmethod
+    def from_iterable(cls, iterable, chunk_size=1000, max_chunks=8):
+        """the records of an iterable (or iterator), read from it when they are needed, and spooled to a temporary file"""
+        return cls(tempfile.TemporaryFile(), _decode_pickle_block, records=iter(iterable), chunk_size=chunk_size, max_chunks=max_chunks,
+                   name=type(iterable).__name__)
+
+    def close(self):
+        """close the file (a temporary file is deleted) - closing it again does nothing"""
+        self._file.close()
+        self._chunks.clear()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        file = getattr(self, "_file", None) # not set if __init__ raised
+        if file is not None:
+            file.close()
+
+    def _index_up_to(self, count):
+        """index the records until there are count of them (or all of them, if count is None), or the end is reached"""
+        with self._lock:
+            if self._complete or count is not None and len(self._starts) >= count:
+                return
+            if self._records is None:
+                self._index_file(count)
+            else:
+                self._spool_records(count)
+
+    def _index_file(self, count):
+        starts, position = self._starts, self._end
+        self._file.seek(position)
+        readline = self._file.readline
+        while count is None or len(starts) < count:
+            line = readline()
+            if not line:
+                self._complete = True
+                break
+            if line.strip():
+                starts.append(position)
+            position += len(line)
+        self._end = position
+
+    def _spool_records(self, count):
+        starts, position = self._starts, self._end
+        self._file.seek(position)
+        while count is None or len(starts) < count:
+            try:
+                record = next(self._records)
+            except StopIteration:
+                self._complete = True
+                self._records = None
+                break
+            data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.write(data)
+            starts.append(position)
+            position += len(data)
+        self._end = position
+
+    def _chunk(self, chunk_number):
+        """the records of a chunk (an empty list after the last record)"""
+        with self._lock:
+            chunk = self._chunks.get(chunk_number)
+            if chunk is not None:
+                self._chunks.move_to_end(chunk_number)
+                return chunk
+            first = chunk_number * self.chunk_size
+            self._index_up_to(first + self.chunk_size + 1) # + 1 to know where the last record of the chunk ends
+            starts = self._starts
+            if first >= len(starts):
+                return []
+            last = first + self.chunk_size
+            end = starts[last] if last < len(starts) else self._end
+            self._file.seek(starts[first])
+            chunk = self._decode_block(self._file.read(end - starts[first]))
+            self._chunks[chunk_number] = chunk
+            if len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+            return chunk
+
+    def __len__(self):
+        self._index_up_to(None)
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError("LazyRecords index out of range")
+        with self._lock:
+            chunk = self._chunks.get(index // self.chunk_size)
+            if chunk is not None:
+                return chunk[index % self.chunk_size]
+            self._index_up_to(index + 2) # and the record after it, to know where this one ends
+            starts = self._starts
+            if index >= len(starts):
+                raise IndexError("LazyRecords index out of range")
+            end = starts[index + 1] if index + 1 < len(starts) else self._end
+            self._file.seek(starts[index])
+            return self._decode_block(self._file.read(end - starts[index]))[0]
+
+    def __iter__(self):
+        chunk_number = 0
+        while True:
+            chunk = self._chunk(chunk_number)
+            if not chunk:
+                return
+            yield from chunk
+            chunk_number += 1
+
+    # `in`, index() and count() go through the records a chunk at a time, instead of one __getitem__ per record (the Sequence defaults)
+
+    def __contains__(self, value):
+        for record in self:
+            if record is value or record == value:
+                return True
+        return False
+
+    def index(self, value, start=0, stop=None):
+        if start < 0:
+            start = max(len(self) + start, 0)
+        if stop is not None and stop < 0:
+            stop += len(self)
+        chunk_number = start // self.chunk_size
+        position = chunk_number * self.chunk_size
+        while stop is None or position < stop:
+            chunk = self._chunk(chunk_number)
+            if not chunk:
+                break
+            for record in chunk:
+                if position >= start and (stop is None or position < stop) and (record is value or record == value):
+                    return position
+                position += 1
+            chunk_number += 1
+        raise ValueError(f"{value!r} is not in LazyRecords")
+
+    def count(self, value):
+        return sum(1 for record in self if record is value or record == value)
+
+    def __repr__(self):
+        count = f"{len(self._starts)} records" if self._complete else f"{len(self._starts)}+ records"
+        return f"LazyRecords({self.name!r}, {count})"
+
+def _decode_jsonl_block(block):
+    return [json.loads(line) for line in block.splitlines() if line.strip()]
+
+def _decode_pickle_block(block):
+    stream = io.BytesIO(block)
+    records = []
+    while stream.tell() < len(block):
+        records.append(pickle.load(stream))
+    return records
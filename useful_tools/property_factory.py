@@ -1,3 +1,6 @@
+import weakref
+import threading
+
 class PropertyFactory:
     """
     A descriptor class that creates properties dynamically.
@@ -51,4 +54,154 @@ my_instance = MyClass()
 my_instance.my_decorated_method()
 print(my_instance.my_property)
 This will print "Hello World" when my_decorated_method is called.
-"""
\ No newline at end of file
+"""
+
+# derived_property: a property that is cached, and recomputed only when an attribute it was computed from is assigned
+
+class _Reads(threading.local):
+    """
+    the attributes read by the derived properties being computed in this thread (one dict per property, innermost last)
+    each dict is {(id(obj), attribute name): obj} - keyed by id, as hashing obj may fail, read attributes itself, or merge equal objects
+    """
+    def __init__(self):
+        self.stack = []
+
+_reads = _Reads()
+
+# the derived properties computed from each attribute of each object:
+# id(obj) -> (weak reference to obj, {attribute name: {(id(dependent), property name): weak reference to dependent}})
+# objects are referenced by id, as they may be unhashable (or equal to other objects)
+_dependents = {}
+_dependents_lock = threading.RLock() # reentrant, as the garbage collector can call _forget_object while the lock is held
+
+def _forget_object(obj_id, obj_ref):
+    """called when an object with dependents is garbage collected"""
+    with _dependents_lock:
+        entry = _dependents.get(obj_id)
+        if entry is not None and entry[0] is obj_ref:
+            del _dependents[obj_id]
+
+def _add_dependent(obj, attr_name, dependent, property_name):
+    """record that the derived property of dependent was computed from obj.attr_name"""
+    with _dependents_lock:
+        entry = _dependents.get(id(obj))
+        if entry is None or entry[0]() is not obj:
+            obj_id = id(obj)
+            entry = _dependents[obj_id] = (weakref.ref(obj, lambda obj_ref: _forget_object(obj_id, obj_ref)), {})
+        entry[1].setdefault(attr_name, {})[(id(dependent), property_name)] = weakref.ref(dependent)
+
+def _invalidate(obj, attr_name):
+    """forget the derived properties computed from obj.attr_name, and the derived properties computed from those, and so on"""
+    stack = [(obj, attr_name)]
+    while stack:
+        obj, attr_name = stack.pop()
+        with _dependents_lock:
+            entry = _dependents.get(id(obj))
+            if entry is None or entry[0]() is not obj:
+                continue
+            dependents = entry[1].pop(attr_name, None)
+        for (_dependent_id, property_name), dependent_ref in (dependents or {}).items():
+            dependent = dependent_ref()
+            if dependent is None:
+                continue
+            dependent_dict = object.__getattribute__(dependent, "__dict__")
+            if dependent_dict.pop(property_name, _NOT_COMPUTED) is not _NOT_COMPUTED:
+                stack.append((dependent, property_name))
+
+_NOT_COMPUTED = object()
+
+def _install_hooks(cls):
+    """make cls record the attributes read while a derived property is computed, and invalidate derived properties when an attribute is assigned"""
+    if getattr(cls, "_derived_property_hooks", False):
+        return # already installed on cls or a base class
+    original_getattribute = cls.__getattribute__
+    original_setattr = cls.__setattr__
+    original_delattr = cls.__delattr__
+
+    def __getattribute__(self, name):
+        value = original_getattribute(self, name)
+        if _reads.stack and not name.startswith("__"):
+            _reads.stack[-1][(id(self), name)] = self
+        return value
+
+    def __setattr__(self, name, value):
+        original_setattr(self, name, value)
+        _invalidate(self, name)
+
+    def __delattr__(self, name):
+        original_delattr(self, name)
+        _invalidate(self, name)
+
+    cls.__getattribute__ = __getattribute__
+    cls.__setattr__ = __setattr__
+    cls.__delattr__ = __delattr__
+    cls._derived_property_hooks = True
+
+class derived_property:
+    """
+    A property that is computed on first access and cached, like cache_property, but that is recomputed
+    when an attribute it was computed from is assigned (or deleted).
+
+    While the getter runs, the attributes it reads are recorded - on its own instance, and on other instances of classes
+    with derived properties, including other derived properties. Assigning one of them forgets the cached value,
+    and the values of all derived properties that were computed from it, so only what depends on the change is recomputed.
+
+    Usage:
+    class Line:
+        def __init__(self, price, quantity):
+            self.price = price
+            self.quantity = quantity
+
+        @derived_property
+        def total(self):
+            return self.price * self.quantity
+
+    class Order:
+        def __init__(self, lines):
+            self.lines = lines
+
+        @derived_property
+        def total(self):
+            return sum(line.total for line in self.lines)
+
+    order = Order([Line(10, 2), Line(5, 1)])
+    order.total             # 25, computes both line totals and the order total
+    order.lines[1].price = 6
+    order.total             # 26, recomputes the total of the second line and the order total, not the first line
+
+    Limitations:
+    - only assignments are noticed: changing an object in place (like appending to a list) doesn't invalidate anything,
+      so assign a new list instead (or call invalidate)
+    - reads are only recorded on instances of classes with at least one derived_property
+    - all attribute reads on these classes go through a Python __getattribute__, which makes them a bit slower
+    - the instances need a __dict__, where the computed values are stored
+    """
+
+    def __init__(self, getter):
+        self.getter = getter
+        self.name = getter.__name__
+        self.__doc__ = getter.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        _install_hooks(owner)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        # only called when the value isn't cached in the instance __dict__, as that takes precedence over a non-data descriptor
+        reads = {}
+        _reads.stack.append(reads)
+        try:
+            value = self.getter(instance)
+        finally:
+            _reads.stack.pop()
+        object.__getattribute__(instance, "__dict__")[self.name] = value
+        for (_obj_id, attr_name), obj in reads.items():
+            _add_dependent(obj, attr_name, instance, self.name)
+        return value
+
+    def invalidate(self, instance):
+        """forget the value of an instance (and the derived properties computed from it), so it's computed again on the next access"""
+        object.__getattribute__(instance, "__dict__").pop(self.name, None)
+        _invalidate(instance, self.name)
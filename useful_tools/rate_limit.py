@@ -0,0 +1,175 @@
+"""
+@rate_limited decorator, to stay within the quota of an upstream API.
+
+Calls that would exceed the rate wait (in the order they arrived) until the budget allows them, instead of failing.
+Identical calls made while an earlier one is still running are coalesced: they wait for that call and share its result,
+so only one request is sent.
+
+The budget is a token bucket: it holds up to `burst` tokens, refilled at `rate` tokens per `per` seconds, and each call uses one token.
+By default the bucket is per process. Give it a state_file to share the budget between processes on the same machine.
+
+It composes with the cache decorators. Put the cache decorator above it, so cache hits don't use the budget, and only misses are rate limited:
+```
+from useful_tools import cache_to_memory
+from useful_tools.rate_limit import rate_limited
+
+class MyClient:
+    @cache_to_memory
+    @rate_limited(10, per=1.0) # at most 10 requests per second
+    def get_data(self, item_id):
+        return requests.get(f"https://api.example.com/items/{item_id}").json()
+
+MyClient.get_data.rate_limit_stats() # functools.wraps copies the rate_limit_stats attribute to the cache wrapper
+# {'calls': ..., 'outbound_calls': ..., 'coalesced_calls': ..., 'waiting': ..., 'total_wait': ..., 'max_wait': ...}
+```
+"""
+
+import json
+import time
+import threading
+from functools import wraps
+from useful_tools.file_lock import FileLock
+from useful_tools._internal import InFlightCall, write_atomically
+from useful_tools.hash_functions import make_arg_hash
+
+class TokenBucket:
+    """
+    Token bucket for a single process.
+
+    Args:
+        rate (float): number of tokens added per `per` seconds
+        per (float): length of the period, in seconds
+        burst (int, optional): maximum number of tokens in the bucket, which is the number of calls that can be made at once (default: rate)
+    """
+
+    def __init__(self, rate, per=1.0, burst=None):
+        if rate <= 0 or per <= 0:
+            raise ValueError("rate and per must be positive")
+        self.tokens_per_second = rate / per
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._timestamp = time.monotonic()
+
+    def _refill(self, tokens, timestamp, now):
+        return min(self.capacity, tokens + (now - timestamp) * self.tokens_per_second)
+
+    def reserve(self):
+        """
+        Take a token and return the number of seconds to wait before it may be used.
+        The token count can go negative: each caller reserves a place in the queue, so waiting callers are served in order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = self._refill(self._tokens, self._timestamp, now) - 1
+            self._timestamp = now
+            return max(0.0, -self._tokens / self.tokens_per_second)
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket shared by all processes using the same state file.
+    The state is stored as json, and protected by a lock file next to it (state_file + ".lock").
+    """
+
+    def __init__(self, rate, per=1.0, burst=None, state_file="rate_limit_state.json"):
+        super().__init__(rate, per, burst)
+        self.state_file = state_file
+        self._file_lock = FileLock(f"{state_file}.lock")
+
+    def _load_state(self, now):
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+            return state["tokens"], state["timestamp"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return self.capacity, now
+
+    def reserve(self):
+        # time.time() is used instead of time.monotonic(), as the timestamp is compared between processes
+        with self._file_lock:
+            now = time.time()
+            tokens, timestamp = self._load_state(now)
+            tokens = self._refill(tokens, timestamp, now) - 1
+            write_atomically(self.state_file, json.dumps({"tokens": tokens, "timestamp": now}), mode="w")
+            return max(0.0, -tokens / self.tokens_per_second)
+
+def rate_limited(rate, per=1.0, burst=None, state_file=None, coalesce=True):
+    """
+    Decorator that limits how often a function (or method) is called, see the module docstring.
+
+    Args:
+        rate (float): number of calls allowed per `per` seconds
+        per (float): length of the period, in seconds (default: 1.0)
+        burst (int, optional): number of calls that can be made at once, after a quiet period (default: rate)
+        state_file (str, optional): share the budget with all processes using the same file (default: per process)
+        coalesce (bool): let identical concurrent calls share the result of one call (default: True)
+
+    The wrapper has a rate_limit_stats() method, returning a dict with:
+        calls: number of calls made to the wrapper
+        outbound_calls: number of calls passed on to the decorated function
+        coalesced_calls: number of calls that shared the result of an identical concurrent call
+        waiting: number of calls currently waiting for the budget
+        total_wait, max_wait: time (in seconds) calls have waited for the budget
+    """
+    def decorator(func):
+        bucket = TokenBucket(rate, per, burst) if state_file is None else FileTokenBucket(rate, per, burst, state_file)
+        lock = threading.Lock()
+        in_flight = {}
+        stats = {"calls": 0, "outbound_calls": 0, "coalesced_calls": 0, "waiting": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+        def call_within_budget(args, kwargs):
+            wait = bucket.reserve()
+            if wait > 0:
+                with lock:
+                    stats["waiting"] += 1
+                try:
+                    time.sleep(wait)
+                finally:
+                    with lock:
+                        stats["waiting"] -= 1
+            with lock:
+                stats["outbound_calls"] += 1
+                stats["total_wait"] += wait
+                stats["max_wait"] = max(stats["max_wait"], wait)
+            return func(*args, **kwargs)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with lock:
+                stats["calls"] += 1
+            if not coalesce:
+                return call_within_budget(args, kwargs)
+
+            key = make_arg_hash(args, kwargs)
+            with lock:
+                call = in_flight.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = in_flight[key] = InFlightCall()
+                else:
+                    stats["coalesced_calls"] += 1
+
+            if not is_leader:
+                call.done.wait()
+                if call.exception is not None:
+                    raise call.exception
+                return call.result
+
+            try:
+                call.result = call_within_budget(args, kwargs)
+                return call.result
+            except BaseException as e:
+                call.exception = e
+                raise
+            finally:
+                with lock:
+                    del in_flight[key]
+                call.done.set()
+
+        def rate_limit_stats():
+            with lock:
+                return dict(stats)
+
+        wrapper.rate_limit_stats = rate_limit_stats
+        return wrapper
+    return decorator
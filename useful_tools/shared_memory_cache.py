@@ -0,0 +1,338 @@
+"""
+A cache in shared memory (multiprocessing.shared_memory), shared by all processes on the machine that open it by name.
+Use it as the backend of @cache_to_memory, so a result computed in one worker process can be read by the others,
+instead of every worker computing and keeping its own copy of the same (large) reference data.
+
+Usage:
+```
+from useful_tools import cache_to_memory
+from useful_tools.shared_memory_cache import SharedMemoryCache
+
+reference_data = SharedMemoryCache("myservice_reference_data", size=512 * 1024 * 1024)
+
+class ReferenceData:
+    def __cache_key__(self): # the instance is part of the cache key, which must be the same in every process
+        return "reference_data"
+
+    @cache_to_memory(backend=reference_data, ttl=3600)
+    def load_table(self, name):
+        ...
+
+# when the service shuts down (in one process, after the workers have stopped):
+reference_data.unlink()
+```
+
+Layout of the shared memory:
+- a small control segment (named after the cache) holding the current generation
+- a data segment per generation (named "<name>_<generation>"), holding a header, a hash table and an arena:
+  - the hash table maps the sha256 of a key to the offset, length and expiration time of the pickled result in the arena
+  - the arena is filled by a bump allocator: results are written one after the other, and never overwritten
+- when the arena or the hash table is full (or the cache is cleared), a new generation starts with an empty data segment,
+  and the old one is unlinked. Each process closes its mapping of the old one when it notices the new generation,
+  unless results it read are still views of that memory (zero-copy buffers): then the segment is closed at a later generation change,
+  once they have been garbage collected. So nothing a process read is overwritten, and old segments don't pile up
+
+Results are pickled with protocol 5, and big buffers (numpy arrays, PickleBuffer, ...) are stored out-of-band:
+they are unpickled as read-only views of the shared memory, so they are not copied into each process.
+Other objects (dicts, lists, strings, ...) are unpickled into the memory of the reading process.
+
+All changes are made while holding a FileLock, in the temp dir, named after the cache.
+The shared memory is not deleted when the processes exit - call unlink() when it's no longer needed.
+"""
+
+import os
+import sys
+import time
+import pickle
+import struct
+import hashlib
+import tempfile
+from multiprocessing import shared_memory, resource_tracker
+from useful_tools.file_lock import FileLock
+
+_MAGIC = b"UTSHMC01"
+_CONTROL = struct.Struct("<8sQ") # magic, generation
+_HEADER = struct.Struct("<QQQQQ") # number of slots, arena size, bytes used in the arena, slots used (including deleted ones), number of entries
+_SLOT = struct.Struct("<B7x16sQQd") # state, key digest, offset in the arena, length, expiration time (0: never)
+_PAYLOAD_HEADER = struct.Struct("<QQ") # length of the pickle, number of out-of-band buffers
+_EMPTY, _USED, _DELETED = 0, 1, 2
+_ALIGNMENT = 64 # payloads and out-of-band buffers start at a multiple of this, which suits numpy arrays
+_MAX_LOAD = 0.7 # maximum share of used slots in the hash table, as probing gets slow when it is nearly full
+
+def _align(position):
+    return (position + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def _arena_start(number_of_slots):
+    return _align(_HEADER.size + number_of_slots * _SLOT.size)
+
+def _slot_position(index):
+    return _HEADER.size + index * _SLOT.size
+
+def _digest(key):
+    return hashlib.sha256(str(key).encode()).digest()[:16]
+
+# before python 3.13, every process using a segment registers it with its resource tracker, which deletes it when the process exits
+_UNREGISTER_FROM_RESOURCE_TRACKER = sys.version_info < (3, 13) and os.name == "posix"
+
+def _open_segment(name, size=0, create=False):
+    """open (or create) a shared memory segment, that is not deleted when this process exits"""
+    if not _UNREGISTER_FROM_RESOURCE_TRACKER:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+def _unlink_segment(segment):
+    """delete a segment opened with _open_segment"""
+    if _UNREGISTER_FROM_RESOURCE_TRACKER:
+        # unlink() unregisters the segment from the resource tracker, which complains if it isn't registered
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+
+class SharedMemoryCache:
+    """
+    Cache of pickled results in shared memory, see the module docstring.
+
+    Args:
+        name (str): name of the shared memory - all processes using the same name share the cache
+        size (int): size of the arena in bytes (the maximum total size of the pickled results)
+        slots (int): size of the hash table (the maximum number of results is slots * 0.7)
+        zero_copy (bool): store big buffers out-of-band, and read them without copying them (default: True)
+
+    size and slots are only used by the process creating the shared memory - the others use the same layout.
+    """
+
+    def __init__(self, name, size=64 * 1024 * 1024, slots=65536, zero_copy=True):
+        self.name = name
+        self.size = size
+        self.slots = slots
+        self.zero_copy = zero_copy
+        self._lock = FileLock(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+        self._control = None
+        self._segment = None
+        self._generation = None
+        # data segments of earlier generations that results read from them are still views of - closed as soon as they aren't
+        self._retired_segments = []
+
+    def _create_data_segment(self, generation):
+        segment_name = f"{self.name}_{generation}"
+        try:
+            segment = _open_segment(segment_name, _arena_start(self.slots) + self.size, create=True)
+        except FileExistsError:
+            # left over from a cache with the same name that wasn't unlinked
+            _unlink_segment(_open_segment(segment_name))
+            segment = _open_segment(segment_name, _arena_start(self.slots) + self.size, create=True)
+        # the new segment is filled with zeros, so all slots are empty
+        _HEADER.pack_into(segment.buf, 0, self.slots, self.size, 0, 0, 0)
+        return segment
+
+    def _attach(self):
+        """open the segments of the current generation, and return the buffer of the data segment (called with the lock held)"""
+        if self._control is None:
+            try:
+                self._control = _open_segment(self.name)
+            except FileNotFoundError:
+                self._control = _open_segment(self.name, _CONTROL.size, create=True)
+                self._segment = self._create_data_segment(0)
+                self._generation = 0
+                _CONTROL.pack_into(self._control.buf, 0, _MAGIC, 0)
+            magic, _generation = _CONTROL.unpack_from(self._control.buf, 0)
+            if magic != _MAGIC:
+                raise ValueError(f"The shared memory {self.name!r} is not a SharedMemoryCache")
+        _magic, generation = _CONTROL.unpack_from(self._control.buf, 0)
+        if generation != self._generation:
+            if self._segment is not None:
+                self._retired_segments.append(self._segment)
+            self._segment = _open_segment(f"{self.name}_{generation}")
+            self._generation = generation
+            self._release_retired_segments()
+        return self._segment.buf
+
+    def _release_retired_segments(self):
+        """close the data segments of earlier generations that no result refers to anymore, which frees their memory (called with the lock held)"""
+        still_used = []
+        for segment in self._retired_segments:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment) # a result read from it is still a view of its memory - try again at the next generation
+        self._retired_segments = still_used
+
+    def _start_new_generation(self):
+        """replace the data segment with an empty one (called with the lock held)"""
+        self._attach()
+        old_segment = self._segment
+        generation = self._generation + 1
+        self._retired_segments.append(old_segment)
+        self._segment = self._create_data_segment(generation)
+        self._generation = generation
+        _CONTROL.pack_into(self._control.buf, 0, _MAGIC, generation)
+        _unlink_segment(old_segment) # processes that have it open can still read it
+        self._release_retired_segments()
+        return self._segment.buf
+
+    def _probe(self, buf, digest):
+        """
+        find the slot of a key in the hash table (open addressing with linear probing)
+        returns (index, found) - if the key isn't found, index is the slot to store it in (or None if the table is full)
+        """
+        number_of_slots = _HEADER.unpack_from(buf, 0)[0]
+        index = int.from_bytes(digest[:8], "little") % number_of_slots
+        first_free_index = None
+        for _ in range(number_of_slots):
+            state, slot_digest, _offset, _length, _expiration_time = _SLOT.unpack_from(buf, _slot_position(index))
+            if state == _EMPTY:
+                return (index if first_free_index is None else first_free_index), False
+            if state == _USED and slot_digest == digest:
+                return index, True
+            if state == _DELETED and first_free_index is None:
+                first_free_index = index
+            index = (index + 1) % number_of_slots
+        return first_free_index, False
+
+    def _delete_slot(self, buf, index):
+        """mark a slot as deleted (called with the lock held) - the space used in the arena is freed by the next generation"""
+        struct.pack_into("<B", buf, _slot_position(index), _DELETED)
+        header = list(_HEADER.unpack_from(buf, 0))
+        header[4] -= 1
+        _HEADER.pack_into(buf, 0, *header)
+
+    def get(self, key, default=None):
+        """return the cached result of the key, or default if it isn't cached (or has expired)"""
+        digest = _digest(key)
+        with self._lock:
+            buf = self._attach()
+            index, found = self._probe(buf, digest)
+            if not found:
+                return default
+            _state, _digest_, offset, length, expiration_time = _SLOT.unpack_from(buf, _slot_position(index))
+            if expiration_time and expiration_time <= time.time():
+                self._delete_slot(buf, index)
+                return default
+            position = _arena_start(_HEADER.unpack_from(buf, 0)[0]) + offset
+            # a view of the payload (it starts at a multiple of _ALIGNMENT), so the segment can't be closed while it is unpickled
+            payload = buf[position:position + length]
+        # the payload is never overwritten (see the module docstring), so it can be unpickled without holding the lock
+        return self._load(payload, 0)
+
+    def _dump(self, result):
+        """pickle the result, returning the pickle and the out-of-band buffers"""
+        if self.zero_copy:
+            buffers = []
+            data = pickle.dumps(result, protocol=5, buffer_callback=buffers.append)
+            try:
+                return data, [buffer.raw() for buffer in buffers]
+            except BufferError:
+                pass # a buffer that isn't contiguous can't be stored out-of-band
+        return pickle.dumps(result, protocol=5), []
+
+    def _load(self, buf, position):
+        pickle_length, number_of_buffers = _PAYLOAD_HEADER.unpack_from(buf, position)
+        position += _PAYLOAD_HEADER.size
+        buffer_lengths = struct.unpack_from(f"<{number_of_buffers}Q", buf, position)
+        position += 8 * number_of_buffers
+        data = buf[position:position + pickle_length]
+        position += pickle_length
+        buffers = []
+        for buffer_length in buffer_lengths:
+            position = _align(position)
+            buffers.append(buf[position:position + buffer_length].toreadonly())
+            position += buffer_length
+        return pickle.loads(data, buffers=buffers)
+
+    @staticmethod
+    def _payload_length(pickle_length, buffer_lengths):
+        length = _PAYLOAD_HEADER.size + 8 * len(buffer_lengths) + pickle_length
+        for buffer_length in buffer_lengths:
+            length = _align(length) + buffer_length
+        return length
+
+    def set(self, key, result, ttl=None):
+        """
+        cache a result, optionally for ttl seconds
+        returns False if the result is bigger than the arena, so it can't be cached
+        """
+        digest = _digest(key)
+        data, buffers = self._dump(result)
+        buffer_lengths = [buffer.nbytes for buffer in buffers]
+        length = self._payload_length(len(data), buffer_lengths)
+        expiration_time = 0.0 if ttl is None else time.time() + ttl
+        with self._lock:
+            buf = self._attach()
+            for attempt in range(2):
+                number_of_slots, arena_size, arena_used, used_slots, entries = _HEADER.unpack_from(buf, 0)
+                if length > arena_size:
+                    return False
+                offset = _align(arena_used)
+                index, found = self._probe(buf, digest)
+                if offset + length <= arena_size and index is not None and (found or used_slots + 1 <= number_of_slots * _MAX_LOAD):
+                    break
+                buf = self._start_new_generation() # full
+            else: # pragma: no cover - an empty generation always has room, as the length was checked above
+                return False
+            position = _arena_start(number_of_slots) + offset
+            _PAYLOAD_HEADER.pack_into(buf, position, len(data), len(buffers))
+            position += _PAYLOAD_HEADER.size
+            struct.pack_into(f"<{len(buffers)}Q", buf, position, *buffer_lengths)
+            position += 8 * len(buffers)
+            buf[position:position + len(data)] = data
+            position += len(data)
+            for buffer in buffers:
+                position = _align(position)
+                buf[position:position + buffer.nbytes] = buffer.cast("B")
+                position += buffer.nbytes
+
+            state = _SLOT.unpack_from(buf, _slot_position(index))[0]
+            if state == _EMPTY:
+                used_slots += 1
+            if not found:
+                entries += 1
+            _SLOT.pack_into(buf, _slot_position(index), _USED, digest, offset, length, expiration_time)
+            _HEADER.pack_into(buf, 0, number_of_slots, arena_size, offset + length, used_slots, entries)
+        return True
+
+    def delete(self, key):
+        digest = _digest(key)
+        with self._lock:
+            buf = self._attach()
+            index, found = self._probe(buf, digest)
+            if found:
+                self._delete_slot(buf, index)
+
+    def clear(self):
+        """delete all results (for all processes)"""
+        with self._lock:
+            self._start_new_generation()
+
+    def __len__(self):
+        with self._lock:
+            return _HEADER.unpack_from(self._attach(), 0)[4]
+
+    def usage(self):
+        """return a dict with the number of entries, and the bytes used and available in the arena of the current generation"""
+        with self._lock:
+            _slots, arena_size, arena_used, _used_slots, entries = _HEADER.unpack_from(self._attach(), 0)
+            return {"entries": entries, "bytes_used": arena_used, "bytes_total": arena_size, "generation": self._generation}
+
+    def close(self):
+        """close the shared memory in this process (segments with results still in use are left open)"""
+        for segment in [self._segment, self._control] + self._retired_segments:
+            if segment is None:
+                continue
+            try:
+                segment.close()
+            except BufferError:
+                pass # a result read from it is still a view of its memory
+        self._control = self._segment = self._generation = None
+        self._retired_segments = []
+
+    def unlink(self):
+        """delete the shared memory, for all processes - call it when no process uses the cache anymore"""
+        with self._lock:
+            self._attach()
+            for segment in (self._segment, self._control):
+                try:
+                    _unlink_segment(segment)
+                except FileNotFoundError:
+                    pass
+        self.close()